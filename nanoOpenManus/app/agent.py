@@ -1,9 +1,15 @@
+import asyncio  
+import contextvars
 import json  
+import time
 from enum import Enum  
-from typing import Dict, List, Optional  
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple  
 
+from nanoOpenManus.app.console import console_print
+from nanoOpenManus.app.events import AgentEvent, make_event
 from nanoOpenManus.app.tools.base import ToolResult 
 from nanoOpenManus.app.tools.tool_collection import ToolCollection  
+from nanoOpenManus.app.tracing import get_tracer
 
 class AgentState(str, Enum):  # 定义一个名为AgentState的类，它继承自str和Enum，表示代理可能处于的各种状态
     """代理的状态"""  # 类的文档字符串，解释这个类的用途
@@ -11,6 +17,7 @@ class AgentState(str, Enum):  # 定义一个名为AgentState的类，它继承
     RUNNING = "running"  # 定义RUNNING状态，表示代理正在处理任务
     FINISHED = "finished"  # 定义FINISHED状态，表示代理已完成任务
     ERROR = "error"  # 定义ERROR状态，表示代理在执行过程中遇到错误
+    CANCELLED = "cancelled"  # 定义CANCELLED状态，表示运行被cancel()取消或超过了截止时间
 
 
 class Message:  # 定义一个名为Message的类，用于封装对话中的消息
@@ -28,6 +35,43 @@ class Message:  # 定义一个名为Message的类，用于封装对话中的消
         self.tool_call_id = tool_call_id  # 将传入的tool_call_id参数赋值给实例的tool_call_id属性
         self.tool_calls = tool_calls      # 将传入的tool_calls参数赋值给实例的tool_calls属性
     
+    def __setattr__(self, name, value):  # 修改影响API格式的字段时，丢弃已缓存的编码结果
+        if name in ("role", "content", "tool_call_id", "tool_calls"):
+            self.__dict__.pop("_encoded", None)
+        object.__setattr__(self, name, value)
+    
+    def to_api_dict(self) -> Optional[Dict]:  # 将消息转换为chat completions API所需的字典
+        # 返回:
+        #   Optional[Dict]: API格式的消息；缺少tool_call_id的工具消息无法发送，返回None
+        """转换为API消息格式"""
+        if self.role == "assistant":
+            entry = {"role": "assistant"}
+            if self.content:
+                entry["content"] = self.content
+            if self.tool_calls: # tool_calls should be a list of dicts from the API
+                entry["tool_calls"] = self.tool_calls
+            # An assistant message should have content or tool_calls or both. If neither, it might be an issue.
+            if "content" not in entry and "tool_calls" not in entry:
+                entry["content"] = "" # Ensure content is at least an empty string if no tool_calls
+            return entry
+        if self.role == "tool":
+            if not self.tool_call_id:
+                return None
+            return {"role": "tool", "tool_call_id": self.tool_call_id, "content": self.content}
+        return {"role": self.role, "content": self.content}
+    
+    def encode(self) -> bytes:  # 返回API格式消息的JSON编码，结果会被缓存
+        # 返回:
+        #   bytes: UTF-8编码的紧凑JSON；消息无法发送时为空字节串
+        # 注意: 直接原地修改tool_calls列表不会使缓存失效，需要重新赋值该属性
+        """返回消息的JSON编码（带缓存）"""
+        encoded = self.__dict__.get("_encoded")
+        if encoded is None:
+            api_dict = self.to_api_dict()
+            encoded = b"" if api_dict is None else json.dumps(api_dict, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            self.__dict__["_encoded"] = encoded
+        return encoded
+    
     @staticmethod  # 这是一个静态方法，意味着它可以不创建类的实例而被调用
     def system_message(content):  # 定义一个创建系统消息的静态方法
         # 参数:
@@ -65,40 +109,167 @@ class BaseAgent:  # 定义一个名为BaseAgent的基础代理类
         
         self.name = name  # 将传入的name赋值给实例的name属性
         self.description = description  # 将传入的description赋值给实例的description属性
+        self.listeners: List[Callable[[str, Dict], None]] = []  # 事件监听器，每个事件以(事件名, 数据字典)调用
         self.state = AgentState.IDLE  # 初始化代理状态为IDLE (空闲)
         self.messages = []  # 初始化一个空列表，用于存储对话消息历史
         self.max_steps = 10  # 设置代理在一个任务中最大允许的思考-行动循环次数，默认为10
+        self.current_step = 0  # 本次运行已执行的步骤数
+        self._run_task: Optional[asyncio.Task] = None  # 正在执行run()的任务，cancel()通过它取消运行
+        self._cancel_reason: Optional[str] = None  # cancel()记录的取消原因
+    
+    @property
+    def state(self) -> AgentState:  # 代理的当前状态
+        return self._state
+    
+    @state.setter
+    def state(self, value: AgentState) -> None:  # 设置状态；有监听器且状态改变时发送state_changed事件
+        old = getattr(self, "_state", None)
+        self._state = value
+        if old is not value and self.listeners:
+            self.emit("state_changed", old=old, new=value)
+    
+    def add_listener(self, listener: Callable[[str, Dict], None]) -> None:  # 注册事件监听器
+        """注册事件监听器，用于在代理运行期间接收步骤、消息和结束等事件"""  # 方法的文档字符串
+        self.listeners.append(listener)
+    
+    def remove_listener(self, listener: Callable[[str, Dict], None]) -> None:  # 注销事件监听器
+        """注销事件监听器；未注册的监听器被忽略"""
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+    
+    def emit(self, event: str, **data) -> None:  # 向所有监听器发送事件
+        """发送事件；监听器抛出的异常不会影响代理运行"""  # 方法的文档字符串
+        for listener in list(self.listeners):
+            try:
+                listener(event, data)
+            except Exception as e:
+                console_print(f"⚠️ 事件监听器出错: {str(e)}")
     
     def add_message(self, message):  # 定义一个将消息添加到历史记录的方法
         """添加消息到历史记录"""  # 方法的文档字符串
         # 参数:
         #   message (Message): 要添加的Message对象
         self.messages.append(message)  # 将传入的message对象追加到self.messages列表的末尾
+        if self.listeners:  # 有监听器时发送消息事件
+            self.emit("message", role=message.role, content=message.content,
+                      tool_calls=message.tool_calls, tool_call_id=message.tool_call_id)
     
-    async def run(self, prompt: str) -> str:  # 定义一个异步方法run，用于启动代理处理用户请求
+    def cancel(self, reason: str = "运行已取消") -> bool:  # 取消正在进行的运行
+        """
+        取消正在进行的运行
+
+        取消会传递到正在等待的LLM请求和工具调用：HTTP请求被中断，执行代码的子进程和容器内的执行被终止。
+        run()不抛出异常，而是以CANCELLED状态返回已有的部分结果。
+
+        Args:
+            reason: 取消原因，写入结果和run_cancelled事件
+
+        Returns:
+            bool: 当前是否有正在进行的运行被取消
+        """
+        task = self._run_task
+        if task is None or task.done() or self.state != AgentState.RUNNING:
+            return False
+        if self._cancel_reason is None:  # 重复取消时保留第一次的原因
+            self._cancel_reason = reason
+            task.cancel()
+        return True
+
+    async def run(self, prompt: str, deadline: Optional[float] = None) -> str:  # 定义一个异步方法run，用于启动代理处理用户请求
         # 参数:
         #   prompt (str): 用户的初始请求字符串
+        #   deadline (float): 本次运行允许的秒数（从调用开始计时），超过后自动cancel()；为None时只受max_steps限制
         # 返回:
         #   str: 代理执行完毕后的最终结果字符串
         """运行代理处理用户请求"""  # 方法的文档字符串
         
-        self.state = AgentState.RUNNING  # 将代理状态设置为RUNNING (运行中)
-        self.messages = [Message.user_message(prompt)]  # 初始化消息历史列表，并添加用户的第一条请求作为第一条消息
+        self._run_task = asyncio.current_task()  # 记录执行本次运行的任务，cancel()取消的就是它
+        self._cancel_reason = None
+        timer = None
+        if deadline is not None:  # 到达截止时间时以超时原因取消运行
+            timer = asyncio.get_running_loop().call_later(deadline, self.cancel, f"超过截止时间（{round(deadline, 2):g}秒）")
+        try:
+            result = await self._run(prompt)
+            if self._cancel_reason is not None and self.state != AgentState.CANCELLED:
+                # 取消请求在最后一次等待之后才到达，运行已经正常结束：在这里接收掉尚未送达的取消，
+                # 否则它会落在子类run()的清理代码上
+                try:
+                    await asyncio.sleep(0)
+                except asyncio.CancelledError:
+                    task = asyncio.current_task()
+                    if hasattr(task, "uncancel"):
+                        task.uncancel()
+            return result
+        finally:
+            if timer is not None:
+                timer.cancel()
+            self._run_task = None
+
+    async def run_stream(self, prompt: str, deadline: Optional[float] = None) -> AsyncIterator[AgentEvent]:  # 以异步迭代器的方式运行代理
+        # 参数:
+        #   prompt (str): 用户的初始请求字符串
+        #   deadline (float): 与run()相同
+        # 产出:
+        #   AgentEvent: 步骤开始、LLM回复内容、工具调用与结果、状态改变等事件（见events模块），最后一个总是FinalAnswer
+        """
+        运行代理并在运行过程中逐个产出事件，不必等待整个运行结束
+
+        运行在单独的任务中进行；使用方在收到FinalAnswer之前结束迭代（break、关闭生成器或所在任务被取消）时，
+        运行被取消。
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        
+        def listener(event: str, data: Dict) -> None:
+            typed = make_event(event, data)
+            if typed is not None:
+                queue.put_nowait(typed)
+        
+        self.add_listener(listener)
+        task = asyncio.ensure_future(self.run(prompt, deadline=deadline))
+        task.add_done_callback(lambda _: queue.put_nowait(None))  # None表示运行（包括清理）已经结束
+        finished = False
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                finished = finished or event.type == "final"
+                yield event
+            await task  # 运行本身抛出的异常（例如外层任务被取消）交给使用方
+        finally:
+            self.remove_listener(listener)
+            if not task.done():
+                # 已收到FinalAnswer时只剩释放工具资源的清理，等它完成即可；否则取消运行
+                if not finished and not self.cancel("事件流已关闭"):
+                    task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+    async def _run(self, prompt: str) -> str:  # run()的主循环
+        """run()的实现，cancel()引起的取消在这里转换为CANCELLED状态和部分结果"""
+        tracer = get_tracer()  # 未启用追踪时span不做任何记录
+        with tracer.span("agent.run", agent=self.name, prompt_chars=len(prompt)) as run_span:  # 整个运行记录为追踪的根span
+            self.state = AgentState.RUNNING  # 将代理状态设置为RUNNING (运行中)
+            self.messages = [Message.user_message(prompt)]  # 初始化消息历史列表，并添加用户的第一条请求作为第一条消息
         
-        step_count = 0  # 初始化步骤计数器为0
-        result = ""  # 初始化最终结果字符串为空
+            step_count = 0  # 初始化步骤计数器为0
+            self.current_step = 0  # 重置本次运行的步骤数
+            self.emit("run_started", prompt=prompt)  # 通知监听器运行开始
         
-        try:  # 开始一个try块，用于捕获执行过程中可能发生的异常
-            while step_count < self.max_steps and self.state == AgentState.RUNNING:  # 当步骤数未达到上限且代理仍在运行时，循环执行
-                step_count += 1  # 步骤计数器加1
-                print(f"步骤 {step_count}: 思考中...")  # 打印当前步骤和状态
-                
-                # 执行一次思考-行动循环
-                continue_loop = await self.think()  # 调用self.think()方法进行一次思考和行动，并等待其完成。think方法决定是否需要继续循环。
-                if not continue_loop:  # 如果think方法返回False（或任何布尔值为False的值）
-                    break  # 跳出while循环，结束代理的执行
+            try:  # 开始一个try块，用于捕获执行过程中可能发生的异常
+                while step_count < self.max_steps and self.state == AgentState.RUNNING:  # 当步骤数未达到上限且代理仍在运行时，循环执行
+                    step_count += 1  # 步骤计数器加1
+                    self.current_step = step_count  # 记录已执行的步骤数
+                    console_print(f"步骤 {step_count}: 思考中...")  # 打印当前步骤和状态
+                    self.emit("step", step=step_count)  # 通知监听器新的步骤开始
                 
+                    # 执行一次思考-行动循环，整个步骤（LLM调用和工具执行）记录为一个span
+                    with tracer.span("agent.step", step=step_count):
+                        continue_loop = await self.think()  # 调用self.think()方法进行一次思考和行动，并等待其完成。think方法决定是否需要继续循环。
+                    if not continue_loop:  # 如果think方法返回False（或任何布尔值为False的值）
+                        break  # 跳出while循环，结束代理的执行
+            
                 # 处理最终结果 - 查找最后一条没有工具调用的助手消息内容
+                # 循环结束后再查找，这样没有调用工具的最终回复（think返回False的那一步）也会作为结果
                 # 从消息历史的末尾开始反向查找
                 final_assistant_messages = [ \
                     msg.content for msg in reversed(self.messages) \
@@ -111,15 +282,39 @@ class BaseAgent:  # 定义一个名为BaseAgent的基础代理类
                     assistant_contents = [msg.content for msg in self.messages if msg.role == "assistant" and msg.content is not None]
                     result = assistant_contents[-1] if assistant_contents else "" # 如果存在助手消息内容，则取最后一条；否则结果仍为空字符串
             
-            self.state = AgentState.FINISHED  # 当循环结束（正常完成或提前中断），将代理状态设置为FINISHED (已完成)
-            # 如果result仍然是空字符串（意味着循环结束前没有找到合适的助手消息），则返回默认的完成信息
-            return result or "任务已完成"  # 返回最终结果，如果结果为空，则返回"任务已完成"
+                self.state = AgentState.FINISHED  # 当循环结束（正常完成或提前中断），将代理状态设置为FINISHED (已完成)
+                # 如果result仍然是空字符串（意味着循环结束前没有找到合适的助手消息），则返回默认的完成信息
+                result = result or "任务已完成"  # 如果结果为空，则使用"任务已完成"
+                run_span.set(steps=step_count, state=self.state.value)  # 记录本次运行的步骤数和最终状态
+                self.emit("run_finished", result=result, steps=step_count)  # 通知监听器运行结束
+                return result  # 返回最终结果
         
-        except Exception as e:  # 如果在try块的执行过程中捕获到任何异常
-            self.state = AgentState.ERROR  # 将代理状态设置为ERROR (错误)
-            error_msg = f"运行过程中出错: {str(e)}"  # 构建错误信息字符串
-            print(error_msg)  # 打印错误信息
-            return error_msg  # 返回错误信息作为执行结果
+            except Exception as e:  # 如果在try块的执行过程中捕获到任何异常
+                self.state = AgentState.ERROR  # 将代理状态设置为ERROR (错误)
+                error_msg = f"运行过程中出错: {str(e)}"  # 构建错误信息字符串
+                console_print(error_msg)  # 打印错误信息
+                run_span.set(steps=step_count, state=self.state.value)  # 记录出错前执行的步骤数
+                run_span.record_error(error_msg)  # 异常在这里被转换为返回值，需要手动记录到span
+                self.emit("run_error", error=error_msg, steps=step_count)  # 通知监听器运行出错
+                return error_msg  # 返回错误信息作为执行结果
+
+            except asyncio.CancelledError:  # 运行被取消：LLM请求和工具调用已随任务取消而中断
+                reason = self._cancel_reason
+                if reason is None:  # 不是通过cancel()取消的（例如外层任务被取消），照常向上传播
+                    raise
+                task = asyncio.current_task()
+                if hasattr(task, "uncancel"):  # Python 3.11+: 取消已被处理，清除任务的取消计数
+                    task.uncancel()
+                self.state = AgentState.CANCELLED  # 将代理状态设置为CANCELLED (已取消)
+                # 部分结果：取消原因加上最后一条助手消息的内容
+                partial = next((msg.content for msg in reversed(self.messages)
+                                if msg.role == "assistant" and msg.content), None)
+                result = f"运行已取消: {reason}" + (f"\n\n已有的部分结果:\n{partial}" if partial else "")
+                console_print(f"⏹️ 运行已取消: {reason}")
+                run_span.set(steps=step_count, state=self.state.value)
+                run_span.record_error(f"运行已取消: {reason}")
+                self.emit("run_cancelled", reason=reason, result=result, steps=step_count)  # 通知监听器运行被取消
+                return result
     
     async def think(self) -> bool:  # 定义一个异步方法think，表示代理的思考和行动逻辑
         # 返回:
@@ -140,6 +335,66 @@ class ToolCall:  # 定义一个名为ToolCall的类，用于简单表示一个
         self.function = function or {}  # 将传入的function赋值给实例的function属性。如果function为None，则赋值为空字典。
 
 
+class EarlyToolDispatcher:  # 流式响应期间提前执行工具调用的辅助类
+    """
+    在LLM流式生成过程中提前执行已完整生成的工具调用
+    
+    只有从第一个调用开始、连续的、可并行且资源键互不冲突的调用会被提前执行；
+    遇到第一个不满足条件的调用后停止，其余调用在响应结束后按正常流程执行，
+    这样写入历史的顺序和工具之间的互斥关系都与非流式执行一致。
+    """
+    
+    def __init__(self, agent: "ToolCallAgent"):
+        self.agent = agent
+        self.tasks: Dict[str, asyncio.Task] = {}  # tool_call_id -> 提前执行的任务
+        self._keys = set()  # 已提前执行的调用占用的资源键
+        self._stopped = False  # 是否已停止提前执行
+        # 回调发生在LLM请求的span内；在步骤的上下文中创建任务，工具的span才会挂在步骤下而不是LLM请求下
+        self._context = contextvars.copy_context()
+    
+    def __call__(self, tc_data: Dict) -> None:
+        """由LLM在某个工具调用参数生成完整时回调"""
+        if self._stopped:
+            return
+        tool_call = ToolCall(id=tc_data["id"], function=tc_data["function"])
+        tool = self.agent.available_tools.get_tool(tool_call.function.get("name"))
+        keys = set(self.agent._conflict_keys(tool_call))
+        # 非并发模式下只提前执行第一个调用，保证工具之间仍然是串行的
+        limit = self.agent.max_parallel_tools if self.agent.parallel_tool_calls else 1
+        if tool is None or not tool.parallel_safe or keys & self._keys or len(self.tasks) >= max(1, limit):
+            self._stopped = True
+            return
+        if not tool_call.id:  # 没有id的调用无法与响应中的调用对应
+            self._stopped = True
+            return
+        self._keys |= keys
+        self.tasks[tool_call.id] = self._context.run(asyncio.ensure_future, self.agent._run_tool_call(tool_call))
+    
+    async def collect(self, tool_calls: List[ToolCall]) -> List[ToolCall]:
+        """
+        按原顺序写入提前执行的调用结果
+        
+        Returns:
+            List[ToolCall]: 尚未执行、需要按正常流程执行的剩余调用
+        """
+        index = 0
+        while index < len(tool_calls) and tool_calls[index].id in self.tasks:
+            tool_call = tool_calls[index]
+            observation, tool_name, tool_result = await self.tasks.pop(tool_call.id)
+            self.agent.add_message(Message.tool_message(observation, tool_call.id))
+            if tool_result is not None:
+                await self.agent._handle_special_tool(name=tool_name, result=tool_result)
+            index += 1
+        return tool_calls[index:]
+    
+    def cancel_pending(self) -> None:
+        """取消尚未被收集的提前执行任务"""
+        for task in self.tasks.values():
+            task.cancel()
+        self.tasks.clear()
+        self._stopped = True
+
+
 class ToolCallAgent(BaseAgent):  # 定义一个名为ToolCallAgent的类，它继承自BaseAgent，专门处理工具调用
     """处理工具调用的代理"""  # 类的文档字符串
     
@@ -148,7 +403,12 @@ class ToolCallAgent(BaseAgent):  # 定义一个名为ToolCallAgent的类，它
         name="toolcall",  # 代理名称，默认为"toolcall"
         description="工具调用代理",  # 代理描述，默认为"工具调用代理"
         system_prompt="你是一个能够使用各种工具的AI助手。",  # 系统提示，用于指导LLM的行为
-        next_step_prompt="根据用户的需求，选择合适的工具来解决问题。"  # 下一步提示，可能用于引导LLM的初步思考
+        next_step_prompt="根据用户的需求，选择合适的工具来解决问题。",  # 下一步提示，可能用于引导LLM的初步思考
+        parallel_tool_calls=False,  # 是否并发执行同一轮中的多个工具调用，默认关闭
+        max_parallel_tools=4,  # 并发执行时同时运行的工具数量上限
+        stream=False,  # 是否以流式方式请求LLM，并在工具调用参数生成完整后立即开始执行
+        context_manager=None,  # 可选的ContextManager，历史超出token预算时压缩较早的消息
+        blob_store=None  # 可选的BlobStore，过大的工具输出存入其中，历史中只保留预览和句柄
     ):
         super().__init__(name, description)  # 调用父类BaseAgent的构造函数，传递name和description
         self.system_prompt = system_prompt  # 将传入的system_prompt赋值给实例的system_prompt属性
@@ -157,7 +417,27 @@ class ToolCallAgent(BaseAgent):  # 定义一个名为ToolCallAgent的类，它
         self.special_tool_names = ["terminate"]  # 定义一个特殊工具名称列表，目前只有"terminate"（终止工具）
                                                 # 特殊工具执行后可能会改变代理的状态，例如终止代理
         self.llm = None # 初始化llm属性为None。这个属性将在具体的Manus类（或其他子类）中被设置为一个LLM客户端实例。
-    
+        self.parallel_tool_calls = parallel_tool_calls  # 为True时，LLM一次返回的多个工具调用会并发执行
+        self.max_parallel_tools = max_parallel_tools  # 并发执行的工具数量上限
+        self.stream = stream  # 为True时使用流式响应并提前分派工具调用
+        self.context_manager = context_manager  # 上下文压缩器，为None时不压缩历史
+        self.blob_store = blob_store  # 大型工具输出的存储，为None时输出总是完整写入历史
+
+    async def run(self, prompt: str, deadline: Optional[float] = None) -> str:  # 重写run方法，在运行结束时释放工具持有的会话资源
+        """运行代理；无论正常结束还是出错，都会释放工具在本次运行中持有的资源（例如Python内核进程）"""
+        try:
+            return await super().run(prompt, deadline=deadline)  # 执行父类的主循环
+        finally:
+            await self.available_tools.cleanup()  # 本次运行中保留的变量、导入等状态随之释放
+            cache_stats = self.available_tools.cache.summary()  # 各工具结果缓存的累计命中情况
+            if any(stats["hits"] for stats in cache_stats.values()):
+                console_print("🗃️ 工具结果缓存: " + "，".join(
+                    f"{name} 命中 {stats['hits']} / 未命中 {stats['misses']}" for name, stats in cache_stats.items()))
+
+    async def close(self) -> None:  # 释放代理持有的全部资源，交互入口退出时调用
+        """释放工具持有的资源（例如运行被中断时遗留的Python内核进程）；可以重复调用"""
+        await self.available_tools.cleanup()  # 每个工具的cleanup本身可以重复调用
+
     async def think(self) -> bool:  # 重写父类的think方法，实现工具调用代理的思考逻辑
         """处理当前状态并使用工具决定下一步行动"""  # 方法的文档字符串
         
@@ -168,13 +448,29 @@ class ToolCallAgent(BaseAgent):  # 定义一个名为ToolCallAgent的类，它
              self.add_message(Message.user_message(self.next_step_prompt)) # 添加引导性用户消息
 
         if self.llm:  # 检查self.llm是否已经被设置（即是否存在LLM客户端）
-            # 调用LLM的ask_tool方法，发送当前消息历史、系统提示和可用工具列表
-            llm_response = await self.llm.ask_tool(  # 等待LLM的响应
-                messages=self.messages,  # 传入当前完整的消息历史
-                system_msgs=[Message.system_message(self.system_prompt)] if self.system_prompt else None,  # 如果有系统提示，则包装成列表传入
-                tools=self.available_tools.to_params(),  # 获取可用工具的参数描述，并传入
-                tool_choice="auto"  # 让LLM自动决定是否以及调用哪个工具
-            )
+            tools = self.available_tools.to_params()  # 获取可用工具的参数描述
+            if self.context_manager:  # 发送前检查历史是否超出token预算，超出时压缩较早的工具输出和助手消息
+                compaction = self.context_manager.compact(self.messages, system_prompt=self.system_prompt, tools=tools)
+                if compaction:
+                    console_print(f"🗜️ 上下文压缩: {compaction}")
+            # 流式模式下，参数已完整的工具调用会在模型继续生成时提前开始执行
+            dispatcher = EarlyToolDispatcher(self) if self.stream else None
+            on_content = None
+            if dispatcher and self.listeners:  # 有监听器时把模型生成的内容逐段作为llm_delta事件发送
+                on_content = lambda text: self.emit("llm_delta", step=self.current_step, content=text)
+            try:
+                # 调用LLM的ask_tool方法，发送当前消息历史、系统提示和可用工具列表
+                llm_response = await self.llm.ask_tool(  # 等待LLM的响应
+                    messages=self.messages,  # 传入当前完整的消息历史
+                    system_msgs=[Message.system_message(self.system_prompt)] if self.system_prompt else None,  # 如果有系统提示，则包装成列表传入
+                    tools=tools,  # 传入可用工具的参数描述
+                    tool_choice="auto",  # 让LLM自动决定是否以及调用哪个工具
+                    **({"stream": True, "on_tool_call": dispatcher, "on_content": on_content} if dispatcher else {})  # 仅在流式模式下传入流式参数
+                )
+            except BaseException:
+                if dispatcher:
+                    dispatcher.cancel_pending()  # LLM请求失败时取消已提前开始的工具调用
+                raise
             
             assistant_content = llm_response.content  # 从LLM响应中获取文本内容部分
             pending_tool_calls = llm_response.tool_calls  # 从LLM响应中获取请求调用的工具列表
@@ -182,14 +478,27 @@ class ToolCallAgent(BaseAgent):  # 定义一个名为ToolCallAgent的类，它
             # 将助手的响应（可能包含文本内容、工具调用请求，或两者都有）添加到消息历史中
             self.add_message(Message.assistant_message(assistant_content, tool_calls=pending_tool_calls))
 
+            if assistant_content and not dispatcher and self.listeners:  # 非流式响应的内容作为一个完整的llm_delta事件发送
+                self.emit("llm_delta", step=self.current_step, content=assistant_content)
+
             if assistant_content:  # 如果LLM的响应中包含文本内容
-                print(f"✨ {self.name}的思考: {assistant_content}")  # 打印助手的思考文本
+                console_print(f"✨ {self.name}的思考: {assistant_content}")  # 打印助手的思考文本
 
             if pending_tool_calls:  # 如果LLM的响应中包含工具调用请求
-                print(f"🛠️ {self.name}请求执行 {len(pending_tool_calls)} 个工具")  # 打印请求执行的工具数量
-                for tc_data in pending_tool_calls:  # 遍历每一个工具调用请求数据
-                    # 从llm.ask_tool返回的tc_data已经是包含id和function的正确结构
-                    tool_call_to_execute = ToolCall(id=tc_data['id'], function=tc_data['function'])  # 创建ToolCall对象
+                console_print(f"🛠️ {self.name}请求执行 {len(pending_tool_calls)} 个工具")  # 打印请求执行的工具数量
+                # 从llm.ask_tool返回的tc_data已经是包含id和function的正确结构
+                tool_calls = [ToolCall(id=tc_data['id'], function=tc_data['function']) for tc_data in pending_tool_calls]
+                try:
+                    if dispatcher and dispatcher.tasks:  # 先按顺序收集流式阶段已提前执行的调用结果
+                        tool_calls = await dispatcher.collect(tool_calls)
+                        if self.state != AgentState.RUNNING:
+                            return False
+                finally:
+                    if dispatcher:
+                        dispatcher.cancel_pending()  # 响应中不存在的调用（例如流中途出错）不再需要
+                if self.parallel_tool_calls and len(tool_calls) > 1:  # 开启并发模式且有多个调用时并发执行
+                    return await self.execute_tools_parallel(tool_calls)
+                for tool_call_to_execute in tool_calls:  # 遍历每一个工具调用请求
                     await self.execute_tool(tool_call_to_execute)  # 调用execute_tool方法执行该工具调用，并等待完成
                     
                     # 如果某个工具（例如terminate工具）的执行改变了代理的状态（比如变为FINISHED或ERROR）
@@ -197,6 +506,8 @@ class ToolCallAgent(BaseAgent):  # 定义一个名为ToolCallAgent的类，它
                         return False # 如果状态不再是RUNNING，则停止循环，不再处理后续的工具调用或思考
                 return True # 如果所有请求的工具都已执行（或尝试执行）完毕，并且代理状态仍然是RUNNING，则继续循环
             else:  # 如果LLM的响应中没有工具调用请求
+                if dispatcher:
+                    dispatcher.cancel_pending()
                 # 这意味着助手直接给出了答案，或者任务已经完成。
                 # 如果助手通过其文本内容隐式地指示任务结束（而不是通过调用terminate工具），
                 # 这种逻辑需要通过解析助手消息内容或某种特殊信号来处理。
@@ -204,7 +515,7 @@ class ToolCallAgent(BaseAgent):  # 定义一个名为ToolCallAgent的类，它
                 return False # 停止循环，因为没有工具需要调用。
         
         else: # 如果self.llm为None（即没有配置真实的LLM API密钥，处于模拟LLM模式）
-            print("✨ (模拟) 思考: 分析用户请求并选择合适的工具...")  # 打印模拟思考的提示
+            console_print("✨ (模拟) 思考: 分析用户请求并选择合适的工具...")  # 打印模拟思考的提示
             # 简化的模拟逻辑
             if any(tool_msg.role == "tool" for tool_msg in self.messages): # 检查消息历史中是否已有工具执行结果
                 # 如果上一步有工具调用，则模拟一个助手对工具结果的总结性回复
@@ -220,7 +531,7 @@ class ToolCallAgent(BaseAgent):  # 定义一个名为ToolCallAgent的类，它
                 }]
                 # 添加一个模拟的助手消息，该消息不包含文本内容，只包含工具调用请求
                 self.add_message(Message.assistant_message(content=None, tool_calls=simulated_tool_calls))
-                print(f"🛠️ (模拟) {self.name}请求执行 1 个工具") # 打印模拟请求执行工具的提示
+                console_print(f"🛠️ (模拟) {self.name}请求执行 1 个工具") # 打印模拟请求执行工具的提示
                 # 使用模拟的工具调用ID和函数定义来创建一个ToolCall对象，并执行它
                 await self.execute_tool(ToolCall(id=simulated_tool_call_id, function=simulated_tool_calls[0]['function']))
                 return True # 继续循环，因为模拟调用了工具
@@ -232,55 +543,162 @@ class ToolCallAgent(BaseAgent):  # 定义一个名为ToolCallAgent的类，它
         #   None: 此方法不直接返回结果，而是将工具执行的结果（或错误）作为新的Message对象添加到消息历史中
         """执行单个工具调用并将结果添加到消息历史""" # 方法的文档字符串
         
+        observation, tool_name, tool_result = await self._run_tool_call(tool_to_execute)  # 执行工具调用，得到观察结果
+        self.add_message(Message.tool_message(observation, tool_to_execute.id))  # 将观察结果作为工具消息添加到历史，并关联tool_call_id
+        if tool_result is not None:  # 只有工具真正执行完成时才处理特殊工具逻辑
+            # 调用_handle_special_tool处理可能的特殊工具逻辑（如terminate）
+            await self._handle_special_tool(name=tool_name, result=tool_result)
+    
+    async def _run_tool_call(self, tool_to_execute: ToolCall) -> Tuple[str, Optional[str], Optional[ToolResult]]:  # 执行工具调用但不修改消息历史
+        # 参数:
+        #   tool_to_execute (ToolCall): 要执行的ToolCall对象
+        # 返回:
+        #   Tuple: 与_invoke_tool_call相同
+        """执行单个工具调用并返回观察结果；有监听器时在执行前后发送tool_call和tool_result事件"""  # 方法的文档字符串
+        if not self.listeners:  # 没有监听器时不计时，也不构造事件
+            return await self._invoke_tool_call(tool_to_execute)
+        self.emit("tool_call", step=self.current_step, tool_call_id=tool_to_execute.id,
+                  name=tool_to_execute.function.get("name"), arguments=tool_to_execute.function.get("arguments"))
+        started = time.perf_counter()
+        observation, tool_name, tool_result = await self._invoke_tool_call(tool_to_execute)
+        self.emit("tool_result", step=self.current_step, tool_call_id=tool_to_execute.id, name=tool_name,
+                  observation=observation, error=tool_result is None or bool(tool_result.error),
+                  elapsed_ms=round((time.perf_counter() - started) * 1000, 3))
+        return observation, tool_name, tool_result
+    
+    async def _invoke_tool_call(self, tool_to_execute: ToolCall) -> Tuple[str, Optional[str], Optional[ToolResult]]:  # _run_tool_call的实现
+        # 参数:
+        #   tool_to_execute (ToolCall): 要执行的ToolCall对象
+        # 返回:
+        #   Tuple: (观察结果字符串, 工具名称, 工具执行结果)；工具未能执行时执行结果为None
+        """执行单个工具调用并返回观察结果，由调用方负责按顺序写入消息历史"""  # 方法的文档字符串
+        
         tool_call_id = tool_to_execute.id  # 从ToolCall对象中获取工具调用ID
         tool_name = tool_to_execute.function.get("name")  # 从ToolCall对象的function字典中获取工具名称
         
         if not tool_name:  # 如果工具名称为空（未提供）
             observation = "错误: 工具调用中缺少工具名称"  # 设置观察结果为错误信息
-            print(observation)  # 打印错误信息
-            self.add_message(Message.tool_message(observation, tool_call_id))  # 将错误信息作为工具消息添加到历史，并关联tool_call_id
-            return  # 提前返回，不执行后续逻辑
+            console_print(observation)  # 打印错误信息
+            return observation, tool_name, None  # 提前返回，不执行后续逻辑
 
         if tool_name not in self.available_tools.tool_map:  # 如果请求的工具名称不在可用工具列表中
             observation = f"错误: 未知工具 '{tool_name}'"  # 设置观察结果为错误信息
-            print(observation)  # 打印错误信息
-            self.add_message(Message.tool_message(observation, tool_call_id))  # 将错误信息作为工具消息添加到历史
-            return  # 提前返回
+            console_print(observation)  # 打印错误信息
+            return observation, tool_name, None  # 提前返回
 
         try:  # 开始一个try块，用于捕获工具执行和参数解析过程中可能发生的异常
             arguments_str = tool_to_execute.function.get("arguments", "{}")  # 获取工具参数的字符串形式，如果不存在则默认为空JSON对象"{}"
             args = json.loads(arguments_str)  # 将参数字符串解析为Python字典
             
-            print(f"🔧 激活工具: '{tool_name}' (ID: {tool_call_id}) 参数: {args}")  # 打印激活工具的日志信息
+            console_print(f"🔧 激活工具: '{tool_name}' (ID: {tool_call_id}) 参数: {args}")  # 打印激活工具的日志信息
             # 调用ToolCollection的execute方法来实际执行工具，并等待其完成
             # tool_input参数需要的是一个字典
-            tool_result: ToolResult = await self.available_tools.execute(name=tool_name, tool_input=args)
+            with get_tracer().span("tool.execute", tool=tool_name, tool_call_id=tool_call_id) as span:
+                if span.recording:  # 只在启用追踪时计算负载大小
+                    span.set(args_bytes=len(arguments_str.encode("utf-8")))
+                tool_result: ToolResult = await self.available_tools.execute(name=tool_name, tool_input=args)
+                if span.recording and isinstance(tool_result, ToolResult):
+                    span.set(output_bytes=len(str(tool_result.output).encode("utf-8")) if tool_result.output is not None else 0)
+                    if tool_result.error:
+                        span.record_error(str(tool_result.error))
             
             if tool_result.error:  # 如果工具执行结果中包含错误信息
-                observation = f"工具 `{tool_name}` (ID: {tool_call_id}) 执行出错:\\n{str(tool_result.error)}"  # 构建包含错误详情的观察结果字符串
+                error_text = await self._offload_large_output(tool_name, str(tool_result.error))  # 过大的错误信息同样只保留预览
+                observation = f"工具 `{tool_name}` (ID: {tool_call_id}) 执行出错:\\n{error_text}"  # 构建包含错误详情的观察结果字符串
             else:  # 如果工具执行没有错误
+                output_text = await self._offload_large_output(tool_name, str(tool_result.output)) if tool_result.output is not None else None  # 输出过大时替换为预览和blob句柄
                 observation = (  # 构建观察结果字符串
-                    # 如果tool_result.output不为None，则使用其内容
-                    f"工具 `{tool_name}` (ID: {tool_call_id}) 的执行结果:\\n{str(tool_result.output)}"
+                    # 如果tool_result.output不为None，则使用其内容（过大时为预览和blob句柄）
+                    f"工具 `{tool_name}` (ID: {tool_call_id}) 的执行结果:\\n{output_text}"
                     if tool_result.output is not None 
                     # 否则，表示工具执行完成但没有输出
                     else f"工具 `{tool_name}` (ID: {tool_call_id}) 执行完成，没有输出"
                 )
             
-            print(f"📝 工具结果 ({tool_name}): {observation}")  # 打印工具执行的最终观察结果
-            self.add_message(Message.tool_message(observation, tool_call_id))  # 将观察结果作为工具消息添加到历史，并关联tool_call_id
-            
-            # 调用_handle_special_tool处理可能的特殊工具逻辑（如terminate）
-            await self._handle_special_tool(name=tool_name, result=tool_result)
+            console_print(f"📝 工具结果 ({tool_name}): {observation}")  # 打印工具执行的最终观察结果
+            return observation, tool_name, tool_result  # 返回观察结果和执行结果
             
         except json.JSONDecodeError:  # 如果在解析工具参数字符串时发生JSON解码错误
             error_msg = f"解析工具 '{tool_name}' (ID: {tool_call_id}) 的参数时出错: 无效的JSON格式 - '{arguments_str}'"  # 构建错误信息
-            print(error_msg)  # 打印错误信息
-            self.add_message(Message.tool_message(error_msg, tool_call_id))  # 将错误信息作为工具消息添加到历史
+            console_print(error_msg)  # 打印错误信息
+            return error_msg, tool_name, None  # 将错误信息作为观察结果返回
         except Exception as e:  # 如果在工具执行过程中捕获到任何其他未预料的异常
             error_msg = f"⚠️ 工具 '{tool_name}' (ID: {tool_call_id}) 遇到问题: {str(e)}"  # 构建包含异常信息的错误提示
-            print(error_msg)  # 打印错误提示
-            self.add_message(Message.tool_message(error_msg, tool_call_id))  # 将错误提示作为工具消息添加到历史
+            console_print(error_msg)  # 打印错误提示
+            return error_msg, tool_name, None  # 将错误提示作为观察结果返回
+    
+    async def _offload_large_output(self, tool_name: str, text: str) -> str:  # 把过大的工具输出存入blob存储
+        # 参数:
+        #   tool_name (str): 产生输出的工具名称
+        #   text (str): 工具的完整输出
+        # 返回:
+        #   str: 写入历史的文本；未超过阈值时原样返回，否则为开头和结尾的预览加blob句柄
+        """过大的输出只在历史中保留预览，之后每一步的请求大小不再随工具输出增长"""  # 方法的文档字符串
+        if self.blob_store is None or not self.blob_store.should_offload(text):  # 没有配置存储或输出不大时直接返回
+            return text
+        tool = self.available_tools.get_tool(tool_name)
+        if tool is not None and not getattr(tool, "offload_output", True):  # blob_read等工具的输出已经分页，不再存入
+            return text
+        return await self.blob_store.offload(text)
+    
+    async def execute_tools_parallel(self, tool_calls: List[ToolCall]) -> bool:  # 并发执行同一轮LLM响应中的多个工具调用
+        # 参数:
+        #   tool_calls (List[ToolCall]): 按LLM返回顺序排列的工具调用
+        # 返回:
+        #   bool: True表示代理应该继续执行下一个循环，False表示代理状态已改变应停止
+        """并发执行多个工具调用，工具消息仍按原tool_calls顺序写入历史"""  # 方法的文档字符串
+        
+        semaphore = asyncio.Semaphore(max(1, self.max_parallel_tools))  # 限制同时执行的工具数量
+        key_locks: Dict[str, asyncio.Lock] = {}  # 冲突键 -> 锁；冲突键相同的调用（如写同一文件）串行执行
+        
+        async def run_one(tool_call: ToolCall):
+            # 按排序后的顺序获取锁，避免多个调用交叉持有锁造成死锁
+            locks = [key_locks.setdefault(key, asyncio.Lock()) for key in sorted(set(self._conflict_keys(tool_call)))]
+            for lock in locks:
+                await lock.acquire()
+            try:
+                async with semaphore:
+                    return await self._run_tool_call(tool_call)
+            finally:
+                for lock in reversed(locks):
+                    lock.release()
+        
+        for batch in self._split_parallel_batches(tool_calls):  # 不可并行的工具单独成批，前后的调用不会与它重叠
+            results = await asyncio.gather(*(run_one(tc) for tc in batch))  # 同一批内的调用并发执行
+            for tool_call, (observation, tool_name, tool_result) in zip(batch, results):  # 按原顺序写入消息历史
+                self.add_message(Message.tool_message(observation, tool_call.id))
+                if tool_result is not None:
+                    await self._handle_special_tool(name=tool_name, result=tool_result)
+            if self.state != AgentState.RUNNING:  # 与串行执行一致：状态改变后不再执行后续调用
+                return False
+        return True
+    
+    def _split_parallel_batches(self, tool_calls: List[ToolCall]) -> List[List[ToolCall]]:  # 将工具调用划分为可并发执行的批次
+        """连续的可并行调用组成一批，声明为不可并行的工具（如terminate）独占一批"""  # 方法的文档字符串
+        batches: List[List[ToolCall]] = []
+        current: List[ToolCall] = []
+        for tool_call in tool_calls:
+            tool = self.available_tools.get_tool(tool_call.function.get("name"))
+            if tool is not None and not tool.parallel_safe:
+                if current:
+                    batches.append(current)
+                    current = []
+                batches.append([tool_call])
+            else:
+                current.append(tool_call)
+        if current:
+            batches.append(current)
+        return batches
+    
+    def _conflict_keys(self, tool_call: ToolCall) -> List[str]:  # 获取工具调用涉及的冲突键
+        """返回该调用会独占的资源键，参数无法解析时返回空列表"""  # 方法的文档字符串
+        tool = self.available_tools.get_tool(tool_call.function.get("name"))
+        if tool is None:
+            return []
+        try:
+            return list(tool.conflict_keys(**json.loads(tool_call.function.get("arguments") or "{}")))
+        except Exception:
+            return []  # 参数错误会在执行时报告，这里不需要处理
     
     async def _handle_special_tool(self, name: str, result: ToolResult) -> None:  # 定义异步方法_handle_special_tool，用于处理特殊工具的后效
         # 参数:
@@ -293,7 +711,7 @@ class ToolCallAgent(BaseAgent):  # 定义一个名为ToolCallAgent的类，它
         
         # 如果工具是"terminate"（不区分大小写），并且执行没有出错
         if name.lower() == "terminate" and not result.error:
-             print(f"🏁 特殊工具 '{name}' 已完成任务! 代理将终止。")  # 打印终止信息
+             console_print(f"🏁 特殊工具 '{name}' 已完成任务! 代理将终止。")  # 打印终止信息
              self.state = AgentState.FINISHED  # 将代理状态设置为FINISHED (已完成)
         # Potentially other special tools could be handled here  # 注释：将来可能会在这里处理其他特殊工具的逻辑
     
@@ -0,0 +1,95 @@
+import argparse
+from typing import Optional
+
+from nanoOpenManus.app.blob_store import BlobStore
+from nanoOpenManus.app.console import set_console_output
+from nanoOpenManus.app.docker_manus import DockerManus
+from nanoOpenManus.app.manus import Manus
+from nanoOpenManus.app.llm_cache import LLMResponseCache
+from nanoOpenManus.app.sandbox_pool import SandboxPool
+from nanoOpenManus.app.tracing import configure_tracing, shutdown_tracing
+
+
+def add_agent_arguments(parser: argparse.ArgumentParser) -> None:
+    """添加创建代理所需的公共命令行参数（服务模式和批处理模式共用）"""
+    parser.add_argument('--api-key', help='OpenAI API密钥')
+    parser.add_argument('--model', default=None, help='LLM模型名称')
+    parser.add_argument('--base-url', default=None, help='API基础URL')
+    parser.add_argument('--max-steps', type=int, default=15, help='每个任务的默认最大执行步骤数 (默认: 15)')
+    parser.add_argument('--deadline', type=float, default=None, metavar='SECONDS',
+                        help='每个任务的默认运行时间上限（秒），超过后取消运行并返回部分结果')
+    parser.add_argument('--parallel-tools', type=int, default=0,
+                        help='同一轮响应中最多并发执行的工具调用数，0表示按顺序执行 (默认: 0)')
+    parser.add_argument('--stream', action='store_true', help='以流式方式请求LLM')
+    parser.add_argument('--context-budget', type=int, default=None, help='对话历史的估算token上限')
+    parser.add_argument('--llm-cache', default=None, metavar='PATH', help='LLM响应缓存的SQLite文件路径')
+    parser.add_argument('--blob-threshold', type=int, default=None, metavar='CHARS',
+                        help='超过该字符数的工具输出存入blob存储，历史中只保留预览')
+    parser.add_argument('--blob-dir', default=None, metavar='PATH', help='blob存储的磁盘目录')
+    parser.add_argument('--local', action='store_true', help='使用本地环境执行工具，不使用Docker')
+    parser.add_argument('--pool-min', type=int, default=1, help='沙箱池保持预热的最少容器数 (默认: 1)')
+    parser.add_argument('--image', default='nanomanus-sandbox', help='沙箱镜像名称 (默认: nanomanus-sandbox)')
+    parser.add_argument('--trace', default=None, metavar='PATH', help='将运行追踪的span追加写入该JSONL文件')
+    parser.add_argument('--otlp-endpoint', default=None, metavar='URL', help='将运行追踪以OTLP/HTTP JSON格式发送到该地址')
+    parser.add_argument('--quiet', action='store_true', help='不输出代理、LLM和沙箱的运行日志')
+
+
+class AgentFactory:
+    """
+    按命令行参数为每个任务创建一个新的代理
+
+    所有代理共用LLM响应缓存和blob存储；Docker模式下共用一个沙箱池，每次运行租用独立的容器，
+    因此同时运行的任务之间互不影响。
+    """
+
+    def __init__(self, args: argparse.Namespace, max_concurrent: int):
+        """
+        Args:
+            args: 包含add_agent_arguments所添加参数的解析结果
+            max_concurrent: 同时运行的任务数上限，决定沙箱池的最大容器数
+        """
+        self.args = args
+        self.max_concurrent = max_concurrent
+        self.llm_cache = LLMResponseCache(args.llm_cache) if args.llm_cache else None
+        self.blob_store = BlobStore(directory=args.blob_dir, threshold=args.blob_threshold) if args.blob_threshold else None
+        self.sandbox_pool: Optional[SandboxPool] = None
+        configure_tracing(path=args.trace, otlp_endpoint=args.otlp_endpoint)
+        if args.quiet:
+            set_console_output(False)
+
+    async def start(self) -> None:
+        """Docker模式下预热沙箱池"""
+        if self.args.local:
+            return
+        self.sandbox_pool = SandboxPool(
+            image=self.args.image,
+            min_size=min(self.args.pool_min, self.max_concurrent),
+            max_size=self.max_concurrent,
+        )
+        await self.sandbox_pool.start()
+
+    def __call__(self, max_steps: Optional[int] = None):
+        """创建一个新的代理实例"""
+        args = self.args
+        options = dict(
+            max_steps=max_steps or args.max_steps,
+            api_key=args.api_key,
+            model=args.model,
+            base_url=args.base_url,
+            parallel_tool_calls=args.parallel_tools > 0,
+            max_parallel_tools=max(1, args.parallel_tools),
+            stream=args.stream,
+            context_budget=args.context_budget,
+            llm_cache=self.llm_cache,
+            blob_store=self.blob_store,
+        )
+        if self.sandbox_pool is not None:
+            return DockerManus(sandbox_pool=self.sandbox_pool, **options)
+        return Manus(**options)
+
+    async def close(self) -> None:
+        if self.sandbox_pool is not None:
+            await self.sandbox_pool.close()
+        if self.llm_cache is not None:
+            self.llm_cache.close()
+        shutdown_tracing()
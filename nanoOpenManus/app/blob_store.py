@@ -0,0 +1,174 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict, deque
+from typing import Dict, Optional
+
+HANDLE_PREFIX = "blob:"
+
+
+class BlobStore:
+    """
+    大型工具输出的内容寻址存储：内存LRU + 磁盘文件
+
+    超过阈值的工具输出不直接写入对话历史，而是存入这里，历史中只保留开头和结尾的预览以及一个句柄
+    （blob:<SHA-256前16位>），模型需要细节时再用blob_read工具按字符偏移或行号分页读取。
+    这样之后每一步发送给LLM的请求大小不再随工具输出增长。
+
+    内容相同的输出只存一份，因此多个代理可以共用一个存储。内存层按总字符数做LRU淘汰；
+    磁盘层只淘汰本进程写入的文件，按写入顺序淘汰最早的文件。
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        threshold: int = 8000,
+        preview_head: int = 1500,
+        preview_tail: int = 500,
+        max_memory_chars: int = 32 * 1024 * 1024,
+        max_disk_bytes: int = 1024 * 1024 * 1024,
+    ):
+        """
+        Args:
+            directory: 磁盘存储目录，默认为系统临时目录下的nanomanus-blobs
+            threshold: 超过该字符数的工具输出才存入blob
+            preview_head: 历史中保留的开头字符数
+            preview_tail: 历史中保留的结尾字符数
+            max_memory_chars: 内存中保留的blob总字符数上限
+            max_disk_bytes: 本进程写入磁盘的blob总字节数上限
+        """
+        self.directory = directory or os.path.join(tempfile.gettempdir(), "nanomanus-blobs")
+        self.threshold = threshold
+        self.preview_head = preview_head
+        self.preview_tail = preview_tail
+        self.max_memory_chars = max_memory_chars
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[str, str]" = OrderedDict()  # key -> 内容
+        self._memory_chars = 0
+        self._written: "deque[tuple]" = deque()  # 本进程写入的(key, 字节数)，按写入顺序
+        self._disk_bytes = 0
+        self.stats = {"stores": 0, "duplicates": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0,
+                      "offloaded_chars": 0, "evictions": 0}
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def parse_handle(handle: str) -> Optional[str]:
+        """从句柄（blob:<key>，也接受不带前缀的key）中取出key，格式不对时返回None"""
+        key = handle.strip()
+        if key.startswith(HANDLE_PREFIX):
+            key = key[len(HANDLE_PREFIX):]
+        if len(key) != 16 or any(ch not in "0123456789abcdef" for ch in key):
+            return None
+        return key
+
+    def should_offload(self, text: str) -> bool:
+        return len(text) > self.threshold
+
+    async def put(self, text: str) -> str:
+        """存入内容并返回句柄；内容已存在时不重复写入"""
+        key = self.make_key(text)
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.stats["duplicates"] += 1
+            return HANDLE_PREFIX + key
+        self._remember(key, text)
+        loop = asyncio.get_running_loop()
+        written = await loop.run_in_executor(None, self._write, key, text)
+        if written:
+            self.stats["stores"] += 1
+            self._written.append((key, written))
+            self._disk_bytes += written
+            self._evict_disk()
+        else:
+            self.stats["duplicates"] += 1
+        return HANDLE_PREFIX + key
+
+    async def get(self, handle: str) -> Optional[str]:
+        """按句柄读取内容，不存在（或已被淘汰）时返回None"""
+        key = self.parse_handle(handle)
+        if key is None:
+            self.stats["misses"] += 1
+            return None
+        text = self._memory.get(key)
+        if text is not None:
+            self._memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return text
+        loop = asyncio.get_running_loop()
+        text = await loop.run_in_executor(None, self._read, key)
+        if text is None:
+            self.stats["misses"] += 1
+            return None
+        self._remember(key, text)
+        self.stats["disk_hits"] += 1
+        return text
+
+    async def offload(self, text: str) -> str:
+        """
+        存入内容，返回写入对话历史的简短替代文本
+
+        Returns:
+            str: 包含句柄、总长度、开头和结尾预览以及读取方式说明的文本
+        """
+        handle = await self.put(text)
+        self.stats["offloaded_chars"] += len(text)
+        head, tail = text[:self.preview_head], text[len(text) - self.preview_tail:] if self.preview_tail else ""
+        omitted = len(text) - len(head) - len(tail)
+        lines = text.count("\n") + (0 if text.endswith("\n") else 1)  # 与splitlines()的行数一致
+        return (
+            f"[输出过大，已存入 {handle}（共 {len(text)} 个字符，{lines} 行），以下只保留开头和结尾；"
+            f"需要其余内容时调用blob_read工具，按offset或行号分页读取]\n"
+            f"{head}\n...[省略 {omitted} 个字符]...\n{tail}"
+        )
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def _write(self, key: str, text: str) -> int:
+        """写入磁盘，返回写入的字节数；文件已存在时返回0"""
+        path = self._path(key)
+        if os.path.exists(path):
+            return 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = text.encode("utf-8")
+        # 先写临时文件再改名，读取方不会看到写了一半的文件
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return len(data)
+
+    def _read(self, key: str) -> Optional[str]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read().decode("utf-8")
+        except OSError:
+            return None
+
+    def _remember(self, key: str, text: str) -> None:
+        self._memory[key] = text
+        self._memory_chars += len(text)
+        # 至少保留最新的一个条目，即使它本身超过上限
+        while self._memory_chars > self.max_memory_chars and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_chars -= len(evicted)
+
+    def _evict_disk(self) -> None:
+        while self._disk_bytes > self.max_disk_bytes and len(self._written) > 1:
+            key, size = self._written.popleft()
+            self._disk_bytes -= size
+            self.stats["evictions"] += 1
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
+
+    def summary(self) -> Dict:
+        """存储状态和统计"""
+        return {**self.stats, "memory_entries": len(self._memory), "memory_chars": self._memory_chars,
+                "disk_bytes": self._disk_bytes}
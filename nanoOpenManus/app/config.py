@@ -2,6 +2,8 @@ import os
 from pathlib import Path
 from typing import Optional
 
+from nanoOpenManus.app.console import console_print
+
 # 尝试导入dotenv，如果不可用则提供降级方案
 try:
     from dotenv import load_dotenv
@@ -31,8 +33,8 @@ class Config:
     def _load_dotenv(self):
         """尝试加载.env文件中的环境变量"""
         if not DOTENV_AVAILABLE:
-            print("提示: 未安装python-dotenv包，无法从.env文件加载配置。")
-            print("如需使用.env文件，请运行: pip install python-dotenv")
+            console_print("提示: 未安装python-dotenv包，无法从.env文件加载配置。")
+            console_print("如需使用.env文件，请运行: pip install python-dotenv")
             return
         
         # 查找.env文件
@@ -41,10 +43,10 @@ class Config:
         
         if env_file.exists():
             load_dotenv(env_file)
-            print(f"✅ 已从 {env_file} 加载配置")
+            console_print(f"✅ 已从 {env_file} 加载配置")
         else:
-            print(f"提示: 未找到.env文件，使用系统环境变量。")
-            print(f"您可以在 {project_root} 目录创建.env文件来配置环境变量。")
+            console_print(f"提示: 未找到.env文件，使用系统环境变量。")
+            console_print(f"您可以在 {project_root} 目录创建.env文件来配置环境变量。")
     
     def _find_project_root(self) -> Path:
         """查找项目根目录"""
@@ -85,5 +87,20 @@ class Config:
         return config
 
 
-# 创建全局配置实例
-config = Config() 
\ No newline at end of file
+# 全局配置实例，第一次使用时才创建（查找并加载.env），导入本模块没有副作用
+_config: Optional[Config] = None
+
+
+def get_config() -> Config:
+    """返回全局配置实例，第一次调用时加载.env和环境变量"""
+    global _config
+    if _config is None:
+        _config = Config()
+    return _config
+
+
+def __getattr__(name: str):
+    """兼容 `from nanoOpenManus.app.config import config`：访问时才创建全局配置"""
+    if name == "config":
+        return get_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,92 @@
+"""
+控制台输出开关
+
+代理、LLM客户端、Docker代理等模块的运行日志都经由console_print输出。嵌入到其他程序（服务、批处理、
+基准测试）时，可以用set_console_output(False)关闭全部输出，进度改由事件（BaseAgent.add_listener、
+BaseAgent.run_stream）获取，运行过程中不再有同步的终端写入。
+
+环境变量 NANOMANUS_QUIET=1 在启动时关闭输出。
+
+交互入口用read_line读取输入：等待输入期间事件循环继续运行后台任务（例如容器就绪检查）。
+"""
+import asyncio
+import os
+import sys
+
+_enabled = os.environ.get("NANOMANUS_QUIET", "").lower() not in ("1", "true", "yes", "on")
+
+
+def set_console_output(enabled: bool) -> None:
+    """打开或关闭控制台输出（对整个进程生效）"""
+    global _enabled
+    _enabled = enabled
+
+
+def console_output_enabled() -> bool:
+    return _enabled
+
+
+def console_print(*args, **kwargs) -> None:
+    """与print相同；控制台输出关闭时什么也不做"""
+    if _enabled:
+        print(*args, **kwargs)
+
+
+# read_line已从标准输入读到、但还不到一整行或超出本行的字节
+_stdin_pending = bytearray()
+
+
+async def read_line(prompt: str = "") -> str:
+    """
+    读取一行输入，等待期间不阻塞事件循环
+
+    标准输入可以被事件循环监听时（POSIX下的终端和管道），可读后才用os.read读取，没有阻塞在读取中的线程，
+    Ctrl-C取消等待后程序可以立即退出；否则（例如Windows）在默认线程池中调用input()。
+
+    Raises:
+        EOFError: 输入已结束（例如Ctrl-D）
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        fd = sys.stdin.fileno()
+    except (AttributeError, OSError, ValueError):
+        fd = None
+    sys.stdout.write(prompt)
+    sys.stdout.flush()
+    while fd is not None and b"\n" not in _stdin_pending:
+        try:
+            chunk = await _read_when_ready(loop, fd)
+        except (NotImplementedError, OSError, ValueError):
+            if _stdin_pending:
+                break
+            return await loop.run_in_executor(None, input)
+        if not chunk:
+            break
+        _stdin_pending.extend(chunk)
+    if fd is None:
+        return await loop.run_in_executor(None, input)
+    if not _stdin_pending:
+        raise EOFError
+    line, _, rest = bytes(_stdin_pending).partition(b"\n")
+    _stdin_pending[:] = rest
+    return line.decode("utf-8", errors="replace").rstrip("\r")
+
+
+async def _read_when_ready(loop: asyncio.AbstractEventLoop, fd: int) -> bytes:
+    """等待fd可读后读取一次；返回空字节表示输入已结束"""
+    future = loop.create_future()
+
+    def on_readable() -> None:
+        loop.remove_reader(fd)
+        if future.done():
+            return
+        try:
+            future.set_result(os.read(fd, 65536))
+        except OSError as e:
+            future.set_exception(e)
+
+    loop.add_reader(fd, on_readable)
+    try:
+        return await future
+    finally:
+        loop.remove_reader(fd)
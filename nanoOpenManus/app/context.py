@@ -0,0 +1,176 @@
+import json
+import weakref
+from typing import Dict, List, Optional
+
+from nanoOpenManus.app.agent import Message
+
+
+# 每条消息在API中的固定开销（角色、分隔符等）的粗略估计
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    本地粗略估算文本的token数，不依赖任何分词器
+
+    中日韩字符大约每个字符1个token，其余字符（英文、代码、标点）大约每4个字符1个token。
+    """
+    if not text:
+        return 0
+    wide = sum(1 for ch in text if ord(ch) >= 0x2E80)
+    return wide + (len(text) - wide + 3) // 4
+
+
+def estimate_message_tokens(message: Message) -> int:
+    """估算一条消息（含工具调用参数）的token数"""
+    tokens = MESSAGE_OVERHEAD_TOKENS + estimate_tokens(message.content if isinstance(message.content, str) else str(message.content or ""))
+    for tool_call in message.tool_calls or []:
+        function = tool_call.get("function") or {}
+        tokens += MESSAGE_OVERHEAD_TOKENS + estimate_tokens(function.get("name")) + estimate_tokens(function.get("arguments"))
+    return tokens
+
+
+class CompactionResult:
+    """一次上下文压缩的结果"""
+
+    def __init__(self, tokens_before: int, tokens_after: int, compacted_messages: int):
+        self.tokens_before = tokens_before
+        self.tokens_after = tokens_after
+        self.compacted_messages = compacted_messages
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+    def __str__(self):
+        return (f"压缩了 {self.compacted_messages} 条消息，"
+                f"约 {self.tokens_before} -> {self.tokens_after} tokens (节省 {self.saved_tokens})")
+
+
+class ContextManager:
+    """
+    基于token预算的对话历史压缩
+
+    当历史（加上系统提示和工具描述）超过预算时，从最早的消息开始，把工具输出和助手消息
+    替换为简短的预览，把过大的工具调用参数替换为占位说明，直到回到预算以内；
+    仍然超出时再把这些消息进一步缩减为一行省略说明。
+    开头的用户消息（原始请求和引导提示）与最近keep_recent条消息始终保持原样；
+    消息只会被改写、不会被删除，因此assistant的tool_calls与tool消息的tool_call_id始终一一对应。
+    """
+
+    def __init__(self, token_budget: int = 24000, keep_recent: int = 6, preview_chars: int = 200, min_saving_tokens: int = 32):
+        """
+        Args:
+            token_budget: 发送给LLM的估算token上限
+            keep_recent: 末尾保持原样的消息条数
+            preview_chars: 被压缩消息保留的开头字符数
+            min_saving_tokens: 节省少于该值的消息不值得压缩，跳过
+        """
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+        self.preview_chars = preview_chars
+        self.min_saving_tokens = min_saving_tokens
+        self.history: List[CompactionResult] = []
+        self._tools_ref: Optional[List[Dict]] = None
+        self._tools_tokens = 0
+        # 消息 -> (估算时的编码结果, token数)；消息被修改后编码对象会变化，估算随之失效
+        self._message_tokens = weakref.WeakKeyDictionary()
+
+    @property
+    def total_saved_tokens(self) -> int:
+        """所有压缩累计节省的token数"""
+        return sum(result.saved_tokens for result in self.history)
+
+    def message_tokens(self, message: Message) -> int:
+        """估算消息的token数，未修改过的消息只计算一次"""
+        encoded = message.encode()
+        cached = self._message_tokens.get(message)
+        if cached is None or cached[0] is not encoded:
+            cached = (encoded, estimate_message_tokens(message))
+            self._message_tokens[message] = cached
+        return cached[1]
+
+    def estimate_tools_tokens(self, tools: Optional[List[Dict]]) -> int:
+        """估算工具描述的token数，同一个工具列表只计算一次"""
+        if not tools:
+            return 0
+        if tools is not self._tools_ref:
+            self._tools_ref = tools
+            self._tools_tokens = estimate_tokens(json.dumps(tools, ensure_ascii=False))
+        return self._tools_tokens
+
+    def compact(self, messages: List[Message], system_prompt: Optional[str] = None, tools: Optional[List[Dict]] = None) -> Optional[CompactionResult]:
+        """
+        在需要时原地压缩消息列表
+
+        Args:
+            messages: 代理的消息历史，会被原地修改
+            system_prompt: 系统提示，不在messages中但同样占用预算
+            tools: 工具描述，同样占用预算
+
+        Returns:
+            CompactionResult: 未超出预算或无可压缩内容时返回None
+        """
+        sizes = [self.message_tokens(message) for message in messages]
+        reserved_tokens = estimate_tokens(system_prompt) + self.estimate_tools_tokens(tools)
+        total = reserved_tokens + sum(sizes)
+        if total <= self.token_budget:
+            return None
+
+        tokens_before = total
+        compacted = 0
+        # 第一轮把较早的消息改写为预览；仍超出预算时第二轮只保留一行省略说明
+        for level in (1, 2):
+            for index in self._compactable_indexes(messages, level):
+                if total <= self.token_budget:
+                    break
+                message = messages[index]
+                self._compact_message(message, level)
+                new_size = self.message_tokens(message)
+                if new_size < sizes[index]:
+                    total -= sizes[index] - new_size
+                    sizes[index] = new_size
+                    compacted += 1
+
+        if not compacted:
+            return None
+        result = CompactionResult(tokens_before, total, compacted)
+        self.history.append(result)
+        return result
+
+    def _compactable_indexes(self, messages: List[Message], level: int) -> List[int]:
+        """从旧到新返回可以压缩到指定级别的消息下标"""
+        head = 0
+        while head < len(messages) and messages[head].role in ("system", "user"):
+            head += 1  # 原始请求及紧随其后的引导提示
+        tail = max(head, len(messages) - self.keep_recent)
+        return [
+            i for i in range(head, tail)
+            if messages[i].role in ("tool", "assistant") and getattr(messages[i], "compacted", 0) < level
+        ]
+
+    def _compact_message(self, message: Message, level: int) -> None:
+        """把一条消息改写为简短的预览（level=1）或一行省略说明（level=2）"""
+        keep = self.preview_chars if level == 1 else 0
+        content = message.content if isinstance(message.content, str) else None
+        if content and estimate_tokens(content) - estimate_tokens(content[:keep]) >= self.min_saving_tokens:
+            original_length = getattr(message, "original_length", len(content))
+            message.original_length = original_length
+            if keep:
+                message.content = f"{content[:keep]}\n...[上下文压缩: 已省略后续 {original_length - keep} 个字符]"
+            else:
+                message.content = f"[上下文压缩: 已省略 {original_length} 个字符的{'工具输出' if message.role == 'tool' else '内容'}]"
+
+        if message.tool_calls:
+            tool_calls = []
+            for tool_call in message.tool_calls:
+                function = tool_call.get("function") or {}
+                arguments = function.get("arguments") or ""
+                if estimate_tokens(arguments) >= self.min_saving_tokens:
+                    # 参数仍需是合法JSON，用占位说明替换原参数
+                    placeholder = json.dumps({"_elided": f"上下文压缩: 已省略 {len(arguments)} 个字符的参数"}, ensure_ascii=False)
+                    tool_call = {**tool_call, "function": {**function, "arguments": placeholder}}
+                tool_calls.append(tool_call)
+            message.tool_calls = tool_calls
+
+        message.compacted = level
@@ -0,0 +1,378 @@
+"""
+Docker Engine API的异步客户端
+
+通过unix socket直接访问docker守护进程，代替每次操作都启动一个docker命令行进程：
+普通请求复用保持的连接（HTTP/1.1 keep-alive），exec通过升级后的连接（hijack）传输多路复用的stdin/stdout/stderr。
+只实现沙箱用到的接口：容器的查询、创建、启动和删除，exec的创建、启动和查询。
+
+get_docker_client() 按环境变量决定是否使用：
+    NANOMANUS_DOCKER_API=0             不使用，始终通过docker命令行
+    NANOMANUS_DOCKER_API=<socket路径>   使用指定的socket（例如本地替身 benchmarks/fake_docker_api.py）
+    未设置                              DOCKER_HOST为unix://时使用其路径，否则使用/var/run/docker.sock；
+                                        socket不存在，或设置了NANOMANUS_DOCKER_BIN（明确指定了命令行）时不使用
+"""
+import asyncio
+import json
+import os
+import re
+import signal
+import struct
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote, urlencode
+
+# 请求使用的API版本，Docker 20.10及以上都支持
+API_VERSION = "v1.41"
+DEFAULT_SOCKET = "/var/run/docker.sock"
+
+# 保持的空闲连接数上限，超出的连接用完即关闭
+MAX_IDLE_CONNECTIONS = 8
+
+# exec的输出流在连接关闭后，等待exec进程结束以读取退出码的最长时间（秒）
+EXEC_EXIT_TIMEOUT = 2.0
+
+
+class DockerAPIError(Exception):
+    """docker守护进程返回了错误状态码"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class _ExecStdin:
+    """exec进程的stdin，接口与asyncio.subprocess.Process.stdin相同；close()只关闭写方向，输出仍可继续读取"""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self._writer = writer
+        self._closed = False
+
+    def write(self, data: bytes) -> None:
+        self._writer.write(data)
+
+    def writelines(self, chunks) -> None:
+        self._writer.writelines(chunks)
+
+    async def drain(self) -> None:
+        await self._writer.drain()
+
+    def is_closing(self) -> bool:
+        return self._closed or self._writer.is_closing()
+
+    def close(self) -> None:
+        """发送EOF，容器内的进程读到stdin结束"""
+        if self.is_closing():
+            return
+        self._closed = True
+        try:
+            self._writer.write_eof()
+        except (OSError, RuntimeError):
+            pass
+
+
+class ExecProcess:
+    """
+    通过exec在容器内运行的进程
+
+    接口与asyncio.subprocess.Process的常用部分相同（stdin、stdout、stderr、returncode、wait()、kill()），
+    代理中创建docker exec子进程的地方可以直接替换为它。
+    """
+
+    def __init__(self, client: "DockerEngineClient", exec_id: str,
+                 reader: asyncio.StreamReader, writer: asyncio.StreamWriter, capture_stderr: bool = True):
+        self.client = client
+        self.exec_id = exec_id
+        self.pid: Optional[int] = None
+        self.returncode: Optional[int] = None
+        self.stdin = _ExecStdin(writer)
+        self.stdout = asyncio.StreamReader(limit=2 ** 20)
+        self.stderr = asyncio.StreamReader(limit=2 ** 20)
+        self._capture_stderr = capture_stderr
+        self._reader = reader
+        self._writer = writer
+        self._killed = False
+        self._pump_task = asyncio.ensure_future(self._pump())
+
+    async def _pump(self) -> None:
+        """拆分多路复用的输出流：每帧8字节头（流类型、3字节保留、4字节大端长度）后跟数据"""
+        try:
+            while True:
+                header = await self._reader.readexactly(8)
+                stream, size = header[0], struct.unpack(">I", header[4:])[0]
+                data = await self._reader.readexactly(size) if size else b""
+                if stream == 1:
+                    self.stdout.feed_data(data)
+                elif stream == 2 and self._capture_stderr:
+                    self.stderr.feed_data(data)
+        except (asyncio.IncompleteReadError, ConnectionError, OSError):
+            pass  # 连接关闭即输出结束
+        finally:
+            self.stdout.feed_eof()
+            self.stderr.feed_eof()
+            self._writer.close()
+        if self._killed:
+            self.returncode = -signal.SIGKILL
+            return
+        try:
+            self.returncode = await self._exit_code()
+        except Exception:
+            self.returncode = -1
+
+    async def _exit_code(self) -> int:
+        """输出结束后查询exec的退出码；进程可能在连接关闭后片刻才退出"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + EXEC_EXIT_TIMEOUT
+        delay = 0.005
+        while True:
+            info = await self.client.exec_inspect(self.exec_id)
+            self.pid = info.get("Pid") or self.pid
+            if not info.get("Running") or loop.time() >= deadline:
+                exit_code = info.get("ExitCode")
+                return exit_code if isinstance(exit_code, int) else -1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.1)
+
+    async def wait(self) -> int:
+        await asyncio.shield(self._pump_task)
+        return self.returncode
+
+    def kill(self) -> None:
+        """
+        断开与exec的连接
+
+        Engine API没有结束exec进程的接口：与结束docker exec客户端的效果相同，容器内的进程读到stdin结束，
+        由进程自己退出（tool_worker和逐次执行的脚本都会这样做）。
+        """
+        self._killed = True
+        self._writer.close()
+
+
+class DockerEngineClient:
+    """通过unix socket访问Docker Engine API，普通请求复用保持的连接"""
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, api_version: str = API_VERSION):
+        self.socket_path = socket_path
+        self.api_version = api_version
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self.stats = {"requests": 0, "connections": 0, "execs": 0}
+
+    # ---- 容器 ----
+
+    async def ping(self) -> bool:
+        status, _, _ = await self._request("GET", "/_ping")
+        return status == 200
+
+    async def inspect_container(self, name: str) -> Optional[Dict]:
+        """查询容器，不存在时返回None"""
+        status, _, body = await self._request("GET", f"/containers/{quote(name)}/json")
+        if status == 404:
+            return None
+        return self._decode(status, body)
+
+    async def create_container(self, name: str, config: Dict) -> str:
+        """创建容器（相当于docker create），返回容器id"""
+        status, _, body = await self._request("POST", "/containers/create", {"name": name}, config)
+        return self._decode(status, body)["Id"]
+
+    async def start_container(self, name: str) -> None:
+        status, _, body = await self._request("POST", f"/containers/{quote(name)}/start")
+        if status != 304:  # 304: 容器已经在运行
+            self._decode(status, body)
+
+    async def remove_container(self, name: str, force: bool = True) -> None:
+        status, _, body = await self._request("DELETE", f"/containers/{quote(name)}", {"force": "1" if force else "0"})
+        if status != 404:
+            self._decode(status, body)
+
+    # ---- exec ----
+
+    async def exec_create(self, container: str, cmd: List[str], stdin: bool = True,
+                          env: Optional[List[str]] = None, workdir: Optional[str] = None) -> str:
+        """创建exec（尚未运行），返回exec id"""
+        config: Dict[str, Any] = {
+            "Cmd": cmd, "AttachStdin": stdin, "AttachStdout": True, "AttachStderr": True, "Tty": False,
+        }
+        if env:
+            config["Env"] = env
+        if workdir:
+            config["WorkingDir"] = workdir
+        status, _, body = await self._request("POST", f"/containers/{quote(container)}/exec", body=config)
+        return self._decode(status, body)["Id"]
+
+    async def exec_start(self, exec_id: str, capture_stderr: bool = True) -> ExecProcess:
+        """在一条新连接上启动exec并接管该连接，返回可读写的进程对象"""
+        reader, writer = await self._open()
+        try:
+            writer.write(self._encode("POST", f"/exec/{exec_id}/start", None, {"Detach": False, "Tty": False},
+                                      extra_headers="Connection: Upgrade\r\nUpgrade: tcp\r\n"))
+            await writer.drain()
+            status, headers = await _read_head(reader)
+            if status not in (101, 200):
+                body = await _read_body(reader, headers)
+                self._decode(status, body)
+        except BaseException:
+            writer.close()
+            raise
+        self.stats["execs"] += 1
+        return ExecProcess(self, exec_id, reader, writer, capture_stderr=capture_stderr)
+
+    async def exec_inspect(self, exec_id: str) -> Dict:
+        """查询exec的状态（Running、ExitCode、Pid）"""
+        status, _, body = await self._request("GET", f"/exec/{exec_id}/json")
+        return self._decode(status, body)
+
+    async def exec(self, container: str, cmd: List[str], capture_stderr: bool = True) -> ExecProcess:
+        """相当于 docker exec -i：创建并启动exec"""
+        exec_id = await self.exec_create(container, cmd)
+        return await self.exec_start(exec_id, capture_stderr=capture_stderr)
+
+    async def exec_run(self, container: str, cmd: List[str], input: bytes = b"") -> Tuple[int, bytes, bytes]:
+        """运行一条命令直到结束，返回(退出码, stdout, stderr)"""
+        process = await self.exec(container, cmd)
+        if input:
+            process.stdin.write(input)
+            await process.stdin.drain()
+        process.stdin.close()
+        stdout, stderr = await asyncio.gather(process.stdout.read(), process.stderr.read())
+        return await process.wait(), stdout, stderr
+
+    async def close(self) -> None:
+        """关闭空闲连接；已启动的exec各自持有连接，不受影响"""
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+
+    # ---- HTTP ----
+
+    async def _open(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        self.stats["connections"] += 1
+        return await asyncio.open_unix_connection(self.socket_path, limit=2 ** 20)
+
+    def _encode(self, method: str, path: str, params: Optional[Dict], body: Any, extra_headers: str = "") -> bytes:
+        target = f"/{self.api_version}{path}" + (f"?{urlencode(params)}" if params else "")
+        content = json.dumps(body).encode("utf-8") if body is not None else b""
+        head = (
+            f"{method} {target} HTTP/1.1\r\n"
+            f"Host: docker\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(content)}\r\n"
+            f"{extra_headers}\r\n"
+        )
+        return head.encode("latin-1") + content
+
+    async def _request(self, method: str, path: str, params: Optional[Dict] = None,
+                       body: Any = None) -> Tuple[int, Dict[str, str], bytes]:
+        """发送一个请求并读取完整响应；复用的连接已被守护进程关闭时换一条新连接重试一次"""
+        self.stats["requests"] += 1
+        data = self._encode(method, path, params, body)
+        while True:
+            reused = bool(self._idle)
+            reader, writer = self._idle.pop() if reused else await self._open()
+            try:
+                writer.write(data)
+                await writer.drain()
+                status, headers = await _read_head(reader)
+                content = await _read_body(reader, headers)
+            except (asyncio.IncompleteReadError, ConnectionError, OSError):
+                writer.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                writer.close()  # 读到一半被取消，连接状态未知，不再复用
+                raise
+            if headers.get("connection", "").lower() == "close" or len(self._idle) >= MAX_IDLE_CONNECTIONS:
+                writer.close()
+            else:
+                self._idle.append((reader, writer))
+            return status, headers, content
+
+    @staticmethod
+    def _decode(status: int, body: bytes) -> Any:
+        """检查状态码并解析JSON响应体"""
+        try:
+            payload = json.loads(body) if body else {}
+        except ValueError:
+            payload = {"message": body.decode("utf-8", "replace")}
+        if status >= 400:
+            message = payload.get("message") if isinstance(payload, dict) else None
+            raise DockerAPIError(f"Docker API错误 {status}: {message or body[:200]!r}", status)
+        return payload
+
+
+async def _read_head(reader: asyncio.StreamReader) -> Tuple[int, Dict[str, str]]:
+    """读取响应的状态行和头部"""
+    status_line = (await reader.readuntil(b"\r\n")).decode("latin-1")
+    parts = status_line.split(" ", 2)
+    if len(parts) < 2 or not parts[1].isdigit():
+        raise DockerAPIError(f"无效的响应: {status_line.strip()!r}")
+    headers: Dict[str, str] = {}
+    while True:
+        line = (await reader.readuntil(b"\r\n")).decode("latin-1")
+        if line == "\r\n":
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return int(parts[1]), headers
+
+
+async def _read_body(reader: asyncio.StreamReader, headers: Dict[str, str]) -> bytes:
+    """按Content-Length或chunked编码读取响应体"""
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        chunks = []
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            if size == 0:
+                await reader.readuntil(b"\r\n")
+                return b"".join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+    length = int(headers.get("content-length") or 0)
+    return await reader.readexactly(length) if length else b""
+
+
+_MEMORY_UNITS = {"": 1, "b": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+
+
+def parse_memory(value: str) -> int:
+    """把docker命令行的内存写法（例如"512m"、"1g"）转换为字节数"""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([bkmg]?)b?\s*", str(value).lower())
+    if not match:
+        raise ValueError(f"无效的内存大小: {value}")
+    return int(float(match.group(1)) * _MEMORY_UNITS[match.group(2)])
+
+
+def docker_socket_path() -> Optional[str]:
+    """按环境变量确定要使用的Engine API socket，不使用时返回None"""
+    setting = os.environ.get("NANOMANUS_DOCKER_API")
+    if setting is not None:
+        if setting.lower() in ("", "0", "false", "no", "off"):
+            return None
+        return setting[len("unix://"):] if setting.startswith("unix://") else setting
+    if os.environ.get("NANOMANUS_DOCKER_BIN"):
+        return None
+    host = os.environ.get("DOCKER_HOST", "")
+    if host and not host.startswith("unix://"):
+        return None  # tcp://等远程守护进程仍通过命令行访问
+    path = host[len("unix://"):] if host else DEFAULT_SOCKET
+    return path if os.path.exists(path) and os.access(path, os.R_OK | os.W_OK) else None
+
+
+# 事件循环 -> 客户端；连接与事件循环绑定，因此按循环分别共享
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Optional[DockerEngineClient]]" = weakref.WeakKeyDictionary()
+
+
+def get_docker_client() -> Optional[DockerEngineClient]:
+    """获取当前事件循环共享的Engine API客户端；不使用Engine API时返回None，调用方改用docker命令行"""
+    loop = asyncio.get_running_loop()
+    if loop not in _clients:
+        path = docker_socket_path()
+        _clients[loop] = DockerEngineClient(path) if path else None
+    return _clients[loop]
+
+
+async def close_docker_clients() -> None:
+    """关闭当前事件循环中客户端的空闲连接"""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
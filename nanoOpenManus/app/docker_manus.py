@@ -1,4 +1,7 @@
 import os
+import time
+from typing import Optional
+from nanoOpenManus.app.console import console_print
 from nanoOpenManus.app.manus import Manus
 from nanoOpenManus.app.tools.python_execute import PythonExecute
 from nanoOpenManus.app.tools.file_saver import FileSaver
@@ -22,8 +25,24 @@ class DockerManus(Manus):
         api_key=None,
         model=None,
         base_url=None,
-        container_name="nanomanus-sandbox"
+        container_name="nanomanus-sandbox",
+        sandbox_pool=None,
+        parallel_tool_calls=False,
+        max_parallel_tools=4,
+        stream=False,
+        context_budget=None,
+        llm_cache=None,
+        reset_workspace=False,
+        blob_threshold=None,
+        blob_store=None
     ):
+        """
+        Args:
+            container_name: 固定使用的沙箱容器名称（未提供sandbox_pool时生效）
+            sandbox_pool: 可选的SandboxPool；提供时每次run()从池中租用一个独立的沙箱
+            reset_workspace: 使用固定容器时，第一次run()前为工作区建立快照，
+                之后每次run()结束都把工作区还原到该快照（池中的沙箱在归还时总会被还原）
+        """
         # 使用父类初始化基本属性
         super().__init__(
             name=name,
@@ -31,20 +50,49 @@ class DockerManus(Manus):
             max_steps=max_steps,
             api_key=api_key,
             model=model,
-            base_url=base_url
+            base_url=base_url,
+            parallel_tool_calls=parallel_tool_calls,
+            max_parallel_tools=max_parallel_tools,
+            stream=stream,
+            context_budget=context_budget,
+            llm_cache=llm_cache,
+            blob_threshold=blob_threshold,
+            blob_store=blob_store
         )
+        self.sandbox_pool = sandbox_pool
+        self.reset_workspace = reset_workspace
+        self.last_reset: Optional[dict] = None  # 最近一次还原工作区的统计
+        self._snapshot_taken = False
+        if sandbox_pool is not None:
+            # 容器在run()时从池中租用，这里不绑定固定容器
+            return
         
-        # 创建Docker工具代理
+        # 创建Docker工具代理；容器在后台检查，第一次工具调用时才等待检查结果
         try:
             self.docker_proxy = DockerToolProxy(container_name)
             
             # 替换工具为Docker包装版本
             self._wrap_tools_with_docker()
             
-            print(f"🐳 工具已配置为在Docker容器 '{container_name}' 中执行")
+            console_print(f"🐳 工具已配置为在Docker容器 '{container_name}' 中执行")
         except Exception as e:
-            print(f"⚠️ Docker代理初始化失败: {str(e)}")
-            print("⚠️ 将继续使用本地工具执行")
+            console_print(f"⚠️ Docker代理初始化失败: {str(e)}")
+            console_print("⚠️ 将继续使用本地工具执行")
+    
+    def _fallback_if_unavailable(self):
+        """后台的容器检查已经失败时改用本地工具；检查仍在进行时不等待，由第一次工具调用等待"""
+        proxy = getattr(self, "docker_proxy", None)
+        if proxy is None or proxy.ready_error is None:
+            return
+        console_print(f"⚠️ Docker代理初始化失败: {str(proxy.ready_error)}")
+        console_print("⚠️ 将继续使用本地工具执行")
+        del self.docker_proxy
+        self.available_tools.tool_map = {}
+        self.available_tools.add_tool(PythonExecute())
+        self.available_tools.add_tool(FileSaver())
+        self.available_tools.add_tool(EnvironmentCheck())
+        self.available_tools.add_tool(Terminate())
+        self._add_blob_tool()
     
     def _wrap_tools_with_docker(self):
         """将工具替换为Docker包装版本"""
@@ -65,4 +113,63 @@ class DockerManus(Manus):
         self.available_tools.add_tool(docker_python_tool)
         self.available_tools.add_tool(docker_file_tool)
         self.available_tools.add_tool(docker_terminate_tool)
-        self.available_tools.add_tool(docker_env_check_tool) 
\ No newline at end of file
+        self.available_tools.add_tool(docker_env_check_tool)
+        self._add_blob_tool()
+    
+    async def run(self, prompt: str, deadline: Optional[float] = None) -> str:
+        """
+        运行代理；使用沙箱池时在本次运行期间独占一个沙箱，结束后归还
+
+        等待空闲沙箱的时间也计入deadline
+        """
+        if self.sandbox_pool is None:
+            self._fallback_if_unavailable()
+            if not self.reset_workspace or not hasattr(self, "docker_proxy"):
+                return await super().run(prompt, deadline=deadline)
+            await self._snapshot_workspace()
+            try:
+                return await super().run(prompt, deadline=deadline)
+            finally:
+                await self._restore_workspace()
+        
+        started = time.monotonic()
+        async with self.sandbox_pool.lease() as sandbox:
+            self.docker_proxy = sandbox.proxy
+            self._wrap_tools_with_docker()
+            console_print(f"🐳 本次运行使用沙箱容器 '{sandbox.container_name}'")
+            if deadline is not None:
+                deadline = max(0.0, deadline - (time.monotonic() - started))
+            return await super().run(prompt, deadline=deadline)
+    
+    async def _snapshot_workspace(self):
+        """第一次运行前为固定容器的工作区建立快照；容器不可用时跳过，由工具调用报告错误"""
+        if self._snapshot_taken:
+            return
+        try:
+            await self.docker_proxy.wait_ready()
+            stats = await self.docker_proxy.snapshot_workspace()
+        except Exception as e:
+            console_print(f"⚠️ 建立工作区快照失败，本次运行后不还原: {str(e)}")
+            return
+        self._snapshot_taken = True
+        console_print(f"📸 已为工作区建立快照: {stats.get('files', 0)} 个文件，{stats.get('bytes', 0)} 字节")
+    
+    async def _restore_workspace(self):
+        """运行结束后把工作区还原到快照，并记录耗时和回收的字节数"""
+        if not self._snapshot_taken:
+            return
+        try:
+            self.last_reset = await self.docker_proxy.reset_workspace()
+        except Exception as e:
+            console_print(f"⚠️ 还原工作区失败: {str(e)}")
+            return
+        console_print(f"🧹 工作区已还原: 删除 {self.last_reset.get('removed', 0)} 项，"
+              f"回收 {self.last_reset.get('reclaimed_bytes', 0)} 字节，耗时 {self.last_reset['total_ms']:.1f}ms")
+    
+    async def close(self):
+        """释放工具和Docker代理持有的资源（容器内的会话和常驻worker）；池中沙箱的资源由沙箱池管理"""
+        if self.sandbox_pool is not None:
+            return  # 工具包装的是已归还的沙箱的代理，可能已被其他代理租用
+        await super().close()
+        if hasattr(self, "docker_proxy"):
+            await self.docker_proxy.close()
@@ -0,0 +1,89 @@
+"""
+代理运行事件
+
+BaseAgent.emit以(事件名, 数据字典)通知监听器；这里把其中面向使用方的事件转换为带类型的对象，
+由BaseAgent.run_stream()逐个产出:
+
+    StepStarted     一个思考-行动步骤开始          step
+    LLMDelta        LLM生成的一段回复内容           step, content
+    ToolCallStarted 开始执行一个工具调用            step, tool_call_id, name, arguments
+    ToolCallResult  工具调用结束                    step, tool_call_id, name, observation, error, elapsed_ms
+    StateChanged    代理状态改变                    old, new
+    FinalAnswer     运行结束（完成、出错或被取消）  result, state, steps
+
+流式模式下LLMDelta随模型生成逐段到达；非流式模式下每次回复只有一个包含完整内容的LLMDelta。
+"""
+from typing import Any, Dict, Optional
+
+
+class AgentEvent:
+    """事件基类；type与emit的事件名对应，字段即事件数据"""
+
+    type = "event"
+    fields: tuple = ()
+
+    def __init__(self, **data):
+        for name in self.fields:
+            setattr(self, name, data.get(name))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"type": self.type, **{name: getattr(self, name) for name in self.fields}}
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.fields)
+        return f"{type(self).__name__}({values})"
+
+
+class StepStarted(AgentEvent):
+    type = "step"
+    fields = ("step",)
+
+
+class LLMDelta(AgentEvent):
+    type = "llm_delta"
+    fields = ("step", "content")
+
+
+class ToolCallStarted(AgentEvent):
+    type = "tool_call"
+    fields = ("step", "tool_call_id", "name", "arguments")
+
+
+class ToolCallResult(AgentEvent):
+    type = "tool_result"
+    fields = ("step", "tool_call_id", "name", "observation", "error", "elapsed_ms")
+
+
+class StateChanged(AgentEvent):
+    type = "state_changed"
+    fields = ("old", "new")
+
+
+class FinalAnswer(AgentEvent):
+    type = "final"
+    fields = ("result", "state", "steps")
+
+
+# emit的事件名 -> 事件类型；run_finished、run_error、run_cancelled都以FinalAnswer结束事件流
+_EVENT_TYPES = {
+    "step": StepStarted,
+    "llm_delta": LLMDelta,
+    "tool_call": ToolCallStarted,
+    "tool_result": ToolCallResult,
+    "state_changed": StateChanged,
+}
+_FINAL_EVENTS = {"run_finished": "finished", "run_error": "error", "run_cancelled": "cancelled"}
+
+
+def is_public_event(name: str) -> bool:
+    """make_event是否会把该事件转换为带类型的事件"""
+    return name in _EVENT_TYPES or name in _FINAL_EVENTS
+
+
+def make_event(name: str, data: Dict[str, Any]) -> Optional[AgentEvent]:
+    """把emit的事件转换为带类型的事件；不对外产出的事件（例如message）返回None"""
+    if name in _FINAL_EVENTS:
+        result = data.get("result", data.get("error"))
+        return FinalAnswer(result=result, state=_FINAL_EVENTS[name], steps=data.get("steps"))
+    event_type = _EVENT_TYPES.get(name)
+    return event_type(**data) if event_type is not None else None
@@ -1,65 +1,142 @@
 import json
 import os
-from typing import Dict, List, Optional
+import time
+from typing import Callable, Dict, List, Optional
 
 import httpx
 
 from nanoOpenManus.app.agent import Message
+from nanoOpenManus.app.console import console_print
+from nanoOpenManus.app.llm_cache import LLMResponseCache
+from nanoOpenManus.app.tracing import current_span, get_tracer
+from nanoOpenManus.app.transport import LLMError, LLMTransport, get_transport
 
 
 class LLMResponse:
     """标准化的LLM响应对象，包含内容和工具调用"""
-    def __init__(self, content: Optional[str], tool_calls: Optional[List[Dict]]):
+    def __init__(self, content: Optional[str], tool_calls: Optional[List[Dict]], cached: bool = False, usage: Optional[Dict] = None):
         self.content = content
         self.tool_calls = tool_calls if tool_calls is not None else []
+        self.cached = cached  # 是否来自响应缓存
+        self.usage = usage or {}  # 服务端返回的token用量（prompt_tokens、completion_tokens等），未返回时为空
+
+
+def _dumps(value) -> bytes:
+    """紧凑的JSON编码，与Message.encode使用相同的格式"""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class RequestEncoder:
+    """
+    增量构造chat completions请求体
+    
+    对话历史在多步之间只会在末尾追加，因此上一次请求中已编码的消息前缀可以直接复用：
+    每条消息的编码缓存在Message上，这里再缓存拼接好的messages数组，
+    下一次只需校验前缀未变并追加新消息。工具描述按列表对象缓存编码结果
+    （ToolCollection.to_params()在工具集合不变时返回同一个列表）。
+    """
+    
+    def __init__(self):
+        self._encoded: List[bytes] = []  # 已拼接进缓冲区的每条消息的编码
+        self._offsets: List[int] = []  # 每条消息之后缓冲区的长度
+        self._buffer = bytearray()  # messages数组的内容（不含方括号）
+        self._tools_ref: Optional[List[Dict]] = None
+        self._tools_bytes = b""
+    
+    def build(self, fields: Dict, messages: List[Message], tools: Optional[List[Dict]]) -> bytes:
+        """构造请求体：fields中的标量字段 + tools + messages"""
+        parts = [_dumps(fields)[:-1]]  # 去掉结尾的"}"，后面继续追加字段
+        if tools:
+            parts.append(b',"tools":')
+            parts.append(self._encode_tools(tools))
+        parts.append(b',"messages":[')
+        parts.append(self._encode_messages(messages))
+        parts.append(b"]}")
+        return b"".join(parts)
+    
+    def _encode_tools(self, tools: List[Dict]) -> bytes:
+        if tools is not self._tools_ref:
+            self._tools_ref = tools
+            self._tools_bytes = _dumps(tools)
+        return self._tools_bytes
+    
+    def _encode_messages(self, messages: List[Message]) -> bytearray:
+        encoded = [msg.encode() for msg in messages]  # 命中Message上的缓存时不做任何编码
+        
+        # 找到与上次请求相同的最长前缀（编码对象相同时无需比较内容）
+        common = 0
+        limit = min(len(encoded), len(self._encoded))
+        while common < limit:
+            previous = self._encoded[common]
+            if encoded[common] is not previous and encoded[common] != previous:
+                break
+            common += 1
+        
+        # 截掉变化的部分，只追加新的消息
+        del self._encoded[common:]
+        del self._offsets[common:]
+        del self._buffer[self._offsets[-1] if self._offsets else 0:]
+        for item in encoded[common:]:
+            if item:
+                if self._buffer:
+                    self._buffer += b","
+                self._buffer += item
+            self._encoded.append(item)
+            self._offsets.append(len(self._buffer))
+        return self._buffer
 
 
 class LLM:
     """LLM 客户端，负责与LLM API通信"""
     
-    def __init__(self, api_key=None, model="deepseek-chat", base_url="https://api.deepseek.com"):
+    def __init__(self, api_key=None, model="deepseek-chat", base_url="https://api.deepseek.com", cache: Optional[LLMResponseCache] = None, transport: Optional[LLMTransport] = None):
+        """
+        Args:
+            api_key: API密钥
+            model: 模型名称
+            base_url: API基础URL
+            cache: 可选的响应缓存；请求使用temperature 0，相同请求的响应可以直接复用
+            transport: 可选的传输层；为None时使用当前事件循环中该服务的共享传输层
+        """
         self.api_key = api_key or os.environ.get("DEEPSEEK_API_KEY")
         if not self.api_key:
             raise ValueError("API 密钥未提供，请设置 DEEPSEEK_API_KEY 环境变量或在初始化时提供")
         
         self.model = model
         self.base_url = base_url
-        self.client = httpx.AsyncClient(timeout=120.0)
+        self._transport = transport
+        self.encoder = RequestEncoder()
+        self.cache = cache
+    
+    @property
+    def transport(self) -> LLMTransport:
+        """HTTP传输层；未显式指定时使用同一服务共享的连接池、重试和限流"""
+        return self._transport or get_transport(self.base_url)
+    
+    @property
+    def _completions_url(self) -> str:
+        return f"{self.base_url}/chat/completions"
+    
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}",
+        }
     
     def _convert_messages_to_api_format(self, messages: List[Message]) -> List[Dict]:
         """将内部Message对象列表转换为API所需的字典列表格式"""
         api_messages = []
         for msg in messages:
-            if msg.role == "system":
-                api_messages.append({"role": "system", "content": msg.content})
-            elif msg.role == "user":
-                api_messages.append({"role": "user", "content": msg.content})
-            elif msg.role == "assistant":
-                entry = {"role": "assistant"}
-                if msg.content:
-                    entry["content"] = msg.content
-                if msg.tool_calls: # msg.tool_calls should be a list of dicts from the API
-                    entry["tool_calls"] = msg.tool_calls
-                # An assistant message should have content or tool_calls or both. If neither, it might be an issue.
-                if "content" not in entry and "tool_calls" not in entry:
-                    entry["content"] = "" # Ensure content is at least an empty string if no tool_calls
-                api_messages.append(entry)
-            elif msg.role == "tool":
-                if msg.tool_call_id:
-                    api_messages.append({
-                        "role": "tool",
-                        "tool_call_id": msg.tool_call_id,
-                        "content": msg.content
-                    })
-                else:
-                    # This case should ideally not happen if tool_call_ids are managed correctly
-                    print(f"警告: 工具消息缺少 tool_call_id: {msg.content}")
-                    # Fallback: send as a generic content string, though this might not be what the API expects
-                    # api_messages.append({"role": "user", "content": f"Tool Output: {msg.content}"})
+            entry = msg.to_api_dict()
+            if entry is None:
+                # This case should ideally not happen if tool_call_ids are managed correctly
+                console_print(f"警告: 工具消息缺少 tool_call_id: {msg.content}")
+                continue
+            api_messages.append(entry)
         return api_messages
 
-    async def ask(self, messages, system_msgs=None):
-        """发送消息到 LLM 并获取响应"""
+    async def ask(self, messages, system_msgs=None, use_cache: bool = True):
+        """发送消息到 LLM 并获取响应；use_cache为False时跳过响应缓存"""
         all_messages = []
         
         # 添加系统消息
@@ -81,42 +158,39 @@ class LLM:
             
             all_messages.append(message_dict)
         
+        request_data = {
+            "model": self.model,
+            "messages": all_messages,
+            "temperature": 0.0,
+        }
+        
+        cache_key = None
+        if self.cache is not None and use_cache:
+            cache_key = self.cache.make_key(json.dumps(request_data, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                return cached.get("content")
+        
         # 发送请求
-        response = await self.client.post(
-            f"{self.base_url}/chat/completions",
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.api_key}",
-            },
-            json={
-                "model": self.model,
-                "messages": all_messages,
-                "temperature": 0.0,
-            },
-        )
-        
-        response.raise_for_status()
+        response = await self.transport.post(self._completions_url, self._headers(), _dumps(request_data))
         result = response.json()
         
         # 解析响应
         content = result["choices"][0]["message"]["content"]
+        if cache_key is not None:
+            await self.cache.put(cache_key, {"content": content})
         return content
     
-    async def ask_tool(self, messages: List[Message], system_msgs: Optional[List[Message]] = None, tools: Optional[List[Dict]] = None, tool_choice: Optional[str] = "auto"):
-        """发送消息到 LLM 并获取可能包含工具调用的响应"""
-        api_request_messages = []
-        if system_msgs:
-            api_request_messages.extend(self._convert_messages_to_api_format(system_msgs))
-        api_request_messages.extend(self._convert_messages_to_api_format(messages))
-        
-        request_data = {
+    def _build_tool_request(self, messages: List[Message], system_msgs: Optional[List[Message]], tools: Optional[List[Dict]], tool_choice: Optional[str], stream: bool = False) -> bytes:
+        """构造ask_tool的JSON请求体（已编码），消息和工具描述的编码会在多次请求之间复用"""
+        fields = {
             "model": self.model,
-            "messages": api_request_messages,
             "temperature": 0.0, # Lower temperature for more deterministic tool use
         }
+        if stream:
+            fields["stream"] = True
         
         if tools:
-            request_data["tools"] = tools
             if tool_choice: # DeepSeek might expect tool_choice only if tools are present
                 # OpenAI format for forcing a specific function or any function:
                 # tool_choice = {"type": "function", "function": {"name": "my_function"}}
@@ -124,51 +198,21 @@ class LLM:
                 # tool_choice = "auto" (default)
                 # tool_choice = "none"
                 if tool_choice == "required": # If you want to force a tool call
-                    request_data["tool_choice"] = "required" # Or {"type": "function"} if API expects object
+                    fields["tool_choice"] = "required" # Or {"type": "function"} if API expects object
                 elif tool_choice != "auto": # "none" or a specific function call object
-                    request_data["tool_choice"] = tool_choice
-        
-        # Debug: Print the request payload
-        # print(f"--- Request to LLM API ---")
-        # print(json.dumps(request_data, indent=2, ensure_ascii=False))
-        # print(f"---------------------------")
-
-        try:
-            response = await self.client.post(
-                f"{self.base_url}/chat/completions",
-                headers={
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {self.api_key}",
-                },
-                json=request_data,
-            )
-            
-            response.raise_for_status() # Will raise HTTPStatusError for 4xx/5xx responses
-            result = response.json()
-            
-            # Debug: Print the raw API response
-            # print(f"--- Response from LLM API ---")
-            # print(json.dumps(result, indent=2, ensure_ascii=False))
-            # print(f"-----------------------------")
-            
-        except httpx.HTTPStatusError as e:
-            print(f"HTTP error occurred: {e}")
-            print(f"Response content: {e.response.text}")
-            # Return an LLMResponse indicating error or re-raise
-            # For simplicity, let's return an empty response that the agent can check
-            return LLMResponse(content=f"API Error: {e.response.status_code} - {e.response.text}", tool_calls=[])
-        except httpx.RequestError as e:
-            print(f"Request error occurred: {e}")
-            return LLMResponse(content=f"Request Error: {str(e)}", tool_calls=[])
-        except Exception as e: # Catch any other unexpected errors during request or parsing
-            print(f"An unexpected error occurred: {str(e)}")
-            return LLMResponse(content=f"Unexpected Error: {str(e)}", tool_calls=[])
-
-        api_message = result.get("choices",[{}])[0].get("message", {})
-        content = api_message.get("content") # Content can be None if only tool_calls are present
+                    fields["tool_choice"] = tool_choice
         
+        all_messages = list(system_msgs or []) + list(messages)
+        for msg in all_messages:
+            if msg.encode() == b"":
+                # This case should ideally not happen if tool_call_ids are managed correctly
+                console_print(f"警告: 工具消息缺少 tool_call_id: {msg.content}")
+        return self.encoder.build(fields, all_messages, tools or None)
+    
+    @staticmethod
+    def _parse_tool_calls(raw_tool_calls: Optional[List[Dict]]) -> List[Dict]:
+        """从API返回的tool_calls中提取function类型的调用"""
         # API typically returns tool_calls as a list of objects, each with an id, type (function), and function (name, arguments)
-        raw_tool_calls = api_message.get("tool_calls") 
         parsed_tool_calls = []
         if raw_tool_calls:
             for tc in raw_tool_calls:
@@ -178,5 +222,189 @@ class LLM:
                         "type": "function", # Keep type for consistency if needed later
                         "function": tc.get("function") # This is {name: "...", arguments: "..."}
                     })
+        return parsed_tool_calls
+    
+    async def ask_tool(
+        self,
+        messages: List[Message],
+        system_msgs: Optional[List[Message]] = None,
+        tools: Optional[List[Dict]] = None,
+        tool_choice: Optional[str] = "auto",
+        stream: bool = False,
+        on_tool_call: Optional[Callable[[Dict], None]] = None,
+        use_cache: bool = True,
+        on_content: Optional[Callable[[str], None]] = None,
+    ):
+        """
+        发送消息到 LLM 并获取可能包含工具调用的响应
+        
+        Args:
+            messages: 对话历史
+            system_msgs: 系统消息
+            tools: 可用工具的函数调用描述
+            tool_choice: 工具选择策略
+            stream: 是否以SSE流式方式接收响应
+            on_tool_call: 仅流式模式使用；某个工具调用的参数生成完整后立即以该调用为参数被调用，
+                此时模型可能仍在生成后续的调用
+            use_cache: 为False时本次调用跳过响应缓存（既不读取也不写入）
+            on_content: 仅流式模式使用；每收到一段回复内容即以该段文本为参数被调用（命中缓存时以完整内容调用一次）
+        
+        Raises:
+            LLMError: 请求在重试耗尽后仍然失败，或服务端返回不可重试的错误
+        """
+        with get_tracer().span("llm.ask_tool", model=self.model, stream=stream) as span:
+            response = await self._ask_tool(messages, system_msgs, tools, tool_choice, stream, on_tool_call, use_cache, on_content)
+            span.set(
+                cached=response.cached,
+                tool_calls=len(response.tool_calls),
+                prompt_tokens=response.usage.get("prompt_tokens"),
+                completion_tokens=response.usage.get("completion_tokens"),
+                total_tokens=response.usage.get("total_tokens"),
+            )
+            return response
+    
+    async def _ask_tool(self, messages, system_msgs, tools, tool_choice, stream, on_tool_call, use_cache, on_content=None) -> LLMResponse:
+        """ask_tool的实现：先查响应缓存，未命中时请求API"""
+        cache_key = None
+        if self.cache is not None and use_cache:
+            # 缓存键基于非流式请求体，流式与非流式请求可以共享缓存
+            cache_key = self.cache.make_key(self._build_tool_request(messages, system_msgs, tools, tool_choice))
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                tool_calls = list(cached.get("tool_calls") or [])
+                if stream and on_content and cached.get("content"):
+                    on_content(cached["content"])
+                if stream and on_tool_call:
+                    for tool_call in tool_calls:
+                        on_tool_call(tool_call)
+                return LLMResponse(content=cached.get("content"), tool_calls=tool_calls, cached=True)
+        
+        response = await self._request_tool_completion(messages, system_msgs, tools, tool_choice, stream, on_tool_call, on_content)
+        if cache_key is not None:
+            await self.cache.put(cache_key, {"content": response.content, "tool_calls": response.tool_calls})
+        return response
+    
+    async def _request_tool_completion(self, messages, system_msgs, tools, tool_choice, stream, on_tool_call, on_content=None) -> LLMResponse:
+        """实际向API发送ask_tool请求"""
+        with get_tracer().span("llm.encode_request"):
+            body = self._build_tool_request(messages, system_msgs, tools, tool_choice, stream=stream)
+        current_span().set(request_bytes=len(body))
+        
+        # Debug: Print the request payload
+        # print(f"--- Request to LLM API ---")
+        # print(json.dumps(json.loads(body), indent=2, ensure_ascii=False))
+        # print(f"---------------------------")
         
-        return LLMResponse(content=content, tool_calls=parsed_tool_calls) 
\ No newline at end of file
+        if stream:
+            return await self._ask_tool_stream(body, on_tool_call, on_content)
+
+        # 可重试的错误（429、5xx、网络错误）由传输层重试，重试耗尽时抛出LLMError
+        response = await self.transport.post(self._completions_url, self._headers(), body)
+        current_span().set(response_bytes=len(response.content))
+        try:
+            result = response.json()
+        except ValueError as e:
+            raise LLMError(f"无法解析LLM响应: {str(e)}") from e
+        
+        # Debug: Print the raw API response
+        # print(f"--- Response from LLM API ---")
+        # print(json.dumps(result, indent=2, ensure_ascii=False))
+        # print(f"-----------------------------")
+
+        api_message = result.get("choices",[{}])[0].get("message", {})
+        content = api_message.get("content") # Content can be None if only tool_calls are present
+        
+        return LLMResponse(content=content, tool_calls=self._parse_tool_calls(api_message.get("tool_calls")), usage=result.get("usage"))
+    
+    async def _ask_tool_stream(self, body: bytes, on_tool_call: Optional[Callable[[Dict], None]],
+                               on_content: Optional[Callable[[str], None]] = None) -> LLMResponse:
+        """以SSE方式请求补全，增量拼接内容和工具调用参数"""
+        assembler = StreamAssembler(on_tool_call, on_content)
+        headers = self._headers()
+        headers["Accept"] = "text/event-stream"
+        span = current_span()
+        started = time.perf_counter()
+        first_chunk = True
+        async with self.transport.stream(self._completions_url, headers, body) as response:
+            try:
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue # 忽略空行、注释行和event/id等字段
+                    if first_chunk:
+                        span.set(first_chunk_ms=round((time.perf_counter() - started) * 1000, 3))  # 首个数据块的延迟
+                        first_chunk = False
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    assembler.feed(json.loads(data))
+            except (httpx.TransportError, ValueError) as e:
+                # 已经开始接收的流不会重试，部分工具调用可能已被提前分派
+                raise LLMError(f"LLM流式响应中断: {type(e).__name__}: {str(e)}") from e
+        
+        return assembler.finish()
+
+
+class StreamAssembler:
+    """
+    将流式chat completion的增量(delta)拼装为完整响应
+    
+    工具调用的arguments以片段形式分多次到达；当出现下一个index的调用（或流结束）时，
+    前一个调用即已完整，此时立即通过on_tool_call交给调用方。回复内容的每个片段到达时交给on_content。
+    """
+    
+    def __init__(self, on_tool_call: Optional[Callable[[Dict], None]] = None,
+                 on_content: Optional[Callable[[str], None]] = None):
+        self.on_tool_call = on_tool_call
+        self.on_content = on_content
+        self.content_parts: List[str] = []
+        self.tool_calls: Dict[int, Dict] = {}
+        self.usage: Optional[Dict] = None  # 部分服务端在最后一个数据块中返回token用量
+        self._completed = set()
+    
+    def feed(self, chunk: Dict) -> None:
+        """处理一个SSE数据块"""
+        if chunk.get("usage"):
+            self.usage = chunk["usage"]
+        for choice in chunk.get("choices") or []:
+            delta = choice.get("delta") or {}
+            if delta.get("content"):
+                self.content_parts.append(delta["content"])
+                if self.on_content:
+                    self.on_content(delta["content"])
+            for tc_delta in delta.get("tool_calls") or []:
+                index = tc_delta.get("index", 0)
+                if index not in self.tool_calls:
+                    # 新调用开始，说明之前的调用参数已经生成完毕
+                    self._complete_before(index)
+                    self.tool_calls[index] = {"id": None, "type": "function", "function": {"name": "", "arguments": ""}}
+                call = self.tool_calls[index]
+                if tc_delta.get("id"):
+                    call["id"] = tc_delta["id"]
+                if tc_delta.get("type"):
+                    call["type"] = tc_delta["type"]
+                function_delta = tc_delta.get("function") or {}
+                if function_delta.get("name"):
+                    call["function"]["name"] += function_delta["name"]
+                if function_delta.get("arguments"):
+                    call["function"]["arguments"] += function_delta["arguments"]
+            if choice.get("finish_reason"):
+                self._complete_before(None)
+    
+    def finish(self) -> LLMResponse:
+        """流结束时补发剩余调用并返回完整响应"""
+        self._complete_before(None)
+        content = "".join(self.content_parts) or None
+        tool_calls = [self.tool_calls[i] for i in sorted(self.tool_calls)]
+        return LLMResponse(content=content, tool_calls=LLM._parse_tool_calls(tool_calls), usage=self.usage)
+    
+    def _complete_before(self, index: Optional[int]) -> None:
+        """将index之前（index为None时为全部）尚未交付的调用标记为完整"""
+        for i in sorted(self.tool_calls):
+            if index is not None and i >= index:
+                break
+            if i in self._completed:
+                continue
+            self._completed.add(i)
+            call = self.tool_calls[i]
+            if self.on_tool_call and call.get("type") == "function":
+                self.on_tool_call({"id": call["id"], "type": "function", "function": call["function"]})
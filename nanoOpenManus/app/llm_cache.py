@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+class LLMResponseCache:
+    """
+    LLM响应缓存：内存LRU + SQLite磁盘存储
+
+    键是请求体（模型、消息、工具、tool_choice、temperature）的SHA-256，
+    值是解析后的响应（content与tool_calls）。只应缓存确定性请求（temperature为0）的成功响应。
+    内存层按条目数做LRU淘汰；磁盘层按总字节数淘汰最久未访问的条目，并在读取时检查TTL。
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_memory_entries: int = 256,
+        max_disk_bytes: int = 256 * 1024 * 1024,
+        ttl: Optional[float] = 7 * 24 * 3600,
+    ):
+        """
+        Args:
+            path: SQLite数据库文件路径；为None时只使用内存缓存
+            max_memory_entries: 内存中保留的最多条目数
+            max_disk_bytes: 磁盘缓存的最大总字节数
+            ttl: 条目有效期（秒），为None时永不过期
+        """
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (写入时间, 值)
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        if path:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            self._db.commit()
+
+    @staticmethod
+    def make_key(request_body: bytes) -> str:
+        """根据已编码的请求体计算缓存键"""
+        return hashlib.sha256(request_body).hexdigest()
+
+    @property
+    def hits(self) -> int:
+        return self.stats["memory_hits"] + self.stats["disk_hits"]
+
+    @property
+    def misses(self) -> int:
+        return self.stats["misses"]
+
+    async def get(self, key: str) -> Optional[Dict]:
+        """查找缓存，未命中或已过期时返回None"""
+        entry = self._memory.get(key)
+        if entry is not None and not self._expired(entry[0]):
+            self._memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return entry[1]
+        if entry is not None:
+            del self._memory[key]
+
+        if self._db is not None:
+            loop = asyncio.get_running_loop()
+            row = await loop.run_in_executor(None, self._db_get, key)
+            if row is not None:
+                created, value = row
+                self._remember(key, created, value)
+                self.stats["disk_hits"] += 1
+                return value
+
+        self.stats["misses"] += 1
+        return None
+
+    async def put(self, key: str, value: Dict) -> None:
+        """写入缓存"""
+        created = time.time()
+        self._remember(key, created, value)
+        self.stats["stores"] += 1
+        if self._db is not None:
+            data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._db_put, key, data, created)
+
+    def clear(self) -> None:
+        """清空内存和磁盘缓存"""
+        self._memory.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def close(self) -> None:
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def _remember(self, key: str, created: float, value: Dict) -> None:
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _db_get(self, key: str):
+        with self._db_lock:
+            row = self._db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            data, created = row
+            if self._expired(created):
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        return created, json.loads(data)
+
+    def _db_put(self, key: str, data: bytes, created: float) -> None:
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data), created, created),
+            )
+            if self.ttl is not None:
+                self._db.execute("DELETE FROM responses WHERE created < ?", (created - self.ttl,))
+            # 超出容量时淘汰最久未访问的条目
+            (total,) = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+            while total > self.max_disk_bytes:
+                row = self._db.execute("SELECT key, size FROM responses ORDER BY accessed LIMIT 1").fetchone()
+                if row is None:
+                    break
+                self._db.execute("DELETE FROM responses WHERE key = ?", (row[0],))
+                total -= row[1]
+                self.stats["evictions"] += 1
+            self._db.commit()
@@ -1,15 +1,19 @@
 import os
 from nanoOpenManus.app.agent import ToolCallAgent
+from nanoOpenManus.app.blob_store import BlobStore
+from nanoOpenManus.app.console import console_print
+from nanoOpenManus.app.context import ContextManager
+from nanoOpenManus.app.tools.blob_read import BlobRead
 from nanoOpenManus.app.tools.file_saver import FileSaver
 from nanoOpenManus.app.tools.python_execute import PythonExecute
 from nanoOpenManus.app.tools.terminate import Terminate
 from nanoOpenManus.app.tools.environment_check import EnvironmentCheck
 from nanoOpenManus.app.tools.tool_collection import ToolCollection
 
-# 尝试导入LLM和配置
+# 尝试导入LLM和配置；配置在创建代理时才加载
 try:
     from nanoOpenManus.app.llm import LLM
-    from nanoOpenManus.app.config import config
+    from nanoOpenManus.app.config import get_config
     LLM_AVAILABLE = True
 except ImportError:
     LLM_AVAILABLE = False
@@ -31,18 +35,42 @@ class Manus(ToolCallAgent):
         api_key=None,
         model=None,
         base_url=None,
+        parallel_tool_calls=False,
+        max_parallel_tools=4,
+        stream=False,
+        context_budget=None,
+        llm_cache=None,
+        blob_threshold=None,
+        blob_store=None,
     ):
+        """
+        Args:
+            blob_threshold: 超过该字符数的工具输出存入blob存储，历史中只保留预览，并提供blob_read工具；为None时不启用
+            blob_store: 多个代理共用的BlobStore；提供时忽略blob_threshold
+        """
+        if blob_store is None and blob_threshold:
+            blob_store = BlobStore(threshold=blob_threshold)
         system_prompt = "你是OpenManus，一个全能的AI助手，能够解决用户提出的任何任务。你可以调用各种工具来高效完成复杂的请求。无论是编程、信息检索、文件处理还是网页浏览，你都能应对自如。"
         next_step_prompt = """你可以使用以下工具与计算机交互：
         
 1. python_execute: 执行Python代码，用于与计算机系统交互、数据处理、自动化任务等。
-2. file_saver: 在本地保存文件，如txt、py、html等。
+2. file_saver: 在本地保存文件，如txt、py、html等；需要保存多个文件时使用files参数一次全部保存。
 3. environment_check: 检查代码执行环境，验证是本地环境还是Docker容器。
 4. terminate: 完成任务后终止代理执行。
 
 根据用户需求，主动选择最合适的工具或工具组合。对于复杂任务，可以将问题分解，逐步使用不同的工具来解决。每次使用工具后，清晰地解释执行结果并提出下一步建议。"""
 
-        super().__init__(name, description, system_prompt, next_step_prompt)
+        super().__init__(
+            name,
+            description,
+            system_prompt,
+            next_step_prompt,
+            parallel_tool_calls=parallel_tool_calls,
+            max_parallel_tools=max_parallel_tools,
+            stream=stream,
+            context_manager=ContextManager(token_budget=context_budget) if context_budget else None,
+            blob_store=blob_store,
+        )
         self.max_steps = max_steps
         
         # 添加内置工具
@@ -50,10 +78,13 @@ class Manus(ToolCallAgent):
         self.available_tools.add_tool(FileSaver())
         self.available_tools.add_tool(EnvironmentCheck())
         self.available_tools.add_tool(Terminate())
+        self._add_blob_tool()
         
         # 如果LLM可用，初始化LLM客户端
         if LLM_AVAILABLE:
             # 获取API密钥 - 优先使用传入的参数，其次使用配置，最后使用环境变量
+            # 参数齐全时不需要加载配置（查找.env）
+            config = get_config() if not (api_key and model and base_url) else None
             llm_api_key = api_key or (hasattr(config, 'llm_api_key') and config.llm_api_key) or os.environ.get("DEEPSEEK_API_KEY")
             llm_model = model or (hasattr(config, 'llm_model') and config.llm_model) or "deepseek-chat"
             llm_base_url = base_url or (hasattr(config, 'llm_base_url') and config.llm_base_url) or "https://api.deepseek.com"
@@ -63,15 +94,21 @@ class Manus(ToolCallAgent):
                     self.llm = LLM(
                         api_key=llm_api_key,
                         model=llm_model,
-                        base_url=llm_base_url
+                        base_url=llm_base_url,
+                        cache=llm_cache
                     )
-                    print(f"✅ LLM客户端初始化成功 (模型: {llm_model})")
+                    console_print(f"✅ LLM客户端初始化成功 (模型: {llm_model})")
                 except Exception as e:
-                    print(f"⚠️ LLM客户端初始化失败: {str(e)}")
+                    console_print(f"⚠️ LLM客户端初始化失败: {str(e)}")
                     self.llm = None
             else:
-                print("⚠️ 未提供API密钥，使用模拟思考模式")
+                console_print("⚠️ 未提供API密钥，使用模拟思考模式")
                 self.llm = None
         else:
-            print("⚠️ LLM模块不可用，使用模拟思考模式")
+            console_print("⚠️ LLM模块不可用，使用模拟思考模式")
             self.llm = None
+
+    def _add_blob_tool(self):
+        """启用了blob存储时添加blob_read工具；它读取的是代理进程中的存储，总在本地执行"""
+        if self.blob_store is not None:
+            self.available_tools.add_tool(BlobRead(self.blob_store))
@@ -0,0 +1,288 @@
+import asyncio
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from nanoOpenManus.app.console import console_print
+from nanoOpenManus.app.docker_api import get_docker_client, parse_memory
+from nanoOpenManus.app.tools.docker_proxy import DOCKER_COMMAND, DockerToolProxy
+
+
+class Sandbox:
+    """池中的一个沙箱容器及其工具代理"""
+
+    def __init__(self, container_name: str):
+        self.container_name = container_name
+        self.proxy = DockerToolProxy(container_name, ensure_running=False)
+        self.created_at = time.monotonic()
+        self.last_released = self.created_at
+        self.lease_count = 0
+
+
+class SandboxPool:
+    """
+    预热的沙箱容器池
+
+    池中始终保持至少min_size个已启动的容器，每次agent.run()租用其中一个，
+    运行结束后把工作区还原到新建时的状态（并丢弃容器内的会话状态）再放回池中，不需要重建容器。需要时按需扩容到max_size，
+    空闲超过idle_timeout的多余容器会被后台任务回收。
+    """
+
+    def __init__(
+        self,
+        image: str = "nanomanus-sandbox",
+        min_size: int = 1,
+        max_size: int = 4,
+        idle_timeout: float = 300.0,
+        reap_interval: float = 30.0,
+        name_prefix: str = "nanomanus-sandbox-pool",
+        workspace_dir: str = "/workspace_in_container",
+        cpus: str = "1",
+        memory: str = "1g",
+        network: str = "host",
+    ):
+        """
+        Args:
+            image: 沙箱镜像名称（由docker-compose build构建）
+            min_size: 保持预热的最少容器数
+            max_size: 容器数上限，达到上限后租用方会等待归还
+            idle_timeout: 超过min_size的容器空闲多少秒后被回收
+            reap_interval: 后台回收/补充任务的执行间隔（秒）
+            name_prefix: 容器名称前缀，同时作为标签用于识别池中的容器
+            workspace_dir: 容器内的工作目录，归还时被还原（旧镜像不支持快照时被清空）
+            cpus: 每个容器的CPU限制
+            memory: 每个容器的内存限制
+            network: 容器网络模式
+        """
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"无效的池大小: min_size={min_size}, max_size={max_size}")
+        self.image = image
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.reap_interval = reap_interval
+        self.name_prefix = name_prefix
+        self.workspace_dir = workspace_dir
+        self.cpus = cpus
+        self.memory = memory
+        self.network = network
+
+        self._idle: List[Sandbox] = []
+        self._leased: Dict[str, Sandbox] = {}
+        self._creating = 0
+        self._condition = asyncio.Condition()
+        self._reaper_task: Optional[asyncio.Task] = None
+        self._closed = False
+        # 归还时重置沙箱的统计：次数、总耗时和最大耗时（毫秒）、回收的字节数
+        self._resets = 0
+        self._reset_ms_total = 0.0
+        self._reset_ms_max = 0.0
+        self._reclaimed_bytes = 0
+
+    @property
+    def size(self) -> int:
+        """当前容器总数（含正在创建的）"""
+        return len(self._idle) + len(self._leased) + self._creating
+
+    def stats(self) -> Dict:
+        """返回池的当前状态"""
+        return {
+            "idle": len(self._idle),
+            "leased": len(self._leased),
+            "creating": self._creating,
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "resets": self._resets,
+            "reset_ms_avg": round(self._reset_ms_total / self._resets, 3) if self._resets else 0.0,
+            "reset_ms_max": round(self._reset_ms_max, 3),
+            "reclaimed_bytes": self._reclaimed_bytes,
+        }
+
+    async def start(self) -> None:
+        """预热min_size个容器并启动后台回收任务"""
+        await self._replenish()
+        if self._reaper_task is None:
+            self._reaper_task = asyncio.ensure_future(self._reap_loop())
+
+    async def acquire(self) -> Sandbox:
+        """租用一个沙箱；没有空闲容器时扩容，已达上限则等待归还"""
+        async with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("沙箱池已关闭")
+                if self._idle:
+                    sandbox = self._idle.pop()
+                    break
+                if self.size < self.max_size:
+                    self._creating += 1
+                    sandbox = None
+                    break
+                await self._condition.wait()
+
+        if sandbox is None:
+            try:
+                sandbox = await self._create_sandbox()
+            finally:
+                async with self._condition:
+                    self._creating -= 1
+                    self._condition.notify_all()
+
+        sandbox.lease_count += 1
+        self._leased[sandbox.container_name] = sandbox
+        return sandbox
+
+    async def release(self, sandbox: Sandbox) -> None:
+        """清理沙箱后放回池中；清理失败的容器直接销毁"""
+        self._leased.pop(sandbox.container_name, None)
+        try:
+            await self._reset_sandbox(sandbox)
+        except Exception as e:
+            console_print(f"⚠️ 重置沙箱 {sandbox.container_name} 失败，将销毁该容器: {str(e)}")
+            await self._destroy_sandbox(sandbox)
+            async with self._condition:
+                self._condition.notify_all()
+            return
+
+        sandbox.last_released = time.monotonic()
+        async with self._condition:
+            if self._closed:
+                await self._destroy_sandbox(sandbox)
+                return
+            self._idle.append(sandbox)
+            self._condition.notify_all()
+
+    @asynccontextmanager
+    async def lease(self):
+        """以上下文管理器的方式租用沙箱，退出时自动归还"""
+        sandbox = await self.acquire()
+        try:
+            yield sandbox
+        finally:
+            await self.release(sandbox)
+
+    async def close(self) -> None:
+        """停止后台任务并销毁所有空闲容器；租出的容器在归还时销毁"""
+        self._closed = True
+        if self._reaper_task is not None:
+            self._reaper_task.cancel()
+            await asyncio.gather(self._reaper_task, return_exceptions=True)
+            self._reaper_task = None
+        async with self._condition:
+            idle, self._idle = self._idle, []
+            self._condition.notify_all()
+        await asyncio.gather(*(self._destroy_sandbox(s) for s in idle), return_exceptions=True)
+
+    async def _reap_loop(self) -> None:
+        """定期回收空闲过久的多余容器，并补足min_size"""
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            try:
+                await self._reap_idle()
+                await self._replenish()
+            except Exception as e:
+                console_print(f"⚠️ 沙箱池维护任务出错: {str(e)}")
+
+    async def _reap_idle(self) -> None:
+        now = time.monotonic()
+        expired = []
+        async with self._condition:
+            # 最早归还的容器排在前面，优先回收
+            self._idle.sort(key=lambda s: s.last_released)
+            while self._idle and self.size > self.min_size:
+                if now - self._idle[0].last_released < self.idle_timeout:
+                    break
+                expired.append(self._idle.pop(0))
+        for sandbox in expired:
+            await self._destroy_sandbox(sandbox)
+
+    async def _replenish(self) -> None:
+        async with self._condition:
+            missing = max(0, self.min_size - self.size)
+            self._creating += missing
+
+        async def create_one():
+            try:
+                sandbox = await self._create_sandbox()
+            finally:
+                async with self._condition:
+                    self._creating -= 1
+            async with self._condition:
+                self._idle.append(sandbox)
+                self._condition.notify_all()
+
+        results = await asyncio.gather(*(create_one() for _ in range(missing)), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                console_print(f"⚠️ 预热沙箱容器失败: {str(result)}")
+
+    async def _create_sandbox(self) -> Sandbox:
+        """启动一个新的沙箱容器；Engine API可用时直接创建并启动，否则使用docker run"""
+        container_name = f"{self.name_prefix}-{uuid.uuid4().hex[:8]}"
+        client = get_docker_client()
+        if client is None:
+            await _run_docker(
+                "run", "-d",
+                "--name", container_name,
+                "--label", f"nanomanus.pool={self.name_prefix}",
+                "--cpus", self.cpus,
+                "--memory", self.memory,
+                "--security-opt", "no-new-privileges=true",
+                "--network", self.network,
+                self.image,
+                "tail", "-f", "/dev/null",
+            )
+            return Sandbox(container_name)
+
+        # 与上面的docker run选项一一对应
+        await client.create_container(container_name, {
+            "Image": self.image,
+            "Cmd": ["tail", "-f", "/dev/null"],
+            "Labels": {"nanomanus.pool": self.name_prefix},
+            "HostConfig": {
+                "NanoCpus": int(float(self.cpus) * 1e9),
+                "Memory": parse_memory(self.memory),
+                "SecurityOpt": ["no-new-privileges=true"],
+                "NetworkMode": self.network,
+            },
+        })
+        try:
+            await client.start_container(container_name)
+        except BaseException:
+            await asyncio.shield(client.remove_container(container_name, force=True))
+            raise
+        return Sandbox(container_name)
+
+    async def _reset_sandbox(self, sandbox: Sandbox) -> None:
+        """把容器工作区还原到新建时的状态，使下一个会话看不到上一个会话的文件和变量"""
+        started = time.perf_counter()
+        stats = await sandbox.proxy.reset_workspace(self.workspace_dir)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._resets += 1
+        self._reset_ms_total += elapsed_ms
+        self._reset_ms_max = max(self._reset_ms_max, elapsed_ms)
+        self._reclaimed_bytes += stats.get("reclaimed_bytes") or 0
+
+    async def _destroy_sandbox(self, sandbox: Sandbox) -> None:
+        await sandbox.proxy.close()
+        try:
+            client = get_docker_client()
+            if client is None:
+                await _run_docker("rm", "-f", sandbox.container_name)
+            else:
+                await client.remove_container(sandbox.container_name, force=True)
+        except Exception as e:
+            console_print(f"⚠️ 删除沙箱容器 {sandbox.container_name} 失败: {str(e)}")
+
+
+async def _run_docker(*args: str) -> str:
+    """执行一条docker命令，失败时抛出RuntimeError"""
+    process = await asyncio.create_subprocess_exec(
+        *DOCKER_COMMAND, *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(f"docker {args[0]} 失败: {stderr.decode().strip()}")
+    return stdout.decode().strip()
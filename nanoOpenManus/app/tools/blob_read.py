@@ -0,0 +1,106 @@
+from typing import Optional
+
+from nanoOpenManus.app.tools.base import BaseTool, ToolResult
+
+# 每次读取返回的最多字符数，须小于BlobStore的阈值，读取结果本身不会再被存入blob
+MAX_PAGE_CHARS = 6000
+
+
+class BlobRead(BaseTool):
+    """分页读取被存入blob存储的大型工具输出"""
+
+    # 读取结果已经是分页后的内容，直接写入历史
+    offload_output = False
+    # blob按内容寻址，同样的参数总是读到同样的内容
+    cache_policy = "pure"
+
+    def __init__(self, store):
+        """
+        Args:
+            store: 代理使用的BlobStore
+        """
+        super().__init__(
+            name="blob_read",
+            description=f"""读取之前被存入blob的大型工具输出。
+工具输出过大时，对话中只保留开头和结尾的预览以及一个形如blob:xxxxxxxxxxxxxxxx的句柄。
+需要查看其余内容时，用offset和length按字符位置读取，或用start_line和end_line按行号读取（从1开始，包含两端）。
+每次最多返回{MAX_PAGE_CHARS}个字符，内容更多时结果末尾会说明下一页的读取位置。""",
+            parameters={
+                "type": "object",
+                "properties": {
+                    "handle": {
+                        "type": "string",
+                        "description": "blob句柄，例如blob:0123456789abcdef。",
+                    },
+                    "offset": {
+                        "type": "integer",
+                        "description": "开始读取的字符位置，默认为0。",
+                        "default": 0,
+                    },
+                    "length": {
+                        "type": "integer",
+                        "description": f"读取的字符数，默认且最多为{MAX_PAGE_CHARS}。",
+                    },
+                    "start_line": {
+                        "type": "integer",
+                        "description": "按行读取时的起始行号（从1开始）；提供时忽略offset和length。",
+                    },
+                    "end_line": {
+                        "type": "integer",
+                        "description": "按行读取时的结束行号（包含），默认读到页大小上限为止。",
+                    },
+                },
+                "required": ["handle"],
+            }
+        )
+        self.store = store
+
+    async def execute(self, handle: str, offset: int = 0, length: Optional[int] = None,
+                      start_line: Optional[int] = None, end_line: Optional[int] = None) -> ToolResult:
+        """
+        读取blob的一部分
+
+        Args:
+            handle: blob句柄
+            offset: 开始读取的字符位置
+            length: 读取的字符数
+            start_line: 按行读取时的起始行号（从1开始）
+            end_line: 按行读取时的结束行号（包含）
+
+        Returns:
+            ToolResult: 读取到的内容及其位置说明
+        """
+        text = await self.store.get(handle)
+        if text is None:
+            return ToolResult(error=f"找不到 {handle}：句柄无效，或内容已被清理")
+        if start_line is not None:
+            return self._read_lines(handle, text, start_line, end_line)
+
+        offset = max(0, offset)
+        length = MAX_PAGE_CHARS if length is None else max(0, min(length, MAX_PAGE_CHARS))
+        if offset >= len(text):
+            return ToolResult(error=f"offset {offset} 超出范围，{handle} 共 {len(text)} 个字符")
+        end = min(len(text), offset + length)
+        header = f"[{handle} 第 {offset}-{end} 个字符，共 {len(text)} 个字符]"
+        footer = f"\n[还有 {len(text) - end} 个字符，下一页从offset={end}开始]" if end < len(text) else ""
+        return ToolResult(output=f"{header}\n{text[offset:end]}{footer}")
+
+    def _read_lines(self, handle: str, text: str, start_line: int, end_line: Optional[int]) -> ToolResult:
+        lines = text.splitlines(keepends=True)
+        start = max(1, start_line)
+        if start > len(lines):
+            return ToolResult(error=f"start_line {start_line} 超出范围，{handle} 共 {len(lines)} 行")
+        last = len(lines) if end_line is None else max(start, min(end_line, len(lines)))
+        # 在行边界处截断到页大小；单独一行就超过页大小时只返回该行的开头
+        parts, size, line_number = [], 0, start
+        while line_number <= last:
+            line = lines[line_number - 1]
+            if parts and size + len(line) > MAX_PAGE_CHARS:
+                break
+            parts.append(line[:MAX_PAGE_CHARS])
+            size += len(line)
+            line_number += 1
+        returned = line_number - 1
+        header = f"[{handle} 第 {start}-{returned} 行，共 {len(lines)} 行]"
+        footer = f"\n[下一页从start_line={returned + 1}开始]" if returned < last else ""
+        return ToolResult(output=f"{header}\n{''.join(parts)}{footer}")
@@ -1,10 +1,294 @@
 import json
 import os
+import shlex
 import subprocess
 import asyncio
-from typing import Dict, Any
+import itertools
+import time
+import uuid
+from typing import Dict, Any, List, Optional
 
+from nanoOpenManus.app.console import console_print
+from nanoOpenManus.app.docker_api import DockerEngineClient, get_docker_client
 from nanoOpenManus.app.tools.base import BaseTool, ToolResult
+from nanoOpenManus.app.tools.worker_protocol import encode_message, read_frame
+from nanoOpenManus.app.tracing import current_span, get_tracer
+
+
+# docker命令行，可用环境变量 NANOMANUS_DOCKER_BIN 替换（例如基准测试使用的本地替身 benchmarks/fake_docker.py）
+DOCKER_COMMAND = shlex.split(os.environ.get("NANOMANUS_DOCKER_BIN", "docker"))
+
+# 容器内常驻worker的启动命令，模块位于 docker/nanoOpenManus/app/tools/tool_worker.py
+WORKER_COMMAND = ["python", "-m", "nanoOpenManus.app.tools.tool_worker"]
+
+# worker未运行时建立/还原工作区快照的命令，模块位于 docker/nanoOpenManus/app/tools/workspace_snapshot.py
+SNAPSHOT_COMMAND = ["python", "-m", "nanoOpenManus.app.tools.workspace_snapshot"]
+
+# 容器内的工作区
+CONTAINER_WORKSPACE = "/workspace_in_container"
+
+# 不使用常驻worker时每次调用执行的脚本：从stdin读取一次调用的JSON，向stdout输出结果JSON。
+# 不依赖worker模块，旧镜像也能执行；旧镜像中的PythonExecute没有stateful参数，本身就是无状态的。
+# 宿主机在调用结束前保持stdin打开，stdin关闭（调用被取消、宿主机退出）时取消执行并退出，
+# python_execute执行代码的进程随之被杀死。
+ONE_SHOT_SCRIPT = """
+import sys, os, json, asyncio, threading
+from nanoOpenManus.app.tools.tool_collection import ToolCollection
+from nanoOpenManus.app.tools.python_execute import PythonExecute
+from nanoOpenManus.app.tools.file_saver import FileSaver
+from nanoOpenManus.app.tools.terminate import Terminate
+try:
+    python_tool = PythonExecute(stateful=False)
+except TypeError:
+    python_tool = PythonExecute()
+tools = ToolCollection(python_tool, FileSaver(), Terminate())
+tool_call = json.loads(sys.stdin.buffer.readline().decode('utf-8'))
+async def main():
+    loop, task = asyncio.get_running_loop(), asyncio.current_task()
+    threading.Thread(target=lambda: (os.read(0, 1), loop.call_soon_threadsafe(task.cancel)), daemon=True).start()
+    return await tools.execute(name=tool_call['tool'], tool_input=tool_call['args'])
+try:
+    result = asyncio.run(main())
+except asyncio.CancelledError:
+    sys.exit(1)
+print(json.dumps({'output': str(result.output) if result.output is not None else None,
+                  'error': str(result.error) if result.error is not None else None}))
+"""
+
+
+async def _docker_exec(container_name: str, cmd: List[str], capture_stderr: bool = True):
+    """
+    在容器内启动一个进程，相当于 `docker exec -i`
+
+    Engine API可用时通过unix socket创建exec（不需要为每次exec启动一个docker命令行进程），否则使用docker命令行。
+    两种方式返回的对象都有stdin、stdout、stderr、returncode、wait()和kill()。
+
+    Args:
+        container_name: 容器名称
+        cmd: 在容器内执行的命令
+        capture_stderr: 是否读取stderr；为False时丢弃
+    """
+    client = get_docker_client()
+    if client is not None:
+        return await client.exec(container_name, cmd, capture_stderr=capture_stderr)
+    return await asyncio.create_subprocess_exec(
+        *DOCKER_COMMAND, "exec", "-i", container_name, *cmd,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE if capture_stderr else asyncio.subprocess.DEVNULL,
+    )
+
+
+# 启动worker时等待其应答ping的秒数；docker exec卡住时超时，改为逐次执行
+WORKER_START_TIMEOUT = 30.0
+
+# worker启动失败后重试前的等待秒数，每次连续失败翻倍，最长WORKER_RETRY_MAX_DELAY秒
+WORKER_RETRY_DELAY = 1.0
+WORKER_RETRY_MAX_DELAY = 60.0
+
+
+class WorkerBackoff(RuntimeError):
+    """worker上次启动失败，尚未到重试时间"""
+
+
+# 逐次执行的调用被取消后，等待容器内脚本自行清理退出的秒数，超过后强制结束docker exec客户端
+ONE_SHOT_CANCEL_GRACE = 2.0
+
+
+async def _kill_after(process: asyncio.subprocess.Process, grace: float) -> None:
+    """等待进程在grace秒内退出，否则杀死它"""
+    try:
+        await asyncio.wait_for(process.wait(), timeout=grace)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+
+
+class ToolWorkerClient:
+    """
+    容器内常驻工具worker的客户端
+
+    通过一次 `docker exec -i` 启动worker，之后所有调用都复用这条stdin/stdout管道，
+    请求与响应通过id对应，多个调用可以同时在途。worker支持时，较长的参数和结果以二进制附件传输，
+    不经过JSON转义。等待调用的任务被取消时，同时通知worker取消容器内的执行。
+    """
+    
+    def __init__(self, container_name: str):
+        self.container_name = container_name
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self.attachments = False  # worker是否支持带附件的帧，由启动时的ping确定
+        self.cancellation = False  # worker是否支持cancel操作，由启动时的ping确定
+        self.snapshots = False  # worker是否支持工作区快照（snapshot/restore操作），由启动时的ping确定
+        self._cancel_tasks: set = set()  # 发送中的cancel请求，保留引用以免任务被回收
+        self._start_failures = 0  # 连续启动失败的次数
+        self._retry_at = 0.0  # 启动失败后，在此时刻（time.monotonic()）之前不再尝试启动
+        self._start_lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+    
+    @property
+    def running(self) -> bool:
+        return self._process is not None and self._process.returncode is None
+    
+    @property
+    def retry_delay(self) -> float:
+        """距离下次可以尝试启动还有多少秒"""
+        return max(0.0, self._retry_at - time.monotonic())
+    
+    async def start(self) -> None:
+        """
+        启动worker进程（已运行时直接返回）
+        
+        启动失败（包括ping超时）后按指数退避等待，期间的调用直接抛出WorkerBackoff，
+        由调用方改为逐次执行，到时间后的下一次调用重新尝试启动。
+        
+        Raises:
+            WorkerBackoff: 上次启动失败，尚未到重试时间
+        """
+        async with self._start_lock:
+            if self.running:
+                return
+            if self.retry_delay > 0:
+                raise WorkerBackoff(f"工具worker启动失败，{self.retry_delay:.1f}秒后重试")
+            try:
+                self._process = await _docker_exec(self.container_name, WORKER_COMMAND, capture_stderr=False)
+                self._reader_task = asyncio.ensure_future(self._read_loop(self._process))
+                # 用一次ping确认worker已经导入完工具并能应答，同时确认是否支持附件（旧镜像不支持）
+                self.attachments = self.cancellation = self.snapshots = False
+                response = await asyncio.wait_for(self._request({"op": "ping"}), timeout=WORKER_START_TIMEOUT)
+            except BaseException as e:
+                await self._abort()
+                if not isinstance(e, asyncio.CancelledError):
+                    delay = min(WORKER_RETRY_MAX_DELAY, WORKER_RETRY_DELAY * (2 ** self._start_failures))
+                    self._start_failures += 1
+                    self._retry_at = time.monotonic() + delay
+                if isinstance(e, asyncio.TimeoutError):
+                    raise TimeoutError(f"工具worker在{WORKER_START_TIMEOUT:.0f}秒内没有应答") from e
+                raise
+            self._start_failures = 0
+            self._retry_at = 0.0
+            self.attachments = bool(response.get("attachments"))
+            self.cancellation = bool(response.get("cancel"))
+            self.snapshots = bool(response.get("snapshot"))
+    
+    async def _abort(self) -> None:
+        """启动失败时杀死worker进程，下次启动时重新创建"""
+        process, self._process = self._process, None
+        if process is not None and process.returncode is None:
+            process.kill()
+            await process.wait()
+        if self._reader_task is not None:
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+            self._reader_task = None
+    
+    async def call(self, tool_name: str, args: Dict, session: Optional[str] = None) -> Dict:
+        """
+        通过worker执行一次工具调用
+        
+        Args:
+            tool_name: 工具名称
+            args: 工具参数
+            session: 会话id，同一会话的调用共享工具状态（例如python_execute的全局变量）
+        
+        Returns:
+            Dict: 包含output和error字段的响应
+        """
+        await self.start()
+        message = {"op": "call", "tool": tool_name, "args": args}
+        if session is not None:
+            message["session"] = session
+        return await self._request(message)
+    
+    async def close_session(self, session: str) -> None:
+        """释放worker中该会话的工具资源；worker未运行时没有需要释放的状态"""
+        if self.running:
+            await self._request({"op": "close_session", "session": session})
+    
+    async def workspace(self, op: str) -> Dict:
+        """
+        执行工作区快照操作
+        
+        Args:
+            op: "snapshot"建立快照，"restore"还原到快照（同时释放worker中的所有会话）
+        
+        Returns:
+            Dict: worker回报的统计
+        """
+        response = await self._request({"op": op})
+        if response.get("error"):
+            raise RuntimeError(response["error"])
+        return response
+    
+    async def _request(self, message: Dict) -> Dict:
+        process = self._process
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        message = {**message, "id": request_id}
+        if self.attachments:
+            message["binary"] = True  # 允许worker以附件形式回传长结果
+        chunks = encode_message(message, attachments=self.attachments)
+        current_span().add("request_bytes", sum(len(chunk) for chunk in chunks))
+        try:
+            async with self._write_lock:
+                process.stdin.writelines(chunks)
+                await process.stdin.drain()
+            return await future
+        except asyncio.CancelledError:
+            if message.get("op") == "call" and self.cancellation and process.returncode is None:
+                task = asyncio.ensure_future(self._cancel(request_id))
+                self._cancel_tasks.add(task)
+                task.add_done_callback(self._cancel_tasks.discard)
+            raise
+        finally:
+            self._pending.pop(request_id, None)
+    
+    async def _cancel(self, target: int) -> None:
+        """通知worker取消一个在途调用；worker已退出时调用自然结束，忽略错误"""
+        try:
+            await self._request({"op": "cancel", "target": target})
+        except Exception:
+            pass
+    
+    async def _read_loop(self, process: asyncio.subprocess.Process) -> None:
+        """持续读取响应帧，并唤醒对应id的等待者"""
+        error = ConnectionError("工具worker已退出")
+        try:
+            while True:
+                response = await read_frame(process.stdout)
+                if response is None:
+                    break
+                future = self._pending.get(response.pop("id", None))
+                if future is not None and not future.done():
+                    future.set_result(response)
+        except Exception as e:
+            error = ConnectionError(f"读取工具worker响应失败: {str(e)}")
+        finally:
+            # worker退出后让所有在途调用失败，下次调用会重新启动worker
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+    
+    async def close(self) -> None:
+        """关闭worker：关闭stdin后worker会在完成在途请求后自行退出"""
+        process = self._process
+        if process is None:
+            return
+        self._process = None
+        if process.returncode is None:
+            process.stdin.close()
+            try:
+                await asyncio.wait_for(process.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                process.kill()
+        if self._reader_task is not None:
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+            self._reader_task = None
 
 
 class DockerToolProxy:
@@ -12,28 +296,109 @@ class DockerToolProxy:
     工具代理类，将工具调用转发到Docker容器中执行
     """
     
-    def __init__(self, container_name="nanomanus-sandbox"):
+    def __init__(self, container_name="nanomanus-sandbox", use_worker: bool = True, ensure_running: bool = True):
+        """
+        Args:
+            container_name: 沙箱容器名称
+            use_worker: 是否使用容器内常驻worker；关闭时（或worker启动失败后的退避期间）每次调用单独执行一次docker exec
+            ensure_running: 是否检查并启动容器；由沙箱池创建的容器已确认在运行，可以跳过。
+                检查在后台线程中进行，不阻塞初始化，第一次工具调用时才等待其结果
+        """
         self.container_name = container_name
-        self._ensure_container_running()
+        self.use_worker = use_worker
+        self.worker = ToolWorkerClient(container_name) if use_worker else None
+        # 经由本代理的调用属于同一会话，在容器内共享工具状态，直到close_session()
+        self.session_id = uuid.uuid4().hex
+        self._session_used = False  # 当前会话是否有调用经由worker执行，没有时结束会话无需通知worker
+        self._reapers: set = set()  # 等待被取消的docker exec进程退出的后台任务
+        self._ready: Optional[asyncio.Future] = None  # 后台的容器检查，为None时表示尚未开始
+        self._checked = not ensure_running  # 容器是否已确认在运行
+        if ensure_running:
+            self.start_readiness_check()
+    
+    def start_readiness_check(self) -> None:
+        """
+        在后台开始检查（必要时启动）容器
+        
+        Engine API可用时作为事件循环中的任务，只需一两个请求；否则在线程中执行docker命令行，
+        事件循环被阻塞（例如等待用户输入）时检查同样在进行。没有运行中的事件循环时推迟到第一次工具调用。
+        """
+        if self._checked or self._ready is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        client = get_docker_client()
+        if client is not None:
+            self._ready = asyncio.ensure_future(self._ensure_container_running_api(client))
+        else:
+            self._ready = loop.run_in_executor(None, self._ensure_container_running)
+        # 失败由ready_error或wait_ready()报告；这里取走异常，没有人查看时也不会在回收时告警
+        self._ready.add_done_callback(lambda future: future.cancelled() or future.exception())
+    
+    @property
+    def ready_error(self) -> Optional[BaseException]:
+        """已完成的容器检查失败时返回其异常；检查未开始、未完成或成功时返回None"""
+        if self._ready is None or not self._ready.done() or self._ready.cancelled():
+            return None
+        return self._ready.exception()
+    
+    async def wait_ready(self) -> None:
+        """
+        等待容器检查完成
+        
+        Raises:
+            RuntimeError: 容器无法启动；下一次调用会重新检查
+        """
+        if self._checked:
+            return
+        self.start_readiness_check()
+        ready = self._ready
+        try:
+            # shield: 等待的调用被取消时检查仍在线程中继续，结果留给下一次调用
+            await asyncio.shield(ready)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            if self._ready is ready:
+                self._ready = None
+            raise
+        self._checked = True
     
     def _ensure_container_running(self):
         """确保Docker容器正在运行"""
         try:
             # 检查容器是否存在
-            check_cmd = ["docker", "ps", "-a", "--filter", f"name={self.container_name}", "--format", "{{.Status}}"]
+            check_cmd = [*DOCKER_COMMAND, "ps", "-a", "--filter", f"name={self.container_name}", "--format", "{{.Status}}"]
             result = subprocess.run(check_cmd, capture_output=True, text=True)
             
             if not result.stdout.strip():
                 # 容器不存在，尝试启动
-                print(f"⚠️ 容器 {self.container_name} 不存在，正在启动...")
+                console_print(f"⚠️ 容器 {self.container_name} 不存在，正在启动...")
                 self._start_container()
             elif not result.stdout.strip().startswith("Up"):
                 # 容器存在但未运行
-                print(f"⚠️ 容器 {self.container_name} 未运行，正在启动...")
-                start_cmd = ["docker", "start", self.container_name]
+                console_print(f"⚠️ 容器 {self.container_name} 未运行，正在启动...")
+                start_cmd = [*DOCKER_COMMAND, "start", self.container_name]
                 subprocess.run(start_cmd, check=True)
                 
-            print(f"✅ 容器 {self.container_name} 已准备就绪")
+            console_print(f"✅ 容器 {self.container_name} 已准备就绪")
+        except Exception as e:
+            raise RuntimeError(f"准备Docker容器时出错: {str(e)}")
+    
+    async def _ensure_container_running_api(self, client: DockerEngineClient):
+        """通过Engine API确保Docker容器正在运行；容器不存在时仍由docker-compose（在线程中）创建"""
+        try:
+            info = await client.inspect_container(self.container_name)
+            if info is None:
+                console_print(f"⚠️ 容器 {self.container_name} 不存在，正在启动...")
+                await asyncio.get_running_loop().run_in_executor(None, self._start_container)
+            elif not (info.get("State") or {}).get("Running"):
+                console_print(f"⚠️ 容器 {self.container_name} 未运行，正在启动...")
+                await client.start_container(self.container_name)
+            
+            console_print(f"✅ 容器 {self.container_name} 已准备就绪")
         except Exception as e:
             raise RuntimeError(f"准备Docker容器时出错: {str(e)}")
     
@@ -63,39 +428,80 @@ class DockerToolProxy:
         Returns:
             ToolResult: 执行结果
         """
+        with get_tracer().span("docker.execute_tool", tool=tool_name, container=self.container_name) as span:
+            if not self._checked:
+                try:
+                    with get_tracer().span("docker.wait_ready"):
+                        await self.wait_ready()
+                except Exception as e:
+                    span.record_error(str(e))
+                    return ToolResult(error=f"工具代理错误: {str(e)}")
+            result = await self._execute_tool(span, tool_name, **kwargs)
+            if result.error:
+                span.record_error(str(result.error))
+            return result
+    
+    async def _execute_tool(self, span, tool_name: str, **kwargs) -> ToolResult:
+        """execute_tool的实现，执行方式和耗时拆分记录在span上"""
+        if self.worker is None:
+            span.set(mode="once")
+            return await self._execute_tool_once(tool_name, **kwargs)
+        
         try:
-            # 准备工具调用JSON
+            if not self.worker.running:
+                with get_tracer().span("docker.worker_start"):
+                    await self.worker.start()
+        except Exception as e:
+            # 旧镜像中没有worker模块、docker exec卡住等情况，本次调用退回到逐次docker exec，
+            # 退避时间过后的调用会重新尝试启动worker
+            if not isinstance(e, WorkerBackoff):
+                console_print(f"⚠️ 容器内工具worker启动失败，改为逐次执行，{self.worker.retry_delay:.0f}秒后重试: {str(e)}")
+            span.set(mode="once")
+            return await self._execute_tool_once(tool_name, **kwargs)
+        
+        span.set(mode="worker")
+        try:
+            started = time.perf_counter()
+            self._session_used = True
+            result_json = await self.worker.call(tool_name, kwargs, session=self.session_id)
+        except Exception as e:
+            return ToolResult(error=f"工具代理错误: {str(e)}")
+        if result_json.get("elapsed_ms") is not None:
+            # worker回报的是工具实际执行时间，其余为管道传输、编解码和排队的开销
+            round_trip_ms = (time.perf_counter() - started) * 1000
+            span.set(tool_ms=result_json["elapsed_ms"], overhead_ms=round(round_trip_ms - result_json["elapsed_ms"], 3))
+        if result_json.get("error"):
+            return ToolResult(error=result_json["error"])
+        return ToolResult(output=result_json.get("output"))
+    
+    async def _execute_tool_once(self, tool_name: str, **kwargs) -> ToolResult:
+        """为单次调用启动一个新的Python解释器执行工具（不使用常驻worker时的后备方式，调用之间不保留状态）"""
+        try:
+            # 准备工具调用JSON；经由stdin传入，不受命令行长度（ARG_MAX）限制
             tool_call = {
                 "tool": tool_name,
                 "args": kwargs
             }
-            
-            # 将调用转换为JSON字符串
-            tool_call_json = json.dumps(tool_call)
-            
-            # 准备Python命令
-            python_cmd = (
-                f"import json, asyncio; "
-                f"from nanoOpenManus.app.tools.tool_collection import ToolCollection; "
-                f"from nanoOpenManus.app.tools.python_execute import PythonExecute; "
-                f"from nanoOpenManus.app.tools.file_saver import FileSaver; "
-                f"from nanoOpenManus.app.tools.terminate import Terminate; "
-                f"tools = ToolCollection(PythonExecute(), FileSaver(), Terminate()); "
-                f"tool_call = json.loads({repr(tool_call_json)}); "
-                f"result = asyncio.run(tools.execute(name=tool_call['tool'], tool_input=tool_call['args'])); "
-                f"print(json.dumps({{'output': str(result.output) if result.output is not None else None, "
-                f"'error': str(result.error) if result.error is not None else None}}));"
-            )
+            payload = json.dumps(tool_call, ensure_ascii=False).encode("utf-8")
+            current_span().set(request_bytes=len(payload))
             
             # 在Docker容器中执行命令
-            cmd = ["docker", "exec", self.container_name, "python", "-c", python_cmd]
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
+            process = await _docker_exec(self.container_name, ["python", "-c", ONE_SHOT_SCRIPT])
             
-            stdout, stderr = await process.communicate()
+            try:
+                process.stdin.write(payload + b"\n")
+                await process.stdin.drain()
+                stdout, stderr = await asyncio.gather(process.stdout.read(), process.stderr.read())
+                await process.wait()
+            except asyncio.CancelledError:
+                # 调用被取消：关闭stdin通知容器内的脚本取消执行，稍后在后台结束docker exec客户端
+                process.stdin.close()
+                task = asyncio.ensure_future(_kill_after(process, ONE_SHOT_CANCEL_GRACE))
+                self._reapers.add(task)
+                task.add_done_callback(self._reapers.discard)
+                raise
+            finally:
+                process.stdin.close()
             
             if process.returncode != 0:
                 return ToolResult(error=f"在Docker中执行工具失败: {stderr.decode().strip()}")
@@ -112,6 +518,83 @@ class DockerToolProxy:
                 
         except Exception as e:
             return ToolResult(error=f"工具代理错误: {str(e)}")
+    
+    async def snapshot_workspace(self) -> Dict:
+        """
+        为容器工作区建立快照，之后reset_workspace()把工作区还原到此时的状态
+        
+        Returns:
+            Dict: 快照的文件数files、字节数bytes和容器内耗时elapsed_ms
+        """
+        return await self._workspace_op("snapshot")
+    
+    async def reset_workspace(self, workspace_dir: str = CONTAINER_WORKSPACE) -> Dict:
+        """
+        把容器工作区还原到最近一次快照（没有快照时清空），并丢弃容器内所有会话的工具状态
+        
+        只处理有改动的文件，不需要重建容器。常驻worker在运行时经由worker完成，否则单独执行一次docker exec。
+        
+        Args:
+            workspace_dir: 旧镜像没有快照模块时要清空的目录；镜像支持快照时还原的是容器的ALLOWED_WRITE_DIR
+        
+        Returns:
+            Dict: 删除的条目数removed、复制回来的条目数restored、回收的字节数reclaimed_bytes、
+                容器内耗时elapsed_ms，以及包含往返开销的总耗时total_ms
+        """
+        return await self._workspace_op("restore", workspace_dir)
+    
+    async def _workspace_op(self, op: str, workspace_dir: str = CONTAINER_WORKSPACE) -> Dict:
+        with get_tracer().span(f"sandbox.{op}", container=self.container_name) as span:
+            started = time.perf_counter()
+            if self.worker is not None and self.worker.running and self.worker.snapshots:
+                span.set(mode="worker")
+                stats = await self.worker.workspace(op)
+                stats.pop("ok", None)
+            else:
+                span.set(mode="exec")
+                stats = await self._workspace_op_exec(op, workspace_dir)
+            stats["total_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            span.set(**stats)
+            return stats
+    
+    async def _workspace_op_exec(self, op: str, workspace_dir: str) -> Dict:
+        """在一次docker exec中执行快照模块；旧镜像没有该模块时，还原改为清空工作区"""
+        process = await _docker_exec(self.container_name, [*SNAPSHOT_COMMAND, op])
+        process.stdin.close()
+        stdout, stderr = await asyncio.gather(process.stdout.read(), process.stderr.read())
+        if await process.wait() == 0:
+            return json.loads(stdout.decode().strip().splitlines()[-1])
+        if op != "restore" or b"No module named" not in stderr:
+            raise RuntimeError(f"工作区{op}失败: {stderr.decode().strip()}")
+        process = await _docker_exec(self.container_name, ["find", workspace_dir, "-mindepth", "1", "-delete"])
+        process.stdin.close()
+        _, stderr = await asyncio.gather(process.stdout.read(), process.stderr.read())
+        if await process.wait() != 0:
+            raise RuntimeError(f"清空工作区失败: {stderr.decode().strip()}")
+        return {}
+    
+    async def close_session(self) -> None:
+        """
+        结束当前会话：释放容器内为其保留的工具状态，之后的调用属于新的会话
+        
+        可以重复调用；代理被多个工具包装共用，每个包装的cleanup都会调用一次，
+        只有会话中确实有调用经由worker执行时才通知worker。
+        """
+        if not self._session_used:
+            return
+        session_id, self.session_id = self.session_id, uuid.uuid4().hex
+        self._session_used = False
+        if self.worker is None:
+            return
+        try:
+            await self.worker.close_session(session_id)
+        except Exception as e:
+            console_print(f"⚠️ 释放容器内会话失败: {str(e)}")
+    
+    async def close(self) -> None:
+        """释放容器内的常驻worker"""
+        if self.worker is not None:
+            await self.worker.close()
 
 
 class DockerToolWrapper(BaseTool):
@@ -134,6 +617,24 @@ class DockerToolWrapper(BaseTool):
             parameters=original_tool.parameters
         )
         self.proxy = proxy
+        self.original_tool = original_tool
+        self.parallel_safe = original_tool.parallel_safe
+        # 缓存声明沿用原始工具；python_execute的缓存键取决于容器内内核的状态，由容器内的worker缓存
+        self.cache_policy = "never" if original_tool.name == "python_execute" else original_tool.cache_policy
+    
+    def conflict_keys(self, **kwargs) -> List[str]:
+        """沿用原始工具声明的资源键"""
+        return self.original_tool.conflict_keys(**kwargs)
+    
+    def cache_key(self, **kwargs) -> Optional[str]:
+        """沿用原始工具的缓存键；宿主机看不到容器内的工作区，结果取决于工作区文件的调用不在这里缓存"""
+        if self.original_tool.reads_workspace(**kwargs):
+            return None
+        return self.original_tool.cache_key(**kwargs)
+    
+    async def cleanup(self) -> None:
+        """结束容器内的会话，释放其中保留的状态"""
+        await self.proxy.close_session()
     
     async def execute(self, **kwargs) -> ToolResult:
         """
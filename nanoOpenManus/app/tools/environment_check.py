@@ -1,6 +1,7 @@
 import os
 import socket
 import platform
+from typing import Optional
 
 from nanoOpenManus.app.tools.base import BaseTool, ToolResult
 
@@ -8,6 +9,9 @@ from nanoOpenManus.app.tools.base import BaseTool, ToolResult
 class EnvironmentCheck(BaseTool):
     """检查执行环境的工具"""
     
+    # 主机名、平台、进程等基本信息在一次会话内不变，代理经常在一次运行中多次检查
+    cache_policy = "session"
+    
     def __init__(self):
         super().__init__(
             name="environment_check",
@@ -26,6 +30,10 @@ class EnvironmentCheck(BaseTool):
             }
         )
     
+    def cache_key(self, detail_level: str = "basic", **kwargs) -> Optional[str]:
+        """详细信息包含内存用量等随时变化的内容，不缓存"""
+        return None if detail_level == "full" or kwargs else detail_level
+    
     async def execute(self, detail_level: str = "basic") -> ToolResult:
         """
         检查并返回当前执行环境的信息
@@ -1,6 +1,9 @@
+import asyncio
 import os
+from typing import Dict, List, Optional, Tuple
 
 from nanoOpenManus.app.tools.base import BaseTool, ToolResult
+from nanoOpenManus.app.tools.file_io import write_text
 
 
 class FileSaver(BaseTool):
@@ -11,7 +14,8 @@ class FileSaver(BaseTool):
             name="file_saver",
             description="""将内容保存到指定路径的本地文件中。
 当需要保存文本、代码或生成的内容到本地文件系统时使用此工具。
-该工具接受内容和文件路径，并将内容保存到该位置。""",
+该工具接受内容和文件路径，并将内容保存到该位置。
+需要保存多个文件时，使用files参数在一次调用中全部保存。""",
             parameters={
                 "type": "object",
                 "properties": {
@@ -29,33 +33,91 @@ class FileSaver(BaseTool):
                         "enum": ["w", "a"],
                         "default": "w",
                     },
+                    "files": {
+                        "type": "array",
+                        "description": "批量保存多个文件，提供此参数时忽略content和file_path。",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "file_path": {"type": "string", "description": "文件保存的路径。"},
+                                "content": {"type": "string", "description": "要保存到文件的内容。"},
+                                "mode": {"type": "string", "enum": ["w", "a"], "description": "文件打开模式，默认为'w'。"},
+                            },
+                            "required": ["file_path", "content"],
+                        },
+                    },
                 },
-                "required": ["content", "file_path"],
             }
         )
     
-    async def execute(self, content: str, file_path: str, mode: str = "w") -> ToolResult:
+    def conflict_keys(self, file_path: str = "", files: Optional[List[Dict]] = None, **kwargs) -> List[str]:
+        """写同一个文件的调用需要串行执行"""
+        if files is not None:
+            paths = [item.get("file_path") for item in files if isinstance(item, dict)]
+        else:
+            paths = [file_path]
+        return [f"file:{os.path.abspath(path)}" for path in paths if isinstance(path, str) and path]
+    
+    async def execute(
+        self,
+        content: Optional[str] = None,
+        file_path: Optional[str] = None,
+        mode: str = "w",
+        files: Optional[List[Dict]] = None,
+    ) -> ToolResult:
         """
         将内容保存到指定路径的文件中
         
+        文件写入在线程池中进行，不会阻塞事件循环；覆盖写入是原子的，出错时原文件保持不变。
+        
         Args:
             content: 要保存的内容
             file_path: 保存文件的路径
             mode: 文件打开模式，'w'为写入（覆盖），'a'为追加
+            files: 批量写入的文件列表，每项包含file_path、content和可选的mode
             
         Returns:
             ToolResult: 包含操作结果或错误信息
         """
-        try:
-            # 确保目录存在
-            directory = os.path.dirname(file_path)
-            if directory and not os.path.exists(directory):
-                os.makedirs(directory)
-            
-            # 写入文件
-            with open(file_path, mode, encoding="utf-8") as file:
-                file.write(content)
-            
+        if files is None:
+            if content is None or not file_path:
+                return ToolResult(error="保存文件时出错: 需要提供content和file_path，或使用files批量保存")
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(None, write_text, file_path, content, mode)
+            except Exception as e:
+                return ToolResult(error=f"保存文件时出错: {str(e)}")
             return ToolResult(output=f"内容已成功保存到 {file_path}")
-        except Exception as e:
-            return ToolResult(error=f"保存文件时出错: {str(e)}") 
\ No newline at end of file
+        
+        if not isinstance(files, list) or not files:
+            return ToolResult(error="保存文件时出错: files必须是非空列表")
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(None, self._write_files, files, mode)
+        return _batch_result(results)
+    
+    @staticmethod
+    def _write_files(files: List[Dict], default_mode: str) -> List[Tuple[str, Optional[str]]]:
+        """按顺序写入每个文件，返回 (路径, 错误信息) 列表；某个文件失败不影响其他文件"""
+        results = []
+        for index, item in enumerate(files):
+            path = item.get("file_path") if isinstance(item, dict) else None
+            text = item.get("content") if isinstance(item, dict) else None
+            if not isinstance(path, str) or not path or not isinstance(text, str):
+                results.append((f"files[{index}]", "需要提供字符串类型的file_path和content"))
+                continue
+            try:
+                write_text(path, text, item.get("mode") or default_mode)
+                results.append((path, None))
+            except Exception as e:
+                results.append((path, str(e)))
+        return results
+
+
+def _batch_result(results: List[Tuple[str, Optional[str]]]) -> ToolResult:
+    """把批量写入的结果汇总为一个ToolResult"""
+    saved = [path for path, error in results if error is None]
+    failed = [f"- {path}: {error}" for path, error in results if error is not None]
+    lines = [f"已成功保存 {len(saved)} 个文件:"] + [f"- {path}" for path in saved]
+    if not failed:
+        return ToolResult(output="\n".join(lines))
+    return ToolResult(error="\n".join([f"{len(failed)} 个文件保存失败:"] + failed + lines))
@@ -0,0 +1,683 @@
+"""
+预先fork的工作进程池
+
+每次执行占用一个独立的工作进程：输出在进程内捕获，不会与其他执行串扰；
+超时后直接SIGKILL该进程，而不是留下一个无法停止的线程继续占用CPU。
+被杀死、崩溃或执行次数达到上限的进程会被丢弃，并在后台补充新的进程。
+等待run()的协程被取消时，正在执行的进程同样会被杀死，而不是在后台继续执行到结束。
+需要跨执行保留状态时，open_kernel()返回一个独占专用进程的Kernel。
+
+fork_server=True时，池在创建时先启动一个全新的单线程解释器作为zygote（fork后立即exec，不执行任何Python代码），
+之后所有工作进程都由zygote fork而来：预先导入的模块以写时复制的方式共享。宿主进程此时通常已经有多个线程
+（事件循环的线程池、HTTP客户端等），从中直接fork的Python进程会继承其他线程持有的锁，新的解释器则不会。
+
+注意: 容器内的 docker/nanoOpenManus/app/tools/process_pool.py 是本文件的副本，两边需保持一致
+"""
+import asyncio
+import gc
+import multiprocessing
+import os
+import signal
+import importlib
+import json
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows没有resource模块，此时不设置资源限制
+    resource = None
+
+try:
+    from nanoOpenManus.app.console import console_print
+except ImportError:  # 容器内没有console模块，输出不受--quiet控制
+    console_print = print
+
+
+class ExecutionTimeout(Exception):
+    """执行超时，工作进程已被杀死"""
+
+
+class WorkerCrashed(Exception):
+    """工作进程在执行过程中意外退出（例如超出内存或CPU时间限制）"""
+
+
+class ExecutionCancelled(Exception):
+    """调用方取消了执行，工作进程已被杀死"""
+
+
+class _Execution:
+    """
+    一次进行中的执行
+
+    run()在事件循环中等待，执行在线程池的线程中进行；调用方被取消时，
+    run()通过它杀死正在执行的进程，线程中的run_sync随即因管道断开而返回。
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self._worker: Optional["_Worker"] = None
+        self._lock = threading.Lock()
+
+    def attach(self, worker: "_Worker") -> None:
+        """记录执行所在的进程；已被取消时抛出ExecutionCancelled"""
+        with self._lock:
+            if self.cancelled:
+                raise ExecutionCancelled("执行已取消")
+            self._worker = worker
+
+    def detach(self) -> None:
+        with self._lock:
+            self._worker = None
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            if self._worker is not None:
+                self._worker.signal_kill()
+
+
+def _apply_limits(memory_limit: Optional[int], timeout: Optional[float]) -> None:
+    """在工作进程内为本次执行设置资源限制（只调整软限制，之后的执行可以重新设置）"""
+    if resource is None:
+        return
+    if memory_limit and hasattr(resource, "RLIMIT_AS"):
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        soft = memory_limit if hard == resource.RLIM_INFINITY else min(memory_limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+    if timeout and hasattr(resource, "RLIMIT_CPU"):
+        # CPU时间是进程累计值，在已用时间的基础上再给出本次的额度；即使父进程没能及时杀死，
+        # 内核也会在额度用完后终止进程
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        soft = int(usage.ru_utime + usage.ru_stime + timeout) + 1
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _worker_main(conn, target: Callable[[Any], Any], memory_limit: Optional[int]) -> None:
+    """工作进程主循环：接收 (载荷, 超时)，执行target并回传结果"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C由父进程处理
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+        payload, timeout = message
+        _apply_limits(memory_limit, timeout)
+        try:
+            result = target(payload)
+        except MemoryError:
+            result = {"output": None, "error": "错误: 执行代码超出内存限制。"}
+        except BaseException as e:
+            result = {"output": None, "error": f"执行代码时出错: {type(e).__name__}: {str(e)}"}
+        try:
+            conn.send(result)
+        except Exception as e:
+            # 结果无法序列化时回传错误说明，保持进程可用
+            conn.send({"output": None, "error": f"无法回传执行结果: {type(e).__name__}: {str(e)}"})
+
+
+def _exitcode_from_status(status: int) -> int:
+    """把waitpid的状态转换为与multiprocessing相同的退出码（被信号终止时为负的信号值）"""
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _zygote_main(control: socket.socket, target: Callable[[Any], Any], preload: Tuple[str, ...]) -> None:
+    """
+    zygote进程主循环：按请求fork工作进程，并回收已退出的子进程
+
+    zygote是新启动的解释器，只持有控制socket的一端，宿主进程退出（包括被杀死）时recv返回空，zygote随之退出。
+
+    请求:  b"S<内存上限>"  fork一个工作进程，回复pid并通过SCM_RIGHTS传回与其通信的socket
+           b"W<pid>"       查询工作进程的退出码，仍在运行时回复b"-"
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _preload(preload)
+    # 把已有对象移出垃圾回收的追踪范围，子进程中的GC不会遍历并写入这些继承来的页面，写时复制得以保持
+    gc.freeze()
+    exited: Dict[int, int] = {}
+    while True:
+        try:
+            request = control.recv(64)
+        except OSError:
+            break
+        if not request:
+            break  # 宿主进程关闭了控制socket
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            exited[pid] = _exitcode_from_status(status)
+
+        kind, argument = request[:1], request[1:].decode()
+        if kind == b"S":
+            parent_end, child_end = socket.socketpair()
+            pid = os.fork()
+            if pid == 0:
+                code = 0
+                try:
+                    control.close()
+                    parent_end.close()
+                    _worker_main(Connection(child_end.detach()), target, int(argument) or None)
+                except BaseException:
+                    code = 1
+                finally:
+                    os._exit(code)
+            child_end.close()
+            socket.send_fds(control, [str(pid).encode()], [parent_end.fileno()])
+            parent_end.close()
+        elif kind == b"W":
+            exitcode = exited.pop(int(argument), None)
+            control.sendall(b"-" if exitcode is None else str(exitcode).encode())
+
+
+def _preload(modules: Iterable[str]) -> None:
+    for module in modules:
+        try:
+            __import__(module)
+        except ImportError:
+            pass
+
+
+def _zygote_entry() -> None:
+    """
+    zygote解释器的入口，由ForkServer以 python -c 启动
+
+    参数: sys.path的JSON、控制socket的fd、target所在模块、target的限定名、以逗号分隔的预先导入模块
+    """
+    _, _, fd, module, qualname, preload = sys.argv
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    target = importlib.import_module(module)
+    for name in qualname.split("."):
+        target = getattr(target, name)
+    _zygote_main(socket.socket(fileno=int(fd)), target, tuple(filter(None, preload.split(","))))
+
+
+# 新解释器中先还原宿主进程的sys.path，再导入本模块并进入zygote主循环
+_ZYGOTE_BOOTSTRAP = f"import json, sys; sys.path[:] = json.loads(sys.argv[1]); from {__name__} import _zygote_entry; _zygote_entry()"
+
+
+class ForkServer:
+    """宿主进程一侧的zygote句柄；请求与应答一问一答，由锁保证同一时间只有一个请求在途"""
+
+    def __init__(self, target: Callable[[Any], Any], preload: Iterable[str] = ()):
+        """
+        Args:
+            target: 工作进程中执行的函数，必须是可以按模块路径导入的模块级函数（zygote会重新导入它）
+            preload: zygote启动后导入的模块，工作进程直接继承
+        """
+        module, qualname = getattr(target, "__module__", None), getattr(target, "__qualname__", "")
+        if not module or module == "__main__" or "<" in qualname:
+            raise ValueError(f"fork_server的target必须是可导入模块中的模块级函数: {target!r}")
+        self._control, zygote_end = socket.socketpair()
+        self._lock = threading.Lock()
+        try:
+            # subprocess在fork后立即exec，不会在子进程中执行Python代码，多线程的宿主进程也可以安全使用
+            self.process = subprocess.Popen(
+                [sys.executable, "-c", _ZYGOTE_BOOTSTRAP, json.dumps(sys.path), str(zygote_end.fileno()),
+                 module, qualname, ",".join(preload)],
+                pass_fds=(zygote_end.fileno(),),
+                stdin=subprocess.DEVNULL,
+            )
+        except BaseException:
+            self._control.close()
+            raise
+        finally:
+            zygote_end.close()
+
+    def spawn(self, memory_limit: Optional[int]) -> Tuple[int, Connection]:
+        """由zygote fork一个工作进程，返回其pid和通信连接"""
+        with self._lock:
+            self._control.sendall(b"S" + str(memory_limit or 0).encode())
+            data, fds, _, _ = socket.recv_fds(self._control, 64, 1)
+        if not data or not fds:
+            raise RuntimeError("zygote进程已退出")
+        return int(data), Connection(fds[0])
+
+    def exitcode(self, pid: int) -> Optional[int]:
+        """查询工作进程的退出码，仍在运行时返回None"""
+        with self._lock:
+            self._control.sendall(b"W" + str(pid).encode())
+            data = self._control.recv(64)
+        if not data:
+            raise RuntimeError("zygote进程已退出")
+        return None if data == b"-" else int(data)
+
+    def shutdown(self) -> None:
+        """关闭控制socket，zygote随之退出"""
+        self._control.close()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+class _ForkedProcess:
+    """由zygote fork出的工作进程（宿主进程的孙进程），提供与multiprocessing.Process相同的接口"""
+
+    def __init__(self, server: ForkServer, pid: int):
+        self.server = server
+        self.pid = pid
+        self._exitcode: Optional[int] = None
+
+    @property
+    def exitcode(self) -> Optional[int]:
+        if self._exitcode is None:
+            try:
+                self._exitcode = self.server.exitcode(self.pid)
+            except (OSError, RuntimeError):
+                # zygote已不在，子进程由init回收，只能判断进程是否还存在
+                try:
+                    os.kill(self.pid, 0)
+                except ProcessLookupError:
+                    self._exitcode = 1
+        return self._exitcode
+
+    def is_alive(self) -> bool:
+        return self.exitcode is None
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.is_alive() and (deadline is None or time.monotonic() < deadline):
+            time.sleep(0.005)
+
+
+class _Worker:
+    """一个工作进程及与其通信的管道"""
+
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.tasks_done = 0
+        self.started_at = time.monotonic()
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def signal_kill(self) -> None:
+        """只发送SIGKILL，不等待进程退出、不关闭管道（可在其他线程正在使用管道时调用）"""
+        try:
+            os.kill(self.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, TypeError):
+            pass
+
+    def kill(self) -> None:
+        self.signal_kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class ProcessPool:
+    """
+    预先fork、预先导入模块的工作进程池
+
+    target在工作进程中以执行载荷为参数调用，返回值（需可pickle）回传给调用方。
+    池本身不绑定事件循环：run()可以在任意事件循环中调用，也可以在普通线程中调用run_sync()。
+    """
+
+    def __init__(
+        self,
+        target: Callable[[Any], Any],
+        size: int = 2,
+        max_tasks_per_worker: int = 100,
+        memory_limit: Optional[int] = None,
+        preload: Iterable[str] = (),
+        fork_server: bool = False,
+    ):
+        """
+        Args:
+            target: 在工作进程中执行的函数，必须是模块级函数
+            size: 工作进程数，也是同时执行的上限
+            max_tasks_per_worker: 每个工作进程执行多少次后被替换，防止内存泄漏或残留状态累积
+            memory_limit: 每次执行的地址空间上限（字节），None表示不限制
+            preload: 预先导入的模块（fork_server时在zygote中导入，否则在宿主进程中导入），工作进程直接继承，无需各自导入
+            fork_server: 是否由预热好的zygote进程fork工作进程；zygote以spawn方式启动，宿主进程是否已有多个线程都可以使用
+        """
+        if size < 1:
+            raise ValueError(f"无效的进程数: {size}")
+        self.target = target
+        self.size = size
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.memory_limit = memory_limit
+        self.stats = {"executions": 0, "timeouts": 0, "crashes": 0, "cancelled": 0, "spawned": 0, "recycled": 0}
+
+        self._context = multiprocessing.get_context("fork")
+        if fork_server:
+            self._fork_server = ForkServer(target, preload)
+        else:
+            _preload(preload)
+            self._fork_server = None
+        self._idle: List[_Worker] = []
+        self._busy = 0
+        self._spawning = 0
+        self._condition = threading.Condition()
+        self._spawn_lock = threading.Lock()  # fork串行进行，避免子进程继承其他工作进程尚未关闭的管道端
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="process-pool")
+        self._closed = False
+
+    @property
+    def workers(self) -> int:
+        with self._condition:
+            return len(self._idle) + self._busy + self._spawning
+
+    def start(self) -> None:
+        """预先创建全部工作进程"""
+        self._replenish()
+
+    async def run(self, payload: Any, timeout: Optional[float] = None) -> Any:
+        """在工作进程中执行一次target(payload)；协程被取消时杀死正在执行的进程"""
+        return await _run_cancellable(self._executor, self.run_sync, payload, timeout)
+
+    def run_sync(self, payload: Any, timeout: Optional[float] = None, execution: Optional[_Execution] = None) -> Any:
+        """
+        同步执行一次target(payload)
+
+        Args:
+            execution: 由run()传入，用于在调用方取消时杀死执行中的进程
+
+        Raises:
+            ExecutionTimeout: 超过timeout秒仍未完成，工作进程已被杀死
+            WorkerCrashed: 工作进程在执行过程中退出
+            ExecutionCancelled: 执行被调用方取消
+        """
+        worker = self._acquire(execution)
+        if execution is not None:
+            try:
+                execution.attach(worker)
+            except ExecutionCancelled:
+                # 拿到进程时调用方已经取消：进程还没有执行任何代码，原样放回空闲队列，而不是杀死后重新创建
+                self.stats["cancelled"] += 1
+                self._release(worker, True)
+                raise
+        reusable = False
+        try:
+            worker.conn.send((payload, timeout))
+            if not worker.conn.poll(timeout):
+                self.stats["timeouts"] += 1
+                raise ExecutionTimeout(f"执行超时（{timeout}秒）")
+            result = worker.conn.recv()
+            worker.tasks_done += 1
+            reusable = worker.tasks_done < self.max_tasks_per_worker
+            if not reusable:
+                self.stats["recycled"] += 1
+            return result
+        except (EOFError, OSError, BrokenPipeError):
+            worker.process.join(timeout=1)
+            if execution is not None and execution.cancelled:
+                self.stats["cancelled"] += 1
+                raise ExecutionCancelled("执行已取消")
+            self.stats["crashes"] += 1
+            raise WorkerCrashed(_describe_exit(worker.process.exitcode))
+        finally:
+            if execution is not None:
+                execution.detach()
+            self.stats["executions"] += 1
+            self._release(worker, reusable)
+
+    def open_kernel(self, memory_limit: Optional[int] = None) -> "Kernel":
+        """
+        创建一个有状态的内核会话
+
+        内核独占一个不属于空闲池的工作进程，进程内的状态（例如target保存的全局命名空间）
+        在多次执行之间保留，直到reset()或close()。内核进程不计入池的进程数。
+
+        Args:
+            memory_limit: 内核进程的地址空间上限（字节），None表示沿用池的设置
+        """
+        if self._closed:
+            raise RuntimeError("进程池已关闭")
+        return Kernel(self, memory_limit or self.memory_limit)
+
+    def shutdown(self) -> None:
+        """杀死全部工作进程"""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._condition.notify_all()
+        for worker in idle:
+            worker.kill()
+        self._executor.shutdown(wait=False)
+        if self._fork_server is not None:
+            self._fork_server.shutdown()
+
+    def _acquire(self, execution: Optional[_Execution] = None) -> _Worker:
+        """
+        取得一个空闲进程，没有空闲进程且未达到上限时创建一个
+
+        Raises:
+            ExecutionCancelled: 等待期间调用方取消了执行
+        """
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("进程池已关闭")
+                if execution is not None and execution.cancelled:
+                    self.stats["cancelled"] += 1
+                    raise ExecutionCancelled("执行已取消")
+                while self._idle:
+                    worker = self._idle.pop()
+                    if worker.alive():
+                        self._busy += 1
+                        return worker
+                    worker.kill()  # 空闲期间退出的进程（例如被外部杀死）
+                if len(self._idle) + self._busy + self._spawning < self.size:
+                    self._spawning += 1
+                    break
+                # 取消不会唤醒条件变量，等待调用方传入的执行时定期检查是否已被取消
+                self._condition.wait(None if execution is None else 0.05)
+        # 没有空闲进程时由调用方自己创建，不依赖后台补充
+        try:
+            worker = self._spawn()
+        except BaseException:
+            with self._condition:
+                self._spawning -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._spawning -= 1
+            self._busy += 1
+        return worker
+
+    def _release(self, worker: _Worker, reusable: bool) -> None:
+        with self._condition:
+            self._busy -= 1
+            if reusable and not self._closed and worker.alive():
+                self._idle.append(worker)
+                self._condition.notify()
+                return
+            self._condition.notify()
+        # 被杀死、崩溃或达到执行次数上限的进程在后台丢弃并补充新的进程，不占用本次执行的时间
+        threading.Thread(target=self._retire, args=(worker,), daemon=True).start()
+
+    def _retire(self, worker: _Worker) -> None:
+        # 先补充再回收，等待旧进程退出不会推迟新进程就绪
+        if not self._closed:
+            self._replenish()
+        worker.kill()
+
+    def _replenish(self) -> None:
+        """补足工作进程数"""
+        with self._condition:
+            missing = self.size - (len(self._idle) + self._busy + self._spawning)
+            self._spawning += max(0, missing)
+        for _ in range(max(0, missing)):
+            try:
+                worker = self._spawn()
+            except Exception as e:
+                console_print(f"⚠️ 创建工作进程失败: {str(e)}")
+                with self._condition:
+                    self._spawning -= 1
+                    self._condition.notify()
+                continue
+            with self._condition:
+                self._spawning -= 1
+                if self._closed:
+                    worker.kill()
+                    continue
+                self._idle.append(worker)
+                self._condition.notify()
+
+    def _spawn(self, memory_limit: Optional[int] = None) -> _Worker:
+        if self._fork_server is not None:
+            pid, conn = self._fork_server.spawn(memory_limit or self.memory_limit)
+            self.stats["spawned"] += 1
+            return _Worker(_ForkedProcess(self._fork_server, pid), conn)
+        with self._spawn_lock:
+            parent_conn, child_conn = self._context.Pipe()
+            process = self._context.Process(
+                target=_worker_main,
+                args=(child_conn, self.target, memory_limit or self.memory_limit),
+                daemon=True,
+            )
+            process.start()
+            child_conn.close()
+        self.stats["spawned"] += 1
+        return _Worker(process, parent_conn)
+
+
+class Kernel:
+    """
+    独占一个工作进程的有状态会话
+
+    同一内核上的执行串行进行。进程在第一次执行时才创建；超时或崩溃后进程被杀死，
+    状态随之丢失，下一次执行会在新的进程中重新开始。
+    """
+
+    def __init__(self, pool: ProcessPool, memory_limit: Optional[int]):
+        self._pool = pool
+        self.memory_limit = memory_limit
+        self.executions = 0
+        self._worker: Optional[_Worker] = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kernel")
+        self._closed = False
+
+    @property
+    def started(self) -> bool:
+        """内核进程是否存在（即是否保留着之前执行的状态）"""
+        return self._worker is not None and self._worker.alive()
+
+    async def run(self, payload: Any, timeout: Optional[float] = None) -> Any:
+        """在内核进程中执行一次target(payload)；协程被取消时杀死内核进程，状态随之丢失"""
+        return await _run_cancellable(self._executor, self.run_sync, payload, timeout)
+
+    def run_sync(self, payload: Any, timeout: Optional[float] = None, execution: Optional[_Execution] = None) -> Any:
+        """
+        同步执行一次target(payload)
+
+        Args:
+            execution: 由run()传入，用于在调用方取消时杀死内核进程
+
+        Raises:
+            ExecutionTimeout: 超过timeout秒仍未完成，内核进程已被杀死
+            WorkerCrashed: 内核进程在执行过程中退出
+            ExecutionCancelled: 执行被调用方取消，内核进程已被杀死
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("内核已关闭")
+            if self._worker is None or not self._worker.alive():
+                self._discard()
+                self._worker = self._pool._spawn(self.memory_limit)
+            worker = self._worker
+            self.executions += 1
+            self._pool.stats["executions"] += 1
+            try:
+                if execution is not None:
+                    execution.attach(worker)
+                worker.conn.send((payload, timeout))
+                if not worker.conn.poll(timeout):
+                    self._pool.stats["timeouts"] += 1
+                    self._discard()
+                    raise ExecutionTimeout(f"执行超时（{timeout}秒）")
+                return worker.conn.recv()
+            except (EOFError, OSError, BrokenPipeError):
+                worker.process.join(timeout=1)
+                exitcode = worker.process.exitcode
+                self._discard()
+                if (execution is not None and execution.cancelled) or self._closed:
+                    self._pool.stats["cancelled"] += 1
+                    raise ExecutionCancelled("执行已取消")
+                self._pool.stats["crashes"] += 1
+                raise WorkerCrashed(_describe_exit(exitcode))
+            finally:
+                if execution is not None:
+                    execution.detach()
+
+    def reset(self) -> None:
+        """
+        丢弃内核进程及其中的全部状态，下一次执行从新的进程开始
+
+        不阻塞调用方（通常是事件循环）：丢弃由内核的执行线程在下一次执行之前完成
+        """
+        if not self._closed:
+            self._executor.submit(self._discard_locked)
+
+    def close(self) -> None:
+        """
+        结束内核，之后不能再执行；进行中的执行被中断
+
+        只立即发送SIGKILL，等待进程退出和关闭管道交给内核的执行线程，不阻塞事件循环
+        """
+        if self._closed:
+            return
+        self._closed = True
+        worker = self._worker
+        if worker is not None:
+            worker.signal_kill()  # 执行中的线程会因管道断开而结束
+        self._executor.submit(self._discard_locked)
+        self._executor.shutdown(wait=False)
+
+    def _discard_locked(self) -> None:
+        with self._lock:
+            self._discard()
+
+    def _discard(self) -> None:
+        if self._worker is not None:
+            self._worker.kill()
+            self._worker = None
+
+
+async def _run_cancellable(executor: ThreadPoolExecutor, run_sync: Callable, payload: Any, timeout: Optional[float]) -> Any:
+    """在线程池中调用run_sync；等待的协程被取消时杀死执行中的进程，不让它在后台继续运行"""
+    execution = _Execution()
+    future = executor.submit(run_sync, payload, timeout, execution)
+    try:
+        return await asyncio.wrap_future(future)
+    except asyncio.CancelledError:
+        execution.cancel()
+        raise
+
+
+def _describe_exit(exitcode: Optional[int]) -> str:
+    """把工作进程的退出码转换为说明"""
+    if exitcode is None:
+        return "工作进程意外退出"
+    if exitcode < 0:
+        sig = -exitcode
+        if sig == getattr(signal, "SIGXCPU", None):
+            return "工作进程超出CPU时间限制被终止"
+        if sig == signal.SIGKILL:
+            return "工作进程被强制终止（可能超出内存限制）"
+        return f"工作进程被信号 {sig} 终止"
+    return f"工作进程意外退出（退出码 {exitcode}）"
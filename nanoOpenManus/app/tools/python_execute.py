@@ -1,15 +1,79 @@
-import threading
+import builtins
+import os
+import sys
+from typing import List, Optional
 
 from nanoOpenManus.app.tools.base import BaseTool, ToolResult
+from nanoOpenManus.app.tools.output_capture import BoundedOutput
+from nanoOpenManus.app.tools.process_pool import ExecutionTimeout, Kernel, ProcessPool, WorkerCrashed
+from nanoOpenManus.app.tools.snippet_analysis import analyze_snippet
+
+
+# 输出超出上限时完整输出的保存目录，可用环境变量 TOOL_OUTPUT_DIR 调整
+OUTPUT_DIR = os.environ.get("TOOL_OUTPUT_DIR", os.path.join(os.getcwd(), "tool_outputs"))
+
+# 内核进程中跨执行保留的全局命名空间（每个进程各有一份）
+_kernel_namespace: Optional[dict] = None
+
+
+def _run_code(request: dict) -> dict:
+    """在工作进程中执行代码并捕获print输出"""
+    global _kernel_namespace
+    if request.get("persistent"):
+        # 内核会话：沿用之前执行留下的变量、函数和导入
+        if _kernel_namespace is None:
+            _kernel_namespace = {"__builtins__": builtins, "__name__": "__main__"}
+        namespace = _kernel_namespace
+    else:
+        # 每次执行使用新的全局命名空间
+        namespace = {"__builtins__": builtins, "__name__": "__main__"}
+
+    # 只在内存中保留输出的开头和结尾，过长的完整输出写入OUTPUT_DIR
+    output_buffer = BoundedOutput(spill_dir=OUTPUT_DIR, spill_prefix="python_execute_")
+    sys.stdout = output_buffer
+    try:
+        exec(request["code"], namespace)
+        return {"output": output_buffer.getvalue(), "error": None}
+    except Exception as e:
+        # 以error返回，代理和结果缓存据此把本次执行视为失败（失败的结果不会被缓存）
+        return {"output": None, "error": f"错误: {str(e)}"}
+    finally:
+        sys.stdout = sys.__stdout__
+        output_buffer.close()
+
+
+_pool = None
+
+# 内核会话进程的内存上限，可用环境变量 PYTHON_KERNEL_MEMORY_MB 调整
+KERNEL_MEMORY_LIMIT = int(os.environ.get("PYTHON_KERNEL_MEMORY_MB", 1024)) * 1024 * 1024
+
+
+def get_pool() -> ProcessPool:
+    """获取python_execute共用的工作进程池，首次调用时创建"""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPool(
+            _run_code,
+            size=int(os.environ.get("PYTHON_EXECUTE_WORKERS", min(4, os.cpu_count() or 1))),
+            preload=("math", "json", "re", "datetime", "collections", "itertools", "random"),
+            fork_server=True,
+        )
+    return _pool
 
 
 class PythonExecute(BaseTool):
     """执行Python代码的工具"""
-    
-    def __init__(self):
+
+    def __init__(self, stateful: bool = True):
+        """
+        Args:
+            stateful: 是否在同一会话的多次调用之间保留全局变量和导入
+        """
         super().__init__(
             name="python_execute",
-            description="执行Python代码字符串。注意：只有print输出可见，函数返回值不会被捕获。使用print语句查看结果。",
+            description="执行Python代码字符串。同一任务中的多次调用共享全局变量、函数和已导入的模块，"
+                        "已加载的数据无需重复加载；需要干净的环境时设置reset为true。"
+                        "注意：只有print输出可见，函数返回值不会被捕获。使用print语句查看结果。",
             parameters={
                 "type": "object",
                 "properties": {
@@ -17,55 +81,81 @@ class PythonExecute(BaseTool):
                         "type": "string",
                         "description": "要执行的Python代码。",
                     },
+                    "reset": {
+                        "type": "boolean",
+                        "description": "为true时先清空本任务之前定义的所有变量和导入，再执行代码。",
+                    },
                 },
                 "required": ["code"],
             }
         )
-    
-    async def execute(self, code: str, timeout: int = 5) -> ToolResult:
+        self.stateful = stateful
+        self._kernel: Optional[Kernel] = None
+        self._executions = 0  # 本实例实际执行代码的次数，作为有状态时缓存键的一部分
+        # 自包含、确定性的代码可以缓存；有状态时只在本次会话内有效
+        self.cache_policy = "session" if stateful else "pure"
+
+    def conflict_keys(self, **kwargs) -> List[str]:
+        # 同一会话的执行共享命名空间，必须按顺序执行
+        return [f"python_kernel:{id(self)}"] if self.stateful else []
+
+    def cache_key(self, code: str = "", timeout: int = 5, reset: bool = False, **kwargs) -> Optional[str]:
+        """
+        只缓存自包含、确定性的代码（见snippet_analysis）
+
+        有状态时键包含执行次数：执行后保存的键与紧接着再次执行同一段代码时查找的键相同，
+        中间执行过其他代码则不再命中，命名空间的变化不会被缓存掩盖
+        """
+        if reset or kwargs or analyze_snippet(code) is None:
+            return None
+        return f"{self._executions if self.stateful else ''}:{timeout}:{code}"
+
+    def reads_workspace(self, code: str = "", **kwargs) -> bool:
+        return bool(analyze_snippet(code))
+
+    async def execute(self, code: str, timeout: int = 5, reset: bool = False) -> ToolResult:
         """
         执行Python代码并返回结果
-        
+
+        代码在独立的工作进程中执行，超时后该进程会被杀死，不会继续占用CPU。
+        有状态模式下本工具实例独占一个内核进程，超时或崩溃会使之前的状态丢失。
+
         Args:
             code: 要执行的Python代码
             timeout: 执行超时时间（秒）
-            
+            reset: 是否先清空会话状态
+
         Returns:
             ToolResult: 包含执行输出或错误信息
         """
-        result = {"output": ""}
-        
-        def run_code():
-            try:
-                # 创建安全的执行环境
-                safe_globals = {"__builtins__": dict(__builtins__)}
-                
-                # 捕获标准输出
-                import sys
-                from io import StringIO
-                
-                output_buffer = StringIO()
-                sys.stdout = output_buffer
-                
-                # 执行代码
-                exec(code, safe_globals, {})
-                
-                # 恢复标准输出
-                sys.stdout = sys.__stdout__
-                
-                # 获取输出
-                result["output"] = output_buffer.getvalue()
-                
-            except Exception as e:
-                result["output"] = f"错误: {str(e)}"
-        
-        # 在线程中执行代码
-        thread = threading.Thread(target=run_code)
-        thread.start()
-        thread.join(timeout)
-        
-        # 检查是否超时
-        if thread.is_alive():
-            return ToolResult(error=f"执行超时（{timeout}秒）")
-        
-        return ToolResult(output=result["output"]) 
\ No newline at end of file
+        self._executions += 1
+        if not self.stateful:
+            runner = get_pool()
+        else:
+            if reset and self._kernel is not None:
+                self._kernel.reset()
+            if self._kernel is None:
+                self._kernel = get_pool().open_kernel(memory_limit=KERNEL_MEMORY_LIMIT)
+            runner = self._kernel
+            if not code.strip():
+                return ToolResult(output="会话状态已清空" if reset else "")
+
+        try:
+            result = await runner.run({"code": code, "persistent": self.stateful}, timeout=timeout)
+        except ExecutionTimeout:
+            return ToolResult(error=f"执行超时（{timeout}秒）" + self._state_lost_note())
+        except WorkerCrashed as e:
+            return ToolResult(error=f"错误: {str(e)}" + self._state_lost_note())
+
+        if result.get("error"):
+            return ToolResult(error=result["error"])
+        return ToolResult(output=result["output"])
+
+    async def cleanup(self) -> None:
+        """结束内核进程，释放会话中保留的全部状态"""
+        if self._kernel is not None:
+            self._kernel.close()
+            self._kernel = None
+
+    def _state_lost_note(self) -> str:
+        return "。会话进程已被终止，之前定义的变量和导入已丢失" if self.stateful else ""
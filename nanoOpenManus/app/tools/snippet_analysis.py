@@ -0,0 +1,330 @@
+"""
+判断一段Python代码的执行结果能否缓存
+
+只有自包含、确定性的代码才可以缓存：代码读取的每个名称要么是在它之前由代码自己绑定的，
+要么是确定性的内置函数或常用的纯计算模块（math、json、re等）；不导入其他模块，不声明global/nonlocal，
+不修改外部对象的属性或元素。模块只能以"模块.属性"的形式读取，不能赋值给其他名称或作为参数传递，
+也不能修改模块的属性，模块是整个进程共享的状态。这样的代码连续执行两次，输出和执行后的命名空间都与执行一次相同。
+open()只允许以字面量的相对路径只读打开文件，此时结果还取决于工作区中的文件。
+
+分析是保守的：无法确定的写法一律视为不可缓存。
+
+注意: 容器内的 docker/nanoOpenManus/app/tools/snippet_analysis.py 是本文件的副本，两边需保持一致
+"""
+import ast
+import builtins
+import functools
+import importlib.util
+from typing import Optional, Set
+
+# 可以直接使用（无需在代码中导入）或导入的纯计算模块
+SAFE_MODULES = frozenset({
+    "math", "cmath", "json", "re", "itertools", "collections", "functools", "operator", "string",
+    "statistics", "decimal", "fractions", "heapq", "bisect", "textwrap", "unicodedata",
+})
+
+# 结果取决于进程或命名空间状态、会修改外部对象或与外界交互的内置函数
+_UNSAFE_BUILTINS = frozenset({
+    "input", "id", "hash", "globals", "locals", "vars", "dir", "eval", "exec", "compile", "__import__",
+    "breakpoint", "help", "exit", "quit", "memoryview", "setattr", "delattr", "open",
+})
+SAFE_BUILTINS = frozenset(name for name in dir(builtins) if not name.startswith("_")) - _UNSAFE_BUILTINS
+
+# 安全模块中会读写进程级状态的函数（decimal的上下文是线程共享的可变对象）
+_UNSAFE_MODULE_ATTRIBUTES = frozenset({"getcontext", "setcontext", "localcontext"})
+
+
+class _NotCacheable(Exception):
+    pass
+
+
+def _scope_bindings(body) -> Set[str]:
+    """函数体（或类体）中直接绑定的名称，不进入嵌套的函数、类和推导式"""
+    names: Set[str] = set()
+    pending = list(body)
+    while pending:
+        node = pending.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+            continue
+        if isinstance(node, (ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)):
+            continue
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            names.add(node.id)
+        elif isinstance(node, ast.alias):
+            names.add((node.asname or node.name).split(".")[0])
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+        pending.extend(ast.iter_child_nodes(node))
+    return names
+
+
+def _arg_names(args: ast.arguments) -> Set[str]:
+    names = {arg.arg for arg in args.posonlyargs + args.args + args.kwonlyargs}
+    if args.vararg:
+        names.add(args.vararg.arg)
+    if args.kwarg:
+        names.add(args.kwarg.arg)
+    return names
+
+
+def _is_submodule(module: str, name: str) -> bool:
+    """from module import name导入的是否是子模块（例如from collections import abc）"""
+    try:
+        return importlib.util.find_spec(f"{module}.{name}") is not None
+    except (ImportError, ValueError):
+        return False
+
+
+class _Analyzer(ast.NodeVisitor):
+    """按执行顺序检查名称的读取和绑定"""
+
+    def __init__(self):
+        self.bound: Set[str] = {"__name__"}  # 模块级已绑定的名称
+        self.modules: Set[str] = set()  # 模块级绑定到模块对象的名称
+        self.scopes = []  # 嵌套作用域: (绑定的名称, 是否为类体, 其中绑定到模块对象的名称)
+        self.reads_files = False
+
+    def push_scope(self, names: Set[str], is_class: bool = False) -> None:
+        self.scopes.append((names, is_class, set()))
+
+    def lookup(self, name: str):
+        """绑定名称的可见嵌套作用域；类体中的名称只在类体本身可见，方法和推导式中不可见"""
+        last = len(self.scopes) - 1
+        for i in range(last, -1, -1):
+            names, is_class, _ = self.scopes[i]
+            if name in names and (not is_class or i == last):
+                return self.scopes[i]
+        return None
+
+    def resolvable(self, name: str) -> bool:
+        return name in self.bound or self.lookup(name) is not None
+
+    def is_module(self, name: str) -> bool:
+        scope = self.lookup(name)
+        if scope is not None:
+            return name in scope[2]
+        return name in self.modules or (name in SAFE_MODULES and name not in self.bound)
+
+    def bind(self, name: str) -> None:
+        (self.scopes[-1][2] if self.scopes else self.modules).discard(name)
+        if not self.scopes:
+            self.bound.add(name)
+
+    def bind_module(self, name: str) -> None:
+        self.bind(name)
+        (self.scopes[-1][2] if self.scopes else self.modules).add(name)
+
+    def visit_Name(self, node: ast.Name) -> None:
+        if isinstance(node.ctx, ast.Store):
+            self.bind(node.id)
+        elif self.is_module(node.id):
+            raise _NotCacheable(f"模块{node.id}只能以属性的形式读取")
+        elif not (self.resolvable(node.id) or node.id in SAFE_BUILTINS):
+            raise _NotCacheable(node.id)
+
+    def visit_Attribute(self, node: ast.Attribute) -> None:
+        if isinstance(node.value, ast.Name) and self.is_module(node.value.id):
+            if not isinstance(node.ctx, ast.Load):
+                raise _NotCacheable(f"修改模块{node.value.id}")
+            if node.attr.startswith("_") or node.attr in _UNSAFE_MODULE_ATTRIBUTES:
+                raise _NotCacheable(f"{node.value.id}.{node.attr}")
+            return
+        self.generic_visit(node)
+
+    def visit_Global(self, node) -> None:
+        raise _NotCacheable("global")
+
+    visit_Nonlocal = visit_Global
+
+    def visit_Import(self, node: ast.Import) -> None:
+        for alias in node.names:
+            if alias.name.split(".")[0] not in SAFE_MODULES:
+                raise _NotCacheable(alias.name)
+            self.bind_module((alias.asname or alias.name).split(".")[0])
+
+    def visit_ImportFrom(self, node: ast.ImportFrom) -> None:
+        if node.level or (node.module or "").split(".")[0] not in SAFE_MODULES:
+            raise _NotCacheable(node.module or ".")
+        for alias in node.names:
+            if alias.name == "*" or alias.name.startswith("_") or alias.name in _UNSAFE_MODULE_ATTRIBUTES:
+                raise _NotCacheable(alias.name)
+            if _is_submodule(node.module, alias.name):
+                self.bind_module(alias.asname or alias.name)
+            else:
+                self.bind(alias.asname or alias.name)
+
+    def visit_Assign(self, node: ast.Assign) -> None:
+        # 先求值再绑定：x = x + 1 读取的是代码之外的x
+        self.visit(node.value)
+        for target in node.targets:
+            self.visit_target(target)
+
+    def visit_AnnAssign(self, node: ast.AnnAssign) -> None:
+        if node.value is not None:
+            self.visit(node.value)
+        self.visit(node.annotation)
+        self.visit_target(node.target)
+
+    def visit_AugAssign(self, node: ast.AugAssign) -> None:
+        self.visit(node.value)
+        if isinstance(node.target, ast.Name):
+            self.visit(ast.Name(id=node.target.id, ctx=ast.Load()))
+        self.visit_target(node.target)
+
+    def visit_Delete(self, node: ast.Delete) -> None:
+        for target in node.targets:
+            if isinstance(target, ast.Name):
+                self.visit(ast.Name(id=target.id, ctx=ast.Load()))
+            else:
+                self.visit_target(target)
+
+    def visit_target(self, target) -> None:
+        """赋值目标：修改属性或元素时，被修改的对象必须是代码自己创建的"""
+        if isinstance(target, (ast.Attribute, ast.Subscript)):
+            root = target
+            while isinstance(root, (ast.Attribute, ast.Subscript)):
+                if isinstance(root, ast.Subscript):
+                    self.visit(root.slice)
+                root = root.value
+            if not (isinstance(root, ast.Name) and self.resolvable(root.id)) or self.is_module(root.id):
+                raise _NotCacheable("外部对象")
+            return
+        if isinstance(target, ast.Starred):
+            target = target.value
+        if isinstance(target, (ast.Tuple, ast.List)):
+            for element in target.elts:
+                self.visit_target(element)
+            return
+        self.visit(target)
+
+    def visit_For(self, node) -> None:
+        self.visit(node.iter)
+        self.visit_target(node.target)
+        for statement in node.body + node.orelse:
+            self.visit(statement)
+
+    visit_AsyncFor = visit_For
+
+    def visit_ExceptHandler(self, node: ast.ExceptHandler) -> None:
+        if node.type is not None:
+            self.visit(node.type)
+        if node.name:
+            self.bind(node.name)
+        for statement in node.body:
+            self.visit(statement)
+
+    def _visit_function(self, node, body, args: ast.arguments) -> None:
+        for default in args.defaults + [d for d in args.kw_defaults if d is not None]:
+            self.visit(default)
+        self.push_scope(_arg_names(args) | _scope_bindings(body if isinstance(body, list) else [body]))
+        try:
+            for statement in (body if isinstance(body, list) else [body]):
+                self.visit(statement)
+        finally:
+            self.scopes.pop()
+
+    def visit_FunctionDef(self, node) -> None:
+        for decorator in node.decorator_list:
+            self.visit(decorator)
+        self.bind(node.name)  # 先绑定，函数体内可以递归调用
+        self._visit_function(node, node.body, node.args)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Lambda(self, node: ast.Lambda) -> None:
+        self._visit_function(node, node.body, node.args)
+
+    def visit_ClassDef(self, node: ast.ClassDef) -> None:
+        for expr in node.decorator_list + node.bases + [keyword.value for keyword in node.keywords]:
+            self.visit(expr)
+        self.push_scope(_scope_bindings(node.body), is_class=True)
+        try:
+            for statement in node.body:
+                self.visit(statement)
+        finally:
+            self.scopes.pop()
+        self.bind(node.name)
+
+    def _visit_comprehension(self, node, elements) -> None:
+        names = set()
+        for generator in node.generators:
+            names |= _scope_bindings([generator.target])
+        # 最外层的可迭代对象在外层作用域中求值
+        self.visit(node.generators[0].iter)
+        self.push_scope(names)
+        try:
+            for i, generator in enumerate(node.generators):
+                if i:
+                    self.visit(generator.iter)
+                for condition in generator.ifs:
+                    self.visit(condition)
+            for element in elements:
+                self.visit(element)
+        finally:
+            self.scopes.pop()
+
+    def visit_ListComp(self, node) -> None:
+        self._visit_comprehension(node, [node.elt])
+
+    visit_SetComp = visit_GeneratorExp = visit_ListComp
+
+    def visit_DictComp(self, node: ast.DictComp) -> None:
+        self._visit_comprehension(node, [node.key, node.value])
+
+    def visit_NamedExpr(self, node: ast.NamedExpr) -> None:
+        self.visit(node.value)
+        self.bind(node.target.id)
+
+    def visit_Call(self, node: ast.Call) -> None:
+        func = node.func
+        if isinstance(func, ast.Name) and func.id == "open" and not self.resolvable("open"):
+            self._check_open(node)
+        else:
+            self.visit(func)
+        for arg in node.args:
+            self.visit(arg)
+        for keyword in node.keywords:
+            self.visit(keyword.value)
+
+    def _check_open(self, node: ast.Call) -> None:
+        """open()只允许以字面量的相对路径只读打开"""
+        path = node.args[0] if node.args else None
+        mode = node.args[1] if len(node.args) > 1 else None
+        for keyword in node.keywords:
+            if keyword.arg == "file":
+                path = keyword.value
+            elif keyword.arg == "mode":
+                mode = keyword.value
+        if not (isinstance(path, ast.Constant) and isinstance(path.value, str)):
+            raise _NotCacheable("open")
+        if path.value.startswith(("/", "~")) or ".." in path.value.replace("\\", "/").split("/"):
+            raise _NotCacheable("open")
+        if mode is not None and not (isinstance(mode, ast.Constant) and isinstance(mode.value, str)
+                                     and not set(mode.value) & set("wax+")):
+            raise _NotCacheable("open")
+        self.reads_files = True
+
+
+@functools.lru_cache(maxsize=256)
+def analyze_snippet(code: str) -> Optional[bool]:
+    """
+    分析代码能否缓存
+
+    Args:
+        code: Python代码
+
+    Returns:
+        Optional[bool]: None表示不可缓存；否则表示执行结果是否还取决于工作区中的文件
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None  # 语法错误的代码每次都会报同样的错，但不值得缓存
+    analyzer = _Analyzer()
+    try:
+        for statement in tree.body:
+            analyzer.visit(statement)
+    except (_NotCacheable, RecursionError):
+        return None
+    return analyzer.reads_files
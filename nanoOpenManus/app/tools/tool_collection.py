@@ -1,19 +1,140 @@
-from typing import Dict, List
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
 
-from nanoOpenManus.app.tools.base import BaseTool
+from nanoOpenManus.app.tools.base import BaseTool, ToolResult
+
+try:
+    from nanoOpenManus.app.console import console_print
+except ImportError:  # 容器内没有console模块，输出不受--quiet控制
+    console_print = print
+
+# 每个工具缓存的结果数上限
+DEFAULT_CACHE_SIZE = 128
+
+# 工作区中的条目超过该数量时不计算指纹，结果取决于工作区文件的调用不缓存
+MAX_FINGERPRINT_ENTRIES = 10000
+
+
+def workspace_fingerprint(root: str, max_entries: int = MAX_FINGERPRINT_ENTRIES) -> Optional[Tuple[int, int, int]]:
+    """
+    工作区的指纹: (条目数, 最新的修改时间, 文件总字节数)
+    
+    新建、删除、修改文件都会改变指纹；目录无法读取或条目过多时返回None
+    """
+    count, latest, size = 0, 0, 0
+    pending = [root]
+    try:
+        latest = os.stat(root).st_mtime_ns
+        while pending:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    count += 1
+                    if count > max_entries:
+                        return None
+                    st = entry.stat(follow_symlinks=False)
+                    latest = max(latest, st.st_mtime_ns)
+                    size += st.st_size
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+    except OSError:
+        return None
+    return count, latest, size
+
+
+class ToolResultCache:
+    """
+    按工具分开的LRU结果缓存，并记录每个工具的命中和未命中次数
+    
+    容器内的worker在线程池中执行工具调用，同一个集合可能被多个线程同时使用，因此读写都加锁
+    """
+    
+    def __init__(self, max_entries: int = DEFAULT_CACHE_SIZE):
+        """
+        Args:
+            max_entries: 每个工具保留的最多结果数
+        """
+        self.max_entries = max_entries
+        self._entries: Dict[str, "OrderedDict[str, tuple]"] = {}  # 工具名 -> (缓存键 -> (结果, 工作区指纹))
+        self.stats: Dict[str, Dict[str, int]] = {}  # 工具名 -> {"hits": ..., "misses": ...}
+        self._lock = threading.Lock()
+    
+    def get(self, tool_name: str, key: str, fingerprint: Optional[tuple] = None) -> Optional[ToolResult]:
+        """查找结果；保存时的工作区指纹与当前不同时视为未命中"""
+        with self._lock:
+            entries = self._entries.get(tool_name)
+            entry = entries.get(key) if entries else None
+            stats = self.stats.setdefault(tool_name, {"hits": 0, "misses": 0})
+            if entry is None or entry[1] != fingerprint:
+                stats["misses"] += 1
+                return None
+            entries.move_to_end(key)
+            stats["hits"] += 1
+            return entry[0]
+    
+    def put(self, tool_name: str, key: str, result: ToolResult, fingerprint: Optional[tuple] = None) -> None:
+        with self._lock:
+            entries = self._entries.setdefault(tool_name, OrderedDict())
+            entries[key] = (result, fingerprint)
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+    
+    def clear(self, tool_names: Optional[List[str]] = None) -> None:
+        """清除指定工具（默认全部工具）的缓存结果，统计保留"""
+        with self._lock:
+            for name in list(self._entries) if tool_names is None else tool_names:
+                self._entries.pop(name, None)
+    
+    def summary(self) -> Dict[str, Dict[str, int]]:
+        """每个工具的命中次数、未命中次数和当前缓存的结果数"""
+        with self._lock:
+            return {
+                name: {**stats, "entries": len(self._entries.get(name) or ())}
+                for name, stats in self.stats.items()
+            }
 
 
 class ToolCollection:
-    """管理多个工具的集合"""
+    """
+    管理多个工具的集合
+    
+    声明了cache_policy的工具的结果会被缓存，键由工具的cache_key决定；
+    结果取决于工作区文件的调用（reads_workspace）在工作区有文件变化后失效。
+    """
     
-    def __init__(self, *tools):
+    def __init__(self, *tools, cache_size: int = DEFAULT_CACHE_SIZE, workspace: Optional[str] = None):
+        """
+        Args:
+            *tools: 初始的工具
+            cache_size: 每个工具缓存的结果数上限
+            workspace: 计算工作区指纹的目录，默认为ALLOWED_WRITE_DIR；两者都没有时结果取决于工作区文件的调用不缓存
+        """
+        self.cache = ToolResultCache(cache_size)
+        self.workspace = workspace
+        self.revision = 0  # 工具集合每次变化时递增，用于判断缓存的工具描述是否过期
+        self._params_cache = None  # (revision, to_params()的结果)
         self.tool_map: Dict[str, BaseTool] = {}
         for tool in tools:
             self.add_tool(tool)
     
+    @property
+    def tool_map(self) -> Dict[str, BaseTool]:
+        return self._tool_map
+    
+    @tool_map.setter
+    def tool_map(self, value: Dict[str, BaseTool]) -> None:
+        self._tool_map = value
+        self.revision += 1
+        self.cache.clear()  # 同名工具可能换成了别的实现，之前的结果不再适用
+    
     def add_tool(self, tool: BaseTool) -> None:
         """添加一个工具到集合中"""
         self.tool_map[tool.name] = tool
+        self.revision += 1
+        self.cache.clear([tool.name])
     
     def get_tool(self, name: str) -> BaseTool:
         """根据名称获取工具"""
@@ -24,17 +145,56 @@ class ToolCollection:
         return list(self.tool_map.keys())
     
     async def execute(self, name: str, tool_input: Dict) -> str:
-        """执行指定名称的工具"""
+        """执行指定名称的工具；可缓存的调用先查找结果缓存，只缓存没有错误的结果"""
         tool = self.get_tool(name)
         if not tool:
             return f"Error: Tool '{name}' not found"
         
         try:
+            if tool.cache_policy == "never":
+                return await tool.execute(**tool_input)
+            key = tool.cache_key(**tool_input)
+            if key is None:
+                return await tool.execute(**tool_input)
+            reads_workspace = tool.reads_workspace(**tool_input)
+            fingerprint = await self._workspace_fingerprint() if reads_workspace else None
+            if reads_workspace and fingerprint is None:
+                return await tool.execute(**tool_input)
+            cached = self.cache.get(name, key, fingerprint)
+            if cached is not None:
+                return cached
             result = await tool.execute(**tool_input)
+            # 执行后重新计算键，键可以包含执行后的工具状态（例如python_execute内核的执行次数）；
+            # 指纹沿用执行前的：执行期间文件有变化时，新的指纹不会再与之相同，结果只是不再命中
+            key = tool.cache_key(**tool_input)
+            if key is not None and isinstance(result, ToolResult) and not result.error:
+                self.cache.put(name, key, result, fingerprint)
             return result
         except Exception as e:
             return f"Error executing tool '{name}': {str(e)}"
     
+    async def _workspace_fingerprint(self) -> Optional[tuple]:
+        """在线程池中遍历工作区，不阻塞事件循环；没有指定工作区时返回None，不会去遍历当前目录"""
+        root = self.workspace or os.environ.get("ALLOWED_WRITE_DIR")
+        if not root:
+            return None
+        return await asyncio.get_running_loop().run_in_executor(None, workspace_fingerprint, root)
+    
+    async def cleanup(self) -> None:
+        """释放所有工具在本次会话中持有的资源，并清除会话级的缓存结果"""
+        for tool in self.tool_map.values():
+            try:
+                await tool.cleanup()
+            except Exception as e:
+                console_print(f"⚠️ 清理工具 '{tool.name}' 失败: {str(e)}")
+        self.cache.clear([name for name, tool in self.tool_map.items() if tool.cache_policy == "session"])
+    
     def to_params(self) -> List[Dict]:
-        """将所有工具转换为函数调用格式列表"""
-        return [tool.to_param() for tool in self.tool_map.values()] 
\ No newline at end of file
+        """
+        将所有工具转换为函数调用格式列表
+        
+        同一revision内返回同一个列表对象，调用方可以据此复用其编码结果，不应修改该列表
+        """
+        if self._params_cache is None or self._params_cache[0] != self.revision:
+            self._params_cache = (self.revision, [tool.to_param() for tool in self.tool_map.values()])
+        return self._params_cache[1] 
\ No newline at end of file
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import struct
+from typing import Any, Dict, List, Optional
+
+# 帧格式: 4字节大端无符号长度 + UTF-8编码的JSON正文 [+ 附件]
+# 启用附件时，较长的字符串（例如file_saver的内容、python_execute的代码）不经过JSON转义，
+# 在JSON中替换为 {"$attachment": 序号}，原始UTF-8字节按顺序紧跟在JSON正文之后，
+# 各附件的长度记录在JSON的 "$attachments" 字段中。
+# 注意: 容器内的 docker/nanoOpenManus/app/tools/worker_protocol.py 是本文件的副本，两边需保持一致
+FRAME_HEADER = struct.Struct(">I")
+MAX_FRAME_SIZE = 256 * 1024 * 1024
+MAX_ATTACHMENT_SIZE = 1024 * 1024 * 1024
+ATTACHMENT_THRESHOLD = 64 * 1024  # 不短于此长度的字符串作为附件发送
+
+
+class FrameError(Exception):
+    """帧格式错误"""
+
+
+def encode_frame(message: Dict) -> bytes:
+    """将消息编码为一个带长度前缀的帧（不使用附件）"""
+    body = json.dumps(message, ensure_ascii=False).encode("utf-8")
+    if len(body) > MAX_FRAME_SIZE:
+        raise FrameError(f"帧过大: {len(body)} 字节")
+    return FRAME_HEADER.pack(len(body)) + body
+
+
+def encode_message(message: Dict, attachments: bool = False) -> List[bytes]:
+    """
+    将消息编码为一个帧，返回依次写出的数据块
+
+    数据块直接交给writer.writelines()，附件不会与JSON正文拼接成一整块内存。
+
+    Args:
+        message: 要发送的消息
+        attachments: 是否把长字符串作为附件发送（对端必须支持）
+    """
+    if not attachments:
+        return [encode_frame(message)]
+    blobs: List[bytes] = []
+    message = _extract_attachments(message, blobs)
+    if blobs:
+        message["$attachments"] = [len(blob) for blob in blobs]
+    return [encode_frame(message), *blobs]
+
+
+async def read_frame(reader) -> Optional[Dict]:
+    """
+    从asyncio.StreamReader读取一个完整的帧
+
+    Returns:
+        解码后的消息字典；对端关闭且没有残留数据时返回None
+    """
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        # 在帧边界处读到EOF视为正常关闭
+        if not e.partial:
+            return None
+        raise
+    (length,) = FRAME_HEADER.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise FrameError(f"帧过大: {length} 字节")
+    body = await reader.readexactly(length)
+    message = json.loads(body.decode("utf-8"))
+    lengths = message.pop("$attachments", None) if isinstance(message, dict) else None
+    if not lengths:
+        return message
+    blobs = []
+    for size in lengths:
+        if size > MAX_ATTACHMENT_SIZE:
+            raise FrameError(f"附件过大: {size} 字节")
+        blobs.append((await reader.readexactly(size)).decode("utf-8", errors="surrogatepass"))
+    return _restore_attachments(message, blobs)
+
+
+def _extract_attachments(value: Any, blobs: List[bytes]) -> Any:
+    """把值（含嵌套的字典、列表和元组）中的长字符串替换为附件占位符"""
+    if isinstance(value, str) and len(value) >= ATTACHMENT_THRESHOLD:
+        blobs.append(value.encode("utf-8", errors="surrogatepass"))
+        return {"$attachment": len(blobs) - 1}
+    if isinstance(value, dict):
+        return {key: _extract_attachments(item, blobs) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_extract_attachments(item, blobs) for item in value]
+    return value
+
+
+def _restore_attachments(value: Any, blobs: List[str]) -> Any:
+    """把附件占位符替换回字符串"""
+    if isinstance(value, list):
+        return [_restore_attachments(item, blobs) for item in value]
+    if not isinstance(value, dict):
+        return value
+    if len(value) == 1 and isinstance(value.get("$attachment"), int):
+        return blobs[value["$attachment"]]
+    return {key: _restore_attachments(item, blobs) for key, item in value.items()}
@@ -0,0 +1,281 @@
+"""
+基于span的运行追踪
+
+每个span记录一段操作的起止时间、属性（负载大小、token用量等）和错误，
+父子关系通过contextvars自动传递：asyncio任务创建时复制上下文，因此并发执行的工具调用
+也会挂在正确的父span下。
+
+未配置导出目标时span不做任何记录，开销可以忽略。导出目标:
+    JSONLExporter   每个结束的span写一行JSON，可用 trace_report.py 离线分析
+    OTLPExporter    以OTLP/HTTP JSON格式批量发送到本地的collector（例如 http://localhost:4318/v1/traces）
+"""
+import contextvars
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from nanoOpenManus.app.console import console_print
+
+
+class Span:
+    """一段被追踪的操作；作为上下文管理器使用，退出时结束并导出"""
+
+    def __init__(self, tracer: "Tracer", name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = dict(attributes)
+        self.error: Optional[str] = None
+        self.start_ns = 0
+        self.duration_ns = 0
+        self._started = 0
+        self._token = None
+
+    @property
+    def recording(self) -> bool:
+        return True
+
+    def set(self, **attributes) -> None:
+        """设置属性，值为None的属性会被忽略"""
+        for key, value in attributes.items():
+            if value is not None:
+                self.attributes[key] = value
+
+    def add(self, key: str, amount: float) -> None:
+        """累加数值属性（例如同一个span内多次传输的字节数）"""
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def record_error(self, error: str) -> None:
+        """记录以返回值而非异常形式出现的错误（例如工具返回的错误结果）"""
+        self.error = error
+
+    def __enter__(self) -> "Span":
+        self.start_ns = time.time_ns()
+        self._started = time.perf_counter_ns()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.duration_ns = time.perf_counter_ns() - self._started
+        _current_span.reset(self._token)
+        if exc is not None and self.error is None:
+            self.error = f"{exc_type.__name__}: {str(exc)}"
+        self.tracer.export(self)
+        return False
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start_ns / 1e9,
+            "end": (self.start_ns + self.duration_ns) / 1e9,
+            "duration_ms": round(self.duration_ns / 1e6, 3),
+            "attributes": self.attributes,
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """未启用追踪时使用的空span"""
+
+    recording = False
+
+    def set(self, **attributes) -> None:
+        pass
+
+    def add(self, key: str, amount: float) -> None:
+        pass
+
+    def record_error(self, error: str) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+_current_span: contextvars.ContextVar = contextvars.ContextVar("nanomanus_current_span", default=None)
+
+
+class JSONLExporter:
+    """每个结束的span写为一行JSON（追加写入，多个进程或多次运行可以写同一个文件）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def export(self, span: Dict) -> None:
+        line = json.dumps(span, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class OTLPExporter:
+    """
+    以OTLP/HTTP JSON格式发送span
+
+    span先进入队列，由后台线程按批发送，发送失败只打印警告，不影响代理运行。
+    """
+
+    def __init__(self, endpoint: str, service_name: str = "nanomanus", batch_size: int = 256, flush_interval: float = 2.0):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Optional[Dict]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="otlp-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Dict) -> None:
+        self._queue.put(span)
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+
+    def _run(self) -> None:
+        with httpx.Client(timeout=5) as client:
+            batch: List[Dict] = []
+            closing = False
+            while not closing:
+                try:
+                    span = self._queue.get(timeout=self.flush_interval)
+                    if span is None:
+                        closing = True
+                    else:
+                        batch.append(span)
+                except queue.Empty:
+                    pass
+                if batch and (closing or len(batch) >= self.batch_size or self._queue.empty()):
+                    self._send(client, batch)
+                    batch = []
+
+    def _send(self, client: httpx.Client, spans: List[Dict]) -> None:
+        try:
+            response = client.post(self.endpoint, json=to_otlp(spans, self.service_name))
+            if response.status_code >= 400:
+                console_print(f"⚠️ 发送追踪数据失败: HTTP {response.status_code}")
+        except httpx.HTTPError as e:
+            console_print(f"⚠️ 发送追踪数据失败: {str(e)}")
+
+
+def to_otlp(spans: List[Dict], service_name: str) -> Dict:
+    """把span字典转换为OTLP/HTTP JSON的ExportTraceServiceRequest"""
+    def attribute(key: str, value: Any) -> Dict:
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        return {"key": key, "value": typed}
+
+    otlp_spans = []
+    for span in spans:
+        item = {
+            "traceId": span["trace_id"],
+            "spanId": span["span_id"],
+            "name": span["name"],
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(int(span["start"] * 1e9)),
+            "endTimeUnixNano": str(int(span["end"] * 1e9)),
+            "attributes": [attribute(k, v) for k, v in span["attributes"].items()],
+            "status": {"code": 2, "message": span["error"]} if span["error"] else {"code": 1},
+        }
+        if span["parent_id"]:
+            item["parentSpanId"] = span["parent_id"]
+        otlp_spans.append(item)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [attribute("service.name", service_name)]},
+            "scopeSpans": [{"scope": {"name": "nanomanus"}, "spans": otlp_spans}],
+        }]
+    }
+
+
+class Tracer:
+    """创建span并把结束的span交给导出目标"""
+
+    def __init__(self):
+        self.exporters: List[Any] = []
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.exporters)
+
+    def span(self, name: str, **attributes):
+        """
+        创建一个span，用法: `with tracer.span("llm.ask_tool", model=...) as span:`
+
+        未启用追踪时返回空span，调用方可以用span.recording判断是否需要计算开销较大的属性。
+        """
+        if not self.exporters:
+            return NOOP_SPAN
+        return Span(self, name, _current_span.get(), attributes)
+
+    def export(self, span: Span) -> None:
+        data = span.to_dict()
+        for exporter in self.exporters:
+            try:
+                exporter.export(data)
+            except Exception as e:
+                console_print(f"⚠️ 导出追踪数据失败: {str(e)}")
+
+    def close(self) -> None:
+        exporters, self.exporters = self.exporters, []
+        for exporter in exporters:
+            exporter.close()
+
+
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    """获取进程内共用的tracer"""
+    return _tracer
+
+
+def current_span():
+    """返回当前上下文中的span，没有时返回空span"""
+    return _current_span.get() or NOOP_SPAN
+
+
+def configure_tracing(path: Optional[str] = None, otlp_endpoint: Optional[str] = None) -> Tracer:
+    """
+    启用追踪
+
+    Args:
+        path: JSONL追踪文件路径
+        otlp_endpoint: OTLP/HTTP JSON接收地址
+    """
+    if path:
+        _tracer.exporters.append(JSONLExporter(path))
+    if otlp_endpoint:
+        _tracer.exporters.append(OTLPExporter(otlp_endpoint))
+    return _tracer
+
+
+def shutdown_tracing() -> None:
+    """发送剩余的span并关闭导出目标"""
+    _tracer.close()
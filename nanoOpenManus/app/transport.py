@@ -0,0 +1,270 @@
+import asyncio
+import email.utils
+import importlib.util
+import random
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from nanoOpenManus.app.console import console_print
+
+
+# 安装了h2包时使用HTTP/2，同一主机的并发请求复用一条连接
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# 这些状态码表示请求可以原样重试
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+class LLMError(Exception):
+    """LLM请求在重试耗尽后仍然失败"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class RetryPolicy:
+    """带随机抖动的指数退避重试策略"""
+
+    def __init__(self, max_retries: int = 4, base_delay: float = 0.5, max_delay: float = 30.0, max_retry_after: float = 120.0):
+        """
+        Args:
+            max_retries: 首次请求之后最多重试的次数
+            base_delay: 第一次重试的退避时间上限（秒），之后每次翻倍
+            max_delay: 单次退避时间上限（秒）
+            max_retry_after: 服务端Retry-After允许的最长等待时间（秒）
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """计算第attempt次重试（从0开始）前的等待时间；服务端给出Retry-After时以其为准"""
+        if retry_after is not None:
+            # 加一点抖动，避免所有等待方在同一时刻一起重试
+            return min(retry_after, self.max_retry_after) + random.uniform(0, self.base_delay)
+        # full jitter: 在[0, 指数上限]内均匀取值
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    由429响应驱动的自适应并发限制（AIMD）
+
+    每个成功的请求让并发上限缓慢增加（每轮约+1），收到429时上限减半；
+    服务端给出Retry-After时，在此之前不再发出新请求。
+    多个代理共用同一个限制器，因而共用一个API密钥时能稳定在服务端允许的最大吞吐附近。
+    """
+
+    def __init__(self, initial_limit: int = 8, min_limit: int = 1, max_limit: int = 64, decrease_factor: float = 0.5, decrease_cooldown: float = 1.0):
+        """
+        Args:
+            initial_limit: 初始并发上限
+            min_limit: 并发上限的下限
+            max_limit: 并发上限的上限
+            decrease_factor: 收到429时上限乘以的系数
+            decrease_cooldown: 两次下调之间的最短间隔（秒），同一波429只下调一次
+        """
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+        self.in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        """等待一个并发名额"""
+        while True:
+            delay = self._paused_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            async with self._condition:
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                await self._condition.wait()
+
+    async def release(self, rate_limited: bool = False, retry_after: Optional[float] = None) -> None:
+        """归还名额，并根据请求结果调整并发上限"""
+        now = time.monotonic()
+        async with self._condition:
+            self.in_flight -= 1
+            if rate_limited:
+                if now - self._last_decrease >= self.decrease_cooldown:
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+                if retry_after:
+                    self._paused_until = max(self._paused_until, now + retry_after)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+
+class LLMTransport:
+    """
+    同一事件循环内共享的LLM HTTP传输层
+
+    持有一个带连接池（可选HTTP/2）的httpx客户端，请求失败时按RetryPolicy重试，
+    并通过AdaptiveConcurrencyLimiter控制对同一服务的并发请求数。
+    通过get_transport()获取，同一服务的所有LLM实例共用一个实例。
+    """
+
+    def __init__(
+        self,
+        client: Optional[httpx.AsyncClient] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+        max_connections: int = 64,
+        max_keepalive_connections: int = 32,
+        keepalive_expiry: float = 60.0,
+    ):
+        """
+        Args:
+            client: 可选的httpx客户端（例如测试时使用MockTransport），为None时按下面的参数创建
+            retry_policy: 重试策略
+            limiter: 并发限制器
+            max_connections: 到同一主机的最大连接数
+            max_keepalive_connections: 空闲时保留的最大连接数
+            keepalive_expiry: 空闲连接保留时间（秒）
+        """
+        self.client = client or httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=httpx.Timeout(120.0, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+        )
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.limiter = limiter or AdaptiveConcurrencyLimiter()
+        self.stats = {"requests": 0, "retries": 0, "rate_limited": 0, "failures": 0}
+
+    async def post(self, url: str, headers: Dict[str, str], content: bytes) -> httpx.Response:
+        """发送POST请求，可重试的失败会自动重试；返回已读取完毕的成功响应"""
+        async with self.stream(url, headers, content) as response:
+            await response.aread()
+            return response
+
+    @asynccontextmanager
+    async def stream(self, url: str, headers: Dict[str, str], content: bytes):
+        """
+        发送POST请求并以流的形式返回响应
+
+        只有在把响应交给调用方之前的失败会被重试（包括读取错误响应体时的传输错误）；
+        调用方开始读取成功响应的响应体后出现的错误直接抛出，因为调用方可能已经处理了部分数据。
+
+        Raises:
+            LLMError: 重试耗尽或遇到不可重试的错误状态码
+        """
+        attempt = 0
+        while True:
+            await self.limiter.acquire()
+            self.stats["requests"] += 1
+            # 拿到名额之后的任何退出路径（包括请求被取消）都必须恰好归还一次名额，否则名额会永久泄漏
+            released = False
+            response = None
+            try:
+                try:
+                    request = self.client.build_request("POST", url, headers=headers, content=content)
+                    response = await self.client.send(request, stream=True)
+                    if response.status_code >= 400:
+                        await response.aread()  # 读取错误响应体时连接同样可能断开，按传输错误重试
+                except httpx.TransportError as e:
+                    if response is not None:
+                        await response.aclose()
+                    await self.limiter.release()
+                    released = True
+                    if attempt >= self.retry_policy.max_retries:
+                        self.stats["failures"] += 1
+                        raise LLMError(f"LLM请求失败（已重试{attempt}次）: {type(e).__name__}: {str(e)}") from e
+                    await self._sleep_before_retry(attempt, None, f"{type(e).__name__}")
+                    attempt += 1
+                    continue
+
+                if response.status_code < 400:
+                    yield response
+                    return
+
+                await response.aclose()
+                rate_limited = response.status_code == 429
+                retry_after = _parse_retry_after(response.headers)
+                await self.limiter.release(rate_limited=rate_limited, retry_after=retry_after)
+                released = True
+                if rate_limited:
+                    self.stats["rate_limited"] += 1
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= self.retry_policy.max_retries:
+                    self.stats["failures"] += 1
+                    raise LLMError(
+                        f"LLM API错误: {response.status_code} - {response.text[:500]}",
+                        status_code=response.status_code,
+                    )
+                await self._sleep_before_retry(attempt, retry_after, f"HTTP {response.status_code}")
+                attempt += 1
+            finally:
+                if response is not None:
+                    await response.aclose()
+                if not released:
+                    await self.limiter.release()
+
+    async def _sleep_before_retry(self, attempt: int, retry_after: Optional[float], reason: str) -> None:
+        delay = self.retry_policy.backoff(attempt, retry_after)
+        self.stats["retries"] += 1
+        console_print(f"🔁 LLM请求失败({reason})，{delay:.1f}秒后重试 ({attempt + 1}/{self.retry_policy.max_retries})")
+        await asyncio.sleep(delay)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+# 事件循环 -> {服务origin: LLMTransport}；httpx连接与事件循环绑定，因此按循环分别共享
+_transports: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, LLMTransport]]" = weakref.WeakKeyDictionary()
+
+
+def get_transport(base_url: str) -> LLMTransport:
+    """获取当前事件循环中访问base_url所在服务的共享传输层，不存在时创建"""
+    loop = asyncio.get_running_loop()
+    parts = urlsplit(base_url)
+    origin = f"{parts.scheme}://{parts.netloc}"
+    transports = _transports.setdefault(loop, {})
+    transport = transports.get(origin)
+    if transport is None:
+        transport = transports[origin] = LLMTransport()
+    return transport
+
+
+async def close_transports() -> None:
+    """关闭当前事件循环中的所有共享传输层"""
+    transports = _transports.pop(asyncio.get_running_loop(), {})
+    await asyncio.gather(*(transport.close() for transport in transports.values()), return_exceptions=True)
+
+
+def _parse_retry_after(headers: httpx.Headers) -> Optional[float]:
+    """解析Retry-After（秒数或HTTP日期）及常见的retry-after-ms头"""
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,234 @@
+import sys
+import os
+
+# --- Start of code to fix Python path ---
+# This ensures that the project root directory (containing the 'nanoOpenManus' package)
+# is on the Python path, allowing imports like 'from nanoOpenManus.app...'
+_current_script_path = os.path.abspath(__file__)
+_current_script_dir = os.path.dirname(_current_script_path)
+_project_root = os.path.dirname(_current_script_dir)
+
+if _project_root not in sys.path:
+    sys.path.insert(0, _project_root)
+# --- End of code to fix Python path ---
+
+import argparse
+import asyncio
+import json
+import math
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Set, TextIO
+
+from nanoOpenManus.app.agent import AgentState
+from nanoOpenManus.app.agent_factory import AgentFactory, add_agent_arguments
+from nanoOpenManus.app.console import console_print, read_line
+from nanoOpenManus.app.docker_api import close_docker_clients
+from nanoOpenManus.app.transport import close_transports
+
+
+def load_completed_ids(path: str) -> Set[str]:
+    """读取已有的输出文件，返回已成功完成的任务id"""
+    completed = set()
+    if not os.path.exists(path):
+        return completed
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # 上次中断时可能留下不完整的最后一行
+            if isinstance(record, dict) and record.get("status") == "finished":
+                completed.add(str(record.get("id")))
+    return completed
+
+
+def parse_task(line: str, line_number: int) -> Optional[Dict]:
+    """
+    解析输入中的一行
+
+    每行是一个JSON对象 {"id": ..., "prompt": ..., "max_steps": ..., "deadline": ...}（除prompt外均可选），
+    或一个JSON字符串；没有id时使用行号。空行返回None。
+    """
+    line = line.strip()
+    if not line:
+        return None
+    value = json.loads(line)
+    if isinstance(value, str):
+        value = {"prompt": value}
+    if not isinstance(value, dict) or not isinstance(value.get("prompt"), str):
+        raise ValueError("每行必须是包含prompt字段的JSON对象或JSON字符串")
+    value["id"] = str(value.get("id", f"line-{line_number}"))
+    return value
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """最近秩法计算百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+class BatchRunner:
+    """以有限并发运行一批任务，每个任务完成后立即写入一行结果"""
+
+    def __init__(self, agent_factory: Callable, output: TextIO, concurrency: int = 4, skip_ids: Optional[Set[str]] = None,
+                 deadline: Optional[float] = None):
+        """
+        Args:
+            agent_factory: 以max_steps（可为None）为参数创建新代理的函数
+            output: 结果输出流，每个任务一行JSON
+            concurrency: 同时运行的任务数
+            skip_ids: 需要跳过的任务id（例如上次已完成的任务）
+            deadline: 任务没有指定deadline时使用的运行时间上限（秒），为None时不限制
+        """
+        self.agent_factory = agent_factory
+        self.deadline = deadline
+        self.output = output
+        self.concurrency = concurrency
+        self.skip_ids = skip_ids or set()
+        self.results: List[Dict] = []
+        self.skipped = 0
+        self.invalid = 0
+
+    async def run(self, source: TextIO) -> None:
+        """逐行读取输入并运行，输入可以是文件或stdin，不需要预先全部读入"""
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        running = set()
+        seen = set()
+        line_number = 0
+        while True:
+            if source is sys.stdin:
+                # 等待stdin输入时不占用线程，不阻塞正在运行的任务，Ctrl-C后也不必等到输入结束才能退出
+                try:
+                    line = await read_line()
+                except EOFError:
+                    break
+            else:
+                line = await loop.run_in_executor(None, source.readline)
+                if not line:
+                    break
+            line_number += 1
+            try:
+                task = parse_task(line, line_number)
+            except ValueError as e:
+                console_print(f"⚠️ 第{line_number}行无效，已跳过: {str(e)}")
+                self.invalid += 1
+                continue
+            if task is None:
+                continue
+            if task["id"] in self.skip_ids or task["id"] in seen:
+                self.skipped += 1
+                continue
+            seen.add(task["id"])
+            await semaphore.acquire()
+            future = asyncio.ensure_future(self._run_one(task))
+            running.add(future)
+            future.add_done_callback(running.discard)
+            future.add_done_callback(lambda _: semaphore.release())
+        if running:
+            await asyncio.gather(*running)
+
+    async def _run_one(self, task: Dict) -> None:
+        started = time.monotonic()
+        record = {"id": task["id"], "prompt": task["prompt"]}
+        agent = None
+        try:
+            agent = self.agent_factory(task.get("max_steps"))
+            result = await agent.run(task["prompt"], deadline=task.get("deadline", self.deadline))
+            record["status"] = {AgentState.ERROR: "error", AgentState.CANCELLED: "cancelled"}.get(agent.state, "finished")
+            record["result"] = result
+        except Exception as e:
+            record["status"] = "error"
+            record["result"] = f"创建或运行代理时出错: {str(e)}"
+        finally:
+            if agent is not None and hasattr(agent, "close"):
+                try:
+                    await agent.close()
+                except Exception as e:
+                    console_print(f"⚠️ 关闭代理资源失败: {str(e)}")
+        record["steps"] = agent.current_step if agent is not None else 0
+        record["latency"] = round(time.monotonic() - started, 3)
+        self.results.append(record)
+        self.output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.output.flush()
+        console_print(f"{'✅' if record['status'] == 'finished' else '❌'} [{len(self.results)}] {record['id']} "
+              f"({record['steps']} 步, {record['latency']:.1f}秒)")
+
+    def summary(self, elapsed: float) -> Dict:
+        """汇总吞吐量、延迟和步骤数"""
+        latencies = [r["latency"] for r in self.results]
+        steps = [r["steps"] for r in self.results]
+        return {
+            "completed": sum(1 for r in self.results if r["status"] == "finished"),
+            "failed": sum(1 for r in self.results if r["status"] != "finished"),
+            "skipped": self.skipped,
+            "invalid": self.invalid,
+            "elapsed": round(elapsed, 2),
+            "tasks_per_minute": round(len(self.results) / elapsed * 60, 2) if elapsed > 0 else 0.0,
+            "latency_p50": percentile(latencies, 0.5),
+            "latency_p95": percentile(latencies, 0.95),
+            "steps_mean": round(sum(steps) / len(steps), 2) if steps else 0.0,
+            "steps_p50": percentile(steps, 0.5),
+            "steps_max": max(steps) if steps else 0,
+            "steps_histogram": dict(sorted(Counter(steps).items())),  # 步骤数 -> 任务数；每个任务的步骤数见输出文件
+        }
+
+
+async def main():
+    """
+    NanoOpenManus 批处理入口
+
+    从JSONL文件或stdin读取任务，以有限并发运行，每完成一个任务就追加一行结果到输出文件；
+    重新运行时跳过输出文件中已成功完成的任务
+    """
+    parser = argparse.ArgumentParser(description='NanoOpenManus - 批处理模式')
+    parser.add_argument('input', help="输入JSONL文件，'-'表示从stdin读取")
+    parser.add_argument('-o', '--output', required=True, help='结果输出JSONL文件（追加写入）')
+    parser.add_argument('-c', '--concurrency', type=int, default=4, help='同时运行的任务数 (默认: 4)')
+    parser.add_argument('--no-resume', action='store_true', help='不跳过输出文件中已完成的任务')
+    add_agent_arguments(parser)
+    args = parser.parse_args()
+
+    skip_ids = set() if args.no_resume else load_completed_ids(args.output)
+    if skip_ids:
+        console_print(f"⏭️ 输出文件中已有 {len(skip_ids)} 个已完成的任务，将跳过")
+
+    agent_factory = AgentFactory(args, max_concurrent=args.concurrency)
+    await agent_factory.start()
+    source = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    started = time.monotonic()
+    try:
+        with open(args.output, "a", encoding="utf-8") as output:
+            runner = BatchRunner(agent_factory, output, concurrency=args.concurrency, skip_ids=skip_ids,
+                                 deadline=args.deadline)
+            await runner.run(source)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        await agent_factory.close()
+        await close_transports()
+        await close_docker_clients()
+
+    summary = runner.summary(time.monotonic() - started)
+    console_print("\n📊 批处理统计:")
+    console_print(f"   完成: {summary['completed']}  失败: {summary['failed']}  跳过: {summary['skipped']}  无效行: {summary['invalid']}")
+    console_print(f"   耗时: {summary['elapsed']}秒  吞吐量: {summary['tasks_per_minute']} 任务/分钟")
+    console_print(f"   延迟: p50 {summary['latency_p50']:.2f}秒  p95 {summary['latency_p95']:.2f}秒")
+    console_print(f"   步骤数: 平均 {summary['steps_mean']}  p50 {summary['steps_p50']}  最大 {summary['steps_max']}")
+    for steps, count in summary["steps_histogram"].items():
+        console_print(f"     {steps} 步: {count} 个任务")
+    if agent_factory.sandbox_pool is not None:
+        pool = agent_factory.sandbox_pool.stats()
+        console_print(f"   沙箱还原: {pool['resets']} 次  平均 {pool['reset_ms_avg']}ms  最大 {pool['reset_ms_max']}ms  "
+              f"回收 {pool['reclaimed_bytes']} 字节")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        console_print("\n👋 批处理已中断，重新运行同一命令会跳过已完成的任务")
@@ -0,0 +1 @@
+# nanoOpenManus 的性能基准测试，使用 python -m nanoOpenManus.benchmarks.<模块名> 运行
@@ -0,0 +1,311 @@
+"""
+端到端基准
+
+不需要API密钥和Docker守护进程：LLM由本地的模拟服务（mock_llm.py，独立进程）代替，
+docker命令行由本地替身（fake_docker.py）代替，工具仍然走完整的沙箱协议（容器内worker、会话内核等）。
+模拟LLM不耗时，因此测得的每步耗时就是框架自身的开销（请求编码、HTTP往返、工具分派、沙箱往返等）。
+
+场景:
+    single_tool    一次运行，调用一次python_execute
+    steps_20       一次运行，连续20步工具调用
+    history_200    一次运行，100步工具调用，对话历史增长到约200条消息
+    file_10mb      一次运行，用file_saver写入10MB的文件
+    sessions_100   100个会话同时运行，每个会话3步；额外统计每个会话占用的内存
+    large_output   一次运行，50步工具调用，每步打印1MB（python_execute截断为16KB）；超过8000字符的输出存入blob存储
+    large_output_inline  同上，但输出完整写入历史，请求随步数增长（对比blob存储的效果）
+
+指标: steps_per_sec（吞吐量）、step_ms（单个会话内平均每步耗时）、memory_per_session_kb（仅多会话场景）
+多会话场景中所有会话共用一个事件循环，会话数超过沙箱池上限时还要排队等待沙箱，因此step_ms包含等待时间。
+
+用法:
+    python -m nanoOpenManus.benchmarks.bench_e2e                                  # 运行全部场景
+    python -m nanoOpenManus.benchmarks.bench_e2e steps_20 file_10mb --repeat 5
+    python -m nanoOpenManus.benchmarks.bench_e2e --save-baseline bench_baseline.json
+    python -m nanoOpenManus.benchmarks.bench_e2e --baseline bench_baseline.json   # 有退化时退出码为1
+
+环境变量 NANOMANUS_DOCKER_BIN 已设置时（例如设为docker）使用真实的docker命令行，镜像需要预先构建。
+--docker-api 改为通过Engine API访问沙箱（本地替身 fake_docker_api.py，独立进程），可与命令行方式对比容器生命周期和exec的开销。
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import shlex
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+from nanoOpenManus.benchmarks import fake_docker, mock_llm
+
+# docker_proxy在导入时读取该变量，必须在导入代理模块之前设置
+os.environ.setdefault("NANOMANUS_DOCKER_BIN", f"{shlex.quote(sys.executable)} {shlex.quote(fake_docker.__file__)}")
+
+from nanoOpenManus.app.agent import AgentState  # noqa: E402
+from nanoOpenManus.app.console import set_console_output  # noqa: E402
+from nanoOpenManus.app.docker_api import close_docker_clients  # noqa: E402
+from nanoOpenManus.app.docker_manus import DockerManus  # noqa: E402
+from nanoOpenManus.app.manus import Manus  # noqa: E402
+from nanoOpenManus.app.sandbox_pool import SandboxPool  # noqa: E402
+from nanoOpenManus.app.transport import close_transports  # noqa: E402
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PYTHON_STEP = {"tool": "python_execute", "arguments": {"code": "x = 1\nprint(x)"}}
+LARGE_OUTPUT_STEP = {"tool": "python_execute", "arguments": {"code": "print('x' * 1024 * 1024)"}, "steps": 50}
+
+SCENARIOS: Dict[str, Dict] = {
+    "single_tool": {"spec": {**PYTHON_STEP, "steps": 1}, "sessions": 1},
+    "steps_20": {"spec": {**PYTHON_STEP, "steps": 20}, "sessions": 1},
+    "history_200": {"spec": {**PYTHON_STEP, "steps": 100}, "sessions": 1},
+    "file_10mb": {
+        "spec": {"tool": "file_saver", "arguments": {"file_path": "bench.txt"},
+                 "pad": {"key": "content", "bytes": 10 * 1024 * 1024}, "steps": 1},
+        "sessions": 1,
+    },
+    "sessions_100": {"spec": {**PYTHON_STEP, "steps": 3}, "sessions": 100, "memory": True},
+    "large_output": {"spec": LARGE_OUTPUT_STEP, "sessions": 1, "agent": {"blob_threshold": 8000}},
+    "large_output_inline": {"spec": LARGE_OUTPUT_STEP, "sessions": 1},
+}
+
+# 指标的方向：1表示越大越好，-1表示越小越好
+METRICS = {"steps_per_sec": 1, "step_ms": -1, "memory_per_session_kb": -1}
+
+
+class MockLLMProcess:
+    """在独立进程中运行模拟LLM服务，使其CPU开销不计入被测进程"""
+
+    def __init__(self):
+        self.process: Optional[subprocess.Popen] = None
+        self.base_url = ""
+
+    def __enter__(self) -> "MockLLMProcess":
+        self.process = subprocess.Popen(
+            [sys.executable, mock_llm.__file__, "--port", "0"],
+            stdout=subprocess.PIPE, text=True,
+        )
+        line = self.process.stdout.readline()  # "🚀 模拟LLM服务已启动: http://127.0.0.1:<端口>"
+        if "http://" not in line:
+            self.process.kill()
+            raise RuntimeError("模拟LLM服务启动失败")
+        self.base_url = line[line.index("http://"):].strip()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.process.terminate()
+        self.process.wait()
+
+
+class FakeDockerAPIProcess:
+    """在独立进程中运行Docker Engine API替身，并让本进程通过它访问沙箱"""
+
+    def __init__(self):
+        self.process: Optional[subprocess.Popen] = None
+        self._tempdir: Optional[tempfile.TemporaryDirectory] = None
+        self._previous: Optional[str] = None
+
+    def __enter__(self) -> "FakeDockerAPIProcess":
+        self._tempdir = tempfile.TemporaryDirectory(prefix="nanomanus-docker-api-")
+        socket_path = os.path.join(self._tempdir.name, "docker.sock")
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "nanoOpenManus.benchmarks.fake_docker_api", "--socket", socket_path],
+            stdout=subprocess.PIPE, text=True,
+            env=dict(os.environ, PYTHONPATH=_PROJECT_ROOT),
+        )
+        line = self.process.stdout.readline()  # "🚀 模拟Docker Engine API已启动: <路径>"
+        if socket_path not in line:
+            self.process.kill()
+            raise RuntimeError("Docker Engine API替身启动失败")
+        # docker_api按环境变量选择socket，在首次使用时读取
+        self._previous = os.environ.get("NANOMANUS_DOCKER_API")
+        os.environ["NANOMANUS_DOCKER_API"] = socket_path
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._previous is None:
+            os.environ.pop("NANOMANUS_DOCKER_API", None)
+        else:
+            os.environ["NANOMANUS_DOCKER_API"] = self._previous
+        self.process.terminate()
+        self.process.wait()
+        self._tempdir.cleanup()
+
+
+class ScenarioRunner:
+    """按场景创建代理并计时"""
+
+    def __init__(self, base_url: str, backend: str, pool_size: int):
+        """
+        Args:
+            base_url: 模拟LLM服务的地址
+            backend: "docker"在（替身）沙箱中执行工具，"local"在本机执行
+            pool_size: docker模式下沙箱池的容器数上限，多会话场景中超出的会话排队等待
+        """
+        self.base_url = base_url
+        self.backend = backend
+        self.pool_size = pool_size
+        self.pool: Optional[SandboxPool] = None
+
+    async def start(self) -> None:
+        if self.backend == "docker":
+            self.pool = SandboxPool(min_size=1, max_size=self.pool_size, name_prefix="nanomanus-bench")
+            await self.pool.start()
+
+    async def close(self) -> None:
+        if self.pool is not None:
+            await self.pool.close()
+        await close_transports()
+        await close_docker_clients()
+
+    def _make_agent(self, max_steps: int, agent_options: Optional[Dict] = None):
+        options = dict(max_steps=max_steps, api_key="mock", model="mock", base_url=self.base_url, **(agent_options or {}))
+        if self.pool is not None:
+            return DockerManus(sandbox_pool=self.pool, **options)
+        return Manus(**options)
+
+    async def _run_session(self, prompt: str, max_steps: int, agent_options: Optional[Dict] = None) -> Dict:
+        agent = self._make_agent(max_steps, agent_options)
+        started = time.perf_counter()
+        await agent.run(prompt)
+        elapsed = time.perf_counter() - started
+        return {"elapsed": elapsed, "steps": agent.current_step, "state": agent.state}
+
+    async def run(self, scenario: Dict) -> Dict:
+        """运行一次场景，返回指标"""
+        spec = scenario["spec"]
+        prompt = json.dumps(spec, ensure_ascii=False)
+        max_steps = spec["steps"] + 1  # 最后一步返回最终回复
+        sessions = scenario["sessions"]
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(self._run_session(prompt, max_steps, scenario.get("agent")) for _ in range(sessions)))
+        wall = time.perf_counter() - started
+
+        failed = [r for r in results if r["state"] != AgentState.FINISHED or r["steps"] != max_steps]
+        if failed:
+            raise RuntimeError(f"{len(failed)} 个会话未按预期完成: {failed[0]}")
+        total_steps = sum(r["steps"] for r in results)
+        return {
+            "wall_s": round(wall, 4),
+            "steps": total_steps,
+            "steps_per_sec": round(total_steps / wall, 2),
+            "step_ms": round(statistics.mean(r["elapsed"] / r["steps"] for r in results) * 1000, 3),
+        }
+
+    async def measure_memory(self, scenario: Dict) -> float:
+        """
+        单独运行一次场景，用tracemalloc统计峰值内存，返回平均每个会话的KB数
+
+        tracemalloc会显著拖慢运行，因此不与计时的运行放在一起；统计的是本进程中Python对象的内存
+        （代理、消息历史、请求缓冲等），不含沙箱进程。
+        """
+        tracemalloc.start()
+        try:
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            await self.run(scenario)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return round((peak - baseline) / 1024 / scenario["sessions"], 1)
+
+
+async def run_benchmarks(names: List[str], repeat: int, backend: str, pool_size: int,
+                         docker_api: bool = False) -> Dict[str, Dict]:
+    results: Dict[str, Dict] = {}
+    # 代理每一步都会打印日志，基准运行期间关闭；与镜像共用的工具模块仍直接print，其输出另行丢弃
+    set_console_output(False)
+    with contextlib.ExitStack() as stack:
+        if docker_api:
+            stack.enter_context(FakeDockerAPIProcess())
+        mock = stack.enter_context(MockLLMProcess())
+        runner = ScenarioRunner(mock.base_url, backend, pool_size)
+        await runner.start()
+        try:
+            # 预热：启动沙箱worker、建立连接，避免首个场景承担一次性开销
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                await runner.run(SCENARIOS["single_tool"])
+            for name in names:
+                scenario = SCENARIOS[name]
+                runs = []
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    for _ in range(repeat):
+                        runs.append(await runner.run(scenario))
+                    memory = await runner.measure_memory(scenario) if scenario.get("memory") else None
+                # 多次运行取中位数
+                result = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+                if memory is not None:
+                    result["memory_per_session_kb"] = memory
+                results[name] = result
+                print(f"  {name:<14} " + "  ".join(f"{key}={value}" for key, value in result.items()))
+        finally:
+            await runner.close()
+    return results
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """与基线比较，返回退化超过tolerance的指标说明"""
+    regressions = []
+    print(f"\n📊 与基线比较（允许偏差 {tolerance:.0%}）:")
+    for name, result in results.items():
+        for metric, direction in METRICS.items():
+            old = (baseline.get(name) or {}).get(metric)
+            new = result.get(metric)
+            if old is None or new is None or old == 0:
+                continue
+            change = (new - old) / old
+            worse = change * direction < -tolerance
+            mark = "❌" if worse else "✅"
+            print(f"  {mark} {name:<14} {metric:<22} {old:>12} -> {new:<12} ({change:+.1%})")
+            if worse:
+                regressions.append(f"{name}.{metric}: {old} -> {new} ({change:+.1%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端基准（模拟LLM + 本地沙箱替身）")
+    parser.add_argument("scenarios", nargs="*", help=f"要运行的场景 (默认: 全部)，可选: {', '.join(SCENARIOS)}")
+    parser.add_argument("--repeat", type=int, default=3, help="每个场景运行的次数，结果取中位数 (默认: 3)")
+    parser.add_argument("--backend", choices=["docker", "local"], default="docker",
+                        help="工具执行方式：docker为沙箱协议（默认使用本地替身），local为本机执行 (默认: docker)")
+    parser.add_argument("--pool-size", type=int, default=8, help="docker模式下沙箱池的容器数上限 (默认: 8)")
+    parser.add_argument("--docker-api", action="store_true",
+                        help="docker模式下通过Engine API（本地替身）访问沙箱，而不是docker命令行")
+    parser.add_argument("--baseline", default=None, metavar="PATH", help="与该基线文件比较，有退化时退出码为1")
+    parser.add_argument("--save-baseline", default=None, metavar="PATH", help="把本次结果保存为基线文件")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="允许的相对退化 (默认: 0.25)")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知场景: {', '.join(unknown)}")
+    names = args.scenarios or list(SCENARIOS)
+
+    backend = f"{args.backend}+api" if args.backend == "docker" and args.docker_api else args.backend
+    print(f"🏁 运行 {len(names)} 个场景（工具执行: {backend}，每个场景 {args.repeat} 次）")
+    results = asyncio.run(run_benchmarks(names, args.repeat, args.backend, args.pool_size, args.docker_api))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"backend": backend, "python": sys.version.split()[0], "scenarios": results},
+                      f, ensure_ascii=False, indent=2)
+        print(f"\n💾 基线已保存到 {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("backend") != backend:
+            print(f"⚠️ 基线的工具执行方式为 {baseline.get('backend')}，与本次不同，结果不可直接比较")
+        regressions = compare(results, baseline.get("scenarios") or {}, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} 项指标退化")
+            sys.exit(1)
+        print("\n✅ 没有超出允许范围的退化")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+请求序列化微基准
+
+模拟一次长时间运行：对话历史每步追加一条助手消息和一条工具消息，
+比较每步都完整重建并编码请求体（旧方式）与增量编码（RequestEncoder）的耗时。
+
+用法:
+    python -m nanoOpenManus.benchmarks.bench_serialization --messages 400
+"""
+import argparse
+import json
+import time
+
+from nanoOpenManus.app.agent import Message
+from nanoOpenManus.app.llm import LLM
+from nanoOpenManus.app.tools.environment_check import EnvironmentCheck
+from nanoOpenManus.app.tools.file_saver import FileSaver
+from nanoOpenManus.app.tools.python_execute import PythonExecute
+from nanoOpenManus.app.tools.terminate import Terminate
+from nanoOpenManus.app.tools.tool_collection import ToolCollection
+
+
+def _make_step(i: int, observation_size: int):
+    """构造一步产生的助手消息和工具消息"""
+    call_id = f"call_{i}"
+    assistant = Message.assistant_message(
+        f"第{i}步：执行代码分析数据",
+        tool_calls=[{
+            "id": call_id,
+            "type": "function",
+            "function": {"name": "python_execute", "arguments": json.dumps({"code": f"print({i} * 2)"})},
+        }],
+    )
+    tool = Message.tool_message(f"工具 `python_execute` 的执行结果: " + "x" * observation_size, call_id)
+    return assistant, tool
+
+
+def _legacy_body(llm: LLM, messages, system_msgs, tools) -> bytes:
+    """旧方式：每步重新转换所有消息和工具，再整体JSON编码"""
+    api_messages = [
+        {"role": m.role, "content": m.content} if m.role in ("system", "user")
+        else {k: v for k, v in (("role", m.role), ("content", m.content), ("tool_call_id", m.tool_call_id), ("tool_calls", m.tool_calls)) if v}
+        for m in list(system_msgs) + list(messages)
+    ]
+    payload = {"model": llm.model, "messages": api_messages, "temperature": 0.0, "tools": [t for t in tools]}
+    return json.dumps(payload).encode("utf-8")
+
+
+def run(total_messages: int, observation_size: int):
+    llm = LLM(api_key="benchmark")
+    tools = ToolCollection(PythonExecute(), FileSaver(), EnvironmentCheck(), Terminate())
+    system_msgs = [Message.system_message("你是OpenManus。")]
+    messages = [Message.user_message("分析数据"), Message.user_message("选择合适的工具")]
+
+    legacy_total = incremental_total = 0.0
+    legacy_last = incremental_last = 0.0
+    while len(messages) < total_messages:
+        messages.extend(_make_step(len(messages), observation_size))
+
+        start = time.perf_counter()
+        _legacy_body(llm, messages, system_msgs, [t.to_param() for t in tools.tool_map.values()])
+        legacy_last = time.perf_counter() - start
+        legacy_total += legacy_last
+
+        start = time.perf_counter()
+        llm._build_tool_request(messages, system_msgs, tools.to_params(), "auto")
+        incremental_last = time.perf_counter() - start
+        incremental_total += incremental_last
+
+    steps = (len(messages) - 2) // 2
+    print(f"消息数: {len(messages)}  步数: {steps}  每条观察结果: {observation_size} 字符")
+    print(f"完整重建: 总计 {legacy_total * 1000:8.2f} ms  最后一步 {legacy_last * 1000:7.3f} ms")
+    print(f"增量编码: 总计 {incremental_total * 1000:8.2f} ms  最后一步 {incremental_last * 1000:7.3f} ms")
+    if incremental_total:
+        print(f"加速比: {legacy_total / incremental_total:.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="请求序列化微基准")
+    parser.add_argument("--messages", type=int, default=400, help="最终的对话历史长度 (默认: 400)")
+    parser.add_argument("--observation-size", type=int, default=2000, help="每条工具结果的字符数 (默认: 2000)")
+    args = parser.parse_args()
+    for size in sorted({200, args.messages}):
+        run(size, args.observation_size)
+        print()
+
+
+if __name__ == "__main__":
+    main()
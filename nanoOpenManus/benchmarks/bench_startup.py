@@ -0,0 +1,118 @@
+"""
+启动时间基准
+
+测量交互模式（main.py）从启动进程到显示输入提示的时间（time-to-prompt），
+以及导入nanoOpenManus.main本身的耗时。不需要API密钥和Docker守护进程：
+Docker模式使用本地替身（fake_docker.py），并通过 NANOMANUS_FAKE_DOCKER_DELAY 模拟响应缓慢的docker守护进程，
+容器检查在后台进行，不应计入time-to-prompt。
+
+指标（毫秒，多次运行取中位数）:
+    interpreter_ms   启动一个空的Python解释器
+    import_ms        导入nanoOpenManus.main（已扣除interpreter_ms）
+    prompt_local_ms  --local模式的time-to-prompt
+    prompt_docker_ms Docker模式的time-to-prompt
+
+用法:
+    python -m nanoOpenManus.benchmarks.bench_startup
+    python -m nanoOpenManus.benchmarks.bench_startup --repeat 10 --docker-delay 2 --target-ms 300   # 超过目标时退出码为1
+"""
+import argparse
+import os
+import shlex
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from nanoOpenManus.benchmarks import fake_docker
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PROMPT = "请输入您的请求".encode("utf-8")
+
+
+def _env(extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    return dict(os.environ, PYTHONPATH=_PROJECT_ROOT, **(extra or {}))
+
+
+def time_command(args: List[str]) -> float:
+    """运行一个Python命令直到退出，返回耗时（秒）"""
+    started = time.perf_counter()
+    subprocess.run([sys.executable, *args], cwd=_PROJECT_ROOT, env=_env(), check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+
+def time_to_prompt(args: List[str], env: Optional[Dict[str, str]] = None, timeout: float = 60) -> float:
+    """启动main.py，返回直到输出中出现输入提示的时间（秒），之后输入exit退出"""
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "nanoOpenManus.main", *args],
+        cwd=_PROJECT_ROOT, env=_env(env),
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+    )
+    output = b""
+    try:
+        while PROMPT not in output:
+            chunk = process.stdout.read1(65536)
+            if not chunk:
+                raise RuntimeError(f"main.py在显示输入提示前退出:\n{output.decode('utf-8', 'replace')}")
+            output += chunk
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError("等待输入提示超时")
+        elapsed = time.perf_counter() - started
+        process.stdin.write(b"exit\n")
+        process.stdin.close()
+        process.wait(timeout=timeout)
+        return elapsed
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+def run_benchmarks(repeat: int, docker_delay: float) -> Dict[str, float]:
+    agent_args = ["--api-key", "mock", "--base-url", "http://127.0.0.1:9"]
+    with tempfile.TemporaryDirectory(prefix="nanomanus-startup-") as root:
+        docker_env = {
+            "NANOMANUS_DOCKER_BIN": f"{shlex.quote(sys.executable)} {shlex.quote(fake_docker.__file__)}",
+            "NANOMANUS_FAKE_DOCKER_ROOT": root,
+            "NANOMANUS_FAKE_DOCKER_DELAY": str(docker_delay),
+        }
+        # 预热：生成字节码缓存、组装替身镜像，避免第一次运行承担一次性开销
+        time_command(["-c", "import nanoOpenManus.main"])
+        time_to_prompt(["--local", *agent_args])
+        samples: Dict[str, List[float]] = {"interpreter_ms": [], "import_ms": [], "prompt_local_ms": [], "prompt_docker_ms": []}
+        for _ in range(repeat):
+            interpreter = time_command(["-c", "pass"])
+            samples["interpreter_ms"].append(interpreter)
+            samples["import_ms"].append(time_command(["-c", "import nanoOpenManus.main"]) - interpreter)
+            samples["prompt_local_ms"].append(time_to_prompt(["--local", *agent_args]))
+            samples["prompt_docker_ms"].append(time_to_prompt(agent_args, docker_env))
+    return {key: round(statistics.median(values) * 1000, 1) for key, values in samples.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动时间基准（time-to-prompt）")
+    parser.add_argument("--repeat", type=int, default=5, help="每项测量的次数，结果取中位数 (默认: 5)")
+    parser.add_argument("--docker-delay", type=float, default=1.0,
+                        help="Docker模式下每条docker命令的模拟耗时（秒） (默认: 1.0)")
+    parser.add_argument("--target-ms", type=float, default=300.0,
+                        help="time-to-prompt的目标（毫秒），任一模式超过时退出码为1 (默认: 300)")
+    args = parser.parse_args()
+
+    print(f"🏁 测量启动时间（每项 {args.repeat} 次，模拟docker命令耗时 {args.docker_delay}秒）")
+    results = run_benchmarks(args.repeat, args.docker_delay)
+    for key, value in results.items():
+        print(f"  {key:<18} {value:>8.1f}ms")
+
+    slow = {key: value for key, value in results.items() if key.startswith("prompt_") and value > args.target_ms}
+    if slow:
+        print(f"\n❌ time-to-prompt超过目标 {args.target_ms:.0f}ms: " + ", ".join(f"{k}={v}ms" for k, v in slow.items()))
+        sys.exit(1)
+    print(f"\n✅ time-to-prompt在目标 {args.target_ms:.0f}ms 以内")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+docker命令行的本地替身
+
+只实现代理用到的几条命令（ps、start、run、exec、rm），"容器"是本地目录，exec直接在本机启动进程：
+    <根目录>/image/                 按Dockerfile组装的镜像内容（docker/nanoOpenManus + safe_tools）
+    <根目录>/containers/<名称>/      每个容器的工作区，对应容器内的 /workspace_in_container
+
+没有任何隔离，只用于在没有Docker守护进程的机器上测量代理和沙箱协议本身的开销。
+
+用法:
+    NANOMANUS_DOCKER_BIN="python -m nanoOpenManus.benchmarks.fake_docker" python -m nanoOpenManus.main
+
+根目录默认为系统临时目录下的 nanomanus-fake-docker，可用环境变量 NANOMANUS_FAKE_DOCKER_ROOT 指定；
+docker/ 下的源文件修改后，镜像目录会在下一次命令时自动重新组装。
+环境变量 NANOMANUS_FAKE_DOCKER_DELAY 设置ps、start、run、rm命令的额外耗时（秒），模拟响应缓慢的docker守护进程。
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from typing import List
+
+CONTAINER_WORKSPACE = "/workspace_in_container"
+_DOCKER_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "docker")
+
+
+def root_dir() -> str:
+    return os.environ.get("NANOMANUS_FAKE_DOCKER_ROOT") or os.path.join(tempfile.gettempdir(), "nanomanus-fake-docker")
+
+
+def workspace_dir(name: str) -> str:
+    return os.path.join(root_dir(), "containers", name)
+
+
+def _source_stamp() -> str:
+    """镜像源文件的最新修改时间，用于判断镜像目录是否需要重新组装"""
+    latest = 0.0
+    for base in ("nanoOpenManus", "safe_tools"):
+        for directory, _, files in os.walk(os.path.join(_DOCKER_DIR, base)):
+            for name in files:
+                if name.endswith(".py"):
+                    latest = max(latest, os.path.getmtime(os.path.join(directory, name)))
+    return repr(latest)
+
+
+def ensure_image() -> str:
+    """按Dockerfile的COPY步骤组装镜像目录，返回其路径（相当于容器内的APP_HOME）"""
+    image = os.path.join(root_dir(), "image")
+    stamp = _source_stamp()
+    try:
+        with open(os.path.join(image, ".stamp"), "r") as f:
+            if f.read() == stamp:
+                return image
+    except OSError:
+        pass
+    # 先在临时目录中组装再整体替换，多个命令同时组装时不会看到一半的镜像
+    os.makedirs(root_dir(), exist_ok=True)
+    staging = tempfile.mkdtemp(prefix="image-", dir=root_dir())
+    package = os.path.join(staging, "nanoOpenManus")
+    shutil.copytree(os.path.join(_DOCKER_DIR, "nanoOpenManus"), package,
+                    ignore=shutil.ignore_patterns("__pycache__"))
+    for name in ("file_saver.py", "python_execute.py"):
+        shutil.copy(os.path.join(_DOCKER_DIR, "safe_tools", name), os.path.join(package, "app", "tools", name))
+    with open(os.path.join(staging, ".stamp"), "w") as f:
+        f.write(stamp)
+    old = image + f".old-{uuid.uuid4().hex[:8]}"
+    try:
+        os.rename(image, old)
+    except OSError:
+        old = None
+    try:
+        os.rename(staging, image)
+    except OSError:
+        shutil.rmtree(staging, ignore_errors=True)  # 另一个命令已经组装好了
+    if old:
+        shutil.rmtree(old, ignore_errors=True)
+    return image
+
+
+def _option_value(args: List[str], name: str) -> str:
+    for i, arg in enumerate(args[:-1]):
+        if arg == name:
+            return args[i + 1]
+    return ""
+
+
+def main(argv: List[str]) -> int:
+    if not argv:
+        print("用法: fake_docker <ps|start|run|exec|rm> ...", file=sys.stderr)
+        return 1
+    command, args = argv[0], argv[1:]
+    if command in ("ps", "start", "run", "rm"):
+        time.sleep(float(os.environ.get("NANOMANUS_FAKE_DOCKER_DELAY") or 0))
+
+    if command == "ps":
+        # 只支持代理使用的 `ps -a --filter name=<名称> --format {{.Status}}`
+        name = _option_value(args, "--filter").partition("name=")[2]
+        if name and os.path.isdir(workspace_dir(name)):
+            print("Up 1 second")
+        return 0
+
+    if command == "start":
+        for name in args:
+            os.makedirs(workspace_dir(name), exist_ok=True)
+        return 0
+
+    if command == "run":
+        name = _option_value(args, "--name") or f"fake-{uuid.uuid4().hex[:12]}"
+        ensure_image()
+        os.makedirs(workspace_dir(name), exist_ok=True)
+        print(uuid.uuid4().hex)
+        return 0
+
+    if command == "rm":
+        for name in (arg for arg in args if not arg.startswith("-")):
+            shutil.rmtree(workspace_dir(name), ignore_errors=True)
+        return 0
+
+    if command == "exec":
+        while args and args[0].startswith("-"):
+            args = args[1:]  # -i / -t 等选项：本地进程直接继承stdin/stdout
+        if len(args) < 2:
+            print("用法: fake_docker exec [-i] <容器> <命令> ...", file=sys.stderr)
+            return 1
+        name, cmd = args[0], args[1:]
+        workspace = workspace_dir(name)
+        if not os.path.isdir(workspace):
+            print(f"Error: No such container: {name}", file=sys.stderr)
+            return 1
+        image = ensure_image()
+        cmd = [arg.replace(CONTAINER_WORKSPACE, workspace) for arg in cmd]
+        if cmd[0] in ("python", "python3"):
+            cmd[0] = sys.executable
+        env = dict(os.environ, PYTHONPATH=image, ALLOWED_WRITE_DIR=workspace)
+        os.chdir(image)  # 与镜像的WORKDIR一致
+        # 用exec替换当前进程，调用方持有的管道直接连到工具进程
+        os.execvpe(cmd[0], cmd, env)
+
+    print(f"fake_docker: 不支持的命令: {command}", file=sys.stderr)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
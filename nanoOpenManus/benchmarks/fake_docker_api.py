@@ -0,0 +1,247 @@
+"""
+Docker Engine API的本地替身
+
+在unix socket上实现客户端（app/docker_api.py）用到的接口，"容器"与 fake_docker.py 相同是本地目录，
+exec直接在本机启动进程，输出按Engine API的多路复用格式写回升级后的连接：
+    GET    /_ping
+    GET    /containers/<名称>/json          POST /containers/create?name=<名称>
+    POST   /containers/<名称>/start         DELETE /containers/<名称>
+    POST   /containers/<名称>/exec          POST /exec/<id>/start（Upgrade: tcp）
+    GET    /exec/<id>/json
+
+没有任何隔离，只用于在没有Docker守护进程的机器上测试Engine API客户端、测量其开销。
+
+用法:
+    python -m nanoOpenManus.benchmarks.fake_docker_api --socket /tmp/nanomanus-docker.sock
+    NANOMANUS_DOCKER_API=/tmp/nanomanus-docker.sock python -m nanoOpenManus.main
+
+目录结构和环境变量 NANOMANUS_FAKE_DOCKER_ROOT、NANOMANUS_FAKE_DOCKER_DELAY 与 fake_docker.py 相同，
+两者可以同时使用（例如docker-compose仍通过命令行替身启动）。
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import struct
+import sys
+import uuid
+from typing import Dict, Optional
+from urllib.parse import parse_qs, unquote
+
+from nanoOpenManus.benchmarks.fake_docker import CONTAINER_WORKSPACE, ensure_image, workspace_dir
+
+
+class FakeDockerAPIServer:
+    """在当前事件循环中运行的Engine API替身"""
+
+    def __init__(self, socket_path: str, delay: Optional[float] = None):
+        """
+        Args:
+            socket_path: 监听的unix socket路径
+            delay: 容器查询、创建、启动、删除的额外耗时（秒），默认读取 NANOMANUS_FAKE_DOCKER_DELAY
+        """
+        self.socket_path = socket_path
+        self.delay = float(os.environ.get("NANOMANUS_FAKE_DOCKER_DELAY") or 0) if delay is None else delay
+        self.requests = 0
+        self.execs: Dict[str, Dict] = {}
+        self._handlers: set = set()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = await asyncio.start_unix_server(self.handle_connection, self.socket_path)
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        processes = [record["process"] for record in self.execs.values()
+                     if record["process"] is not None and record["process"].returncode is None]
+        for process in processes:
+            process.kill()
+        await asyncio.gather(*(process.wait() for process in processes))
+        handlers, self._handlers = self._handlers, set()
+        for task in handlers:
+            task.cancel()
+        await asyncio.gather(*handlers, return_exceptions=True)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """处理一个连接上的多个请求；exec启动后该连接被接管，直到exec结束"""
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split()
+                length = 0
+                while True:
+                    line = (await reader.readuntil(b"\r\n")).decode("latin-1")
+                    if line == "\r\n":
+                        break
+                    name, _, value = line.partition(":")
+                    if name.strip().lower() == "content-length":
+                        length = int(value.strip())
+                body = json.loads(await reader.readexactly(length)) if length else {}
+                path, _, query = target.partition("?")
+                parts = [unquote(p) for p in path.strip("/").split("/")][1:]  # 去掉版本前缀
+                params = {key: values[-1] for key, values in parse_qs(query).items()}
+                self.requests += 1
+                if method == "POST" and len(parts) == 3 and parts[0] == "exec" and parts[2] == "start":
+                    await self._exec_start(parts[1], reader, writer)
+                    return
+                status, payload = await self._handle(method, parts, params, body)
+                _write_json(writer, status, payload)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError, asyncio.CancelledError):
+            pass
+        finally:
+            self._handlers.discard(task)
+            writer.close()
+
+    async def _handle(self, method: str, parts, params: Dict, body: Dict):
+        if parts == ["_ping"]:
+            return 200, "OK"
+        if parts[:1] == ["containers"]:
+            if parts[1:] == ["create"] and method == "POST":
+                await asyncio.sleep(self.delay)
+                name = params.get("name") or f"fake-{uuid.uuid4().hex[:12]}"
+                if os.path.isdir(workspace_dir(name)):
+                    return 409, {"message": f"Conflict. The container name \"/{name}\" is already in use"}
+                await asyncio.get_running_loop().run_in_executor(None, ensure_image)
+                os.makedirs(workspace_dir(name), exist_ok=True)
+                return 201, {"Id": uuid.uuid4().hex, "Warnings": []}
+            if len(parts) < 2:
+                return 404, {"message": "page not found"}
+            name = parts[1]
+            exists = os.path.isdir(workspace_dir(name))
+            action = parts[2] if len(parts) > 2 else ""
+            if method == "GET" and action == "json":
+                await asyncio.sleep(self.delay)
+                if not exists:
+                    return 404, {"message": f"No such container: {name}"}
+                return 200, {"Id": name, "Name": f"/{name}", "State": {"Status": "running", "Running": True}}
+            if method == "POST" and action == "start":
+                await asyncio.sleep(self.delay)
+                os.makedirs(workspace_dir(name), exist_ok=True)
+                return 204, None
+            if method == "DELETE" and not action:
+                await asyncio.sleep(self.delay)
+                if not exists:
+                    return 404, {"message": f"No such container: {name}"}
+                shutil.rmtree(workspace_dir(name), ignore_errors=True)
+                return 204, None
+            if method == "POST" and action == "exec":
+                if not exists:
+                    return 404, {"message": f"No such container: {name}"}
+                exec_id = uuid.uuid4().hex
+                self.execs[exec_id] = {"container": name, "cmd": body.get("Cmd") or [],
+                                       "process": None, "exit_code": None}
+                return 201, {"Id": exec_id}
+        if parts[:1] == ["exec"] and len(parts) == 3 and parts[2] == "json" and method == "GET":
+            record = self.execs.get(parts[1])
+            if record is None:
+                return 404, {"message": f"No such exec instance: {parts[1]}"}
+            process = record["process"]
+            running = process is not None and process.returncode is None
+            return 200, {"ID": parts[1], "Running": running, "ExitCode": record["exit_code"],
+                         "Pid": process.pid if process is not None else 0}
+        return 404, {"message": "page not found"}
+
+    async def _exec_start(self, exec_id: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """启动exec对应的本地进程，在接管的连接上转发stdin和多路复用的stdout/stderr"""
+        record = self.execs.get(exec_id)
+        if record is None:
+            _write_json(writer, 404, {"message": f"No such exec instance: {exec_id}"})
+            await writer.drain()
+            return
+        workspace = workspace_dir(record["container"])
+        image = ensure_image()
+        cmd = [arg.replace(CONTAINER_WORKSPACE, workspace) for arg in record["cmd"]]
+        if cmd and cmd[0] in ("python", "python3"):
+            cmd[0] = sys.executable
+        env = dict(os.environ, PYTHONPATH=image, ALLOWED_WRITE_DIR=workspace)
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd, cwd=image, env=env,
+                stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+            )
+        except OSError as e:
+            _write_json(writer, 400, {"message": f"exec failed: {e}"})
+            await writer.drain()
+            return
+        record["process"] = process
+        writer.write(
+            b"HTTP/1.1 101 UPGRADED\r\n"
+            b"Content-Type: application/vnd.docker.multiplexed-stream\r\n"
+            b"Connection: Upgrade\r\n"
+            b"Upgrade: tcp\r\n\r\n"
+        )
+        await writer.drain()
+
+        async def forward_stdin():
+            # 连接的写方向关闭（或断开）即进程的stdin结束；进程本身不受连接断开影响，与docker一致
+            try:
+                while True:
+                    data = await reader.read(65536)
+                    if not data:
+                        break
+                    process.stdin.write(data)
+                    await process.stdin.drain()
+            except (ConnectionError, OSError):
+                pass
+            finally:
+                process.stdin.close()
+
+        async def forward_output(stream: asyncio.StreamReader, kind: int):
+            while True:
+                data = await stream.read(65536)
+                if not data:
+                    break
+                try:
+                    writer.write(struct.pack(">BxxxI", kind, len(data)) + data)
+                    await writer.drain()
+                except (ConnectionError, OSError):
+                    pass  # 客户端已断开，继续读完输出以免进程阻塞
+
+        stdin_task = asyncio.ensure_future(forward_stdin())
+        await asyncio.gather(forward_output(process.stdout, 1), forward_output(process.stderr, 2))
+        record["exit_code"] = await process.wait()
+        stdin_task.cancel()
+
+
+def _write_json(writer: asyncio.StreamWriter, status: int, payload) -> None:
+    body = b"" if payload is None else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    writer.write(
+        f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='NanoOpenManus - Docker Engine API替身')
+    parser.add_argument('--socket', default=os.path.join("/tmp", "nanomanus-fake-docker.sock"),
+                        help='监听的unix socket路径 (默认: /tmp/nanomanus-fake-docker.sock)')
+    args = parser.parse_args()
+
+    server = FakeDockerAPIServer(args.socket)
+    await server.start()
+    print(f"🚀 模拟Docker Engine API已启动: {args.socket}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
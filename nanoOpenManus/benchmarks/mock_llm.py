@@ -0,0 +1,211 @@
+"""
+OpenAI兼容的本地模拟LLM服务
+
+实现LLM使用的 POST /chat/completions（含tool_calls和SSE流式响应），不需要API密钥，
+响应内容由脚本决定，用于在本地测量代理框架自身的开销。
+
+默认脚本: 会话的第一条用户消息如果是一个JSON对象，则按其描述的行为响应:
+    {
+        "steps": 3,                              # 前几轮返回工具调用
+        "tool": "python_execute",                # 调用的工具
+        "arguments": {"code": "print(1)"},       # 工具参数
+        "pad": {"key": "content", "bytes": 1024}, # 可选，把参数中的某个字段填充到指定字节数
+        "parallel": 1,                           # 每轮返回几个调用
+        "final": "完成"                          # 最后一轮的回复内容
+    }
+轮次由请求中已有的助手消息数决定，服务本身没有会话状态，同一个服务可以同时服务任意多个会话。
+第一条用户消息不是JSON时直接回显。也可以在代码中传入script函数完全自定义响应。
+
+用法:
+    python -m nanoOpenManus.benchmarks.mock_llm --port 8000 --latency 0.2
+    python -m nanoOpenManus.main --local --base-url http://127.0.0.1:8000 --api-key mock
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Callable, Dict, List, Optional
+
+MAX_BODY_SIZE = 512 * 1024 * 1024  # 长历史中可能包含多个10MB的工具参数
+
+
+def default_script(request: Dict) -> Dict:
+    """根据第一条用户消息中的JSON描述返回本轮的助手消息"""
+    messages = request.get("messages") or []
+    prompt = next((m.get("content") for m in messages if m.get("role") == "user"), "") or ""
+    try:
+        spec = json.loads(prompt)
+    except ValueError:
+        spec = None
+    if not isinstance(spec, dict):
+        return {"role": "assistant", "content": f"收到: {prompt[:200]}"}
+
+    step = sum(1 for m in messages if m.get("role") == "assistant")
+    if step >= spec.get("steps", 1):
+        return {"role": "assistant", "content": spec.get("final", "完成")}
+
+    arguments = dict(spec.get("arguments") or {})
+    pad = spec.get("pad")
+    if pad:
+        arguments[pad["key"]] = "x" * pad["bytes"]
+    tool_calls = [
+        {
+            "id": f"call_{step}_{i}",
+            "type": "function",
+            "function": {"name": spec.get("tool", "python_execute"), "arguments": json.dumps(arguments, ensure_ascii=False)},
+        }
+        for i in range(spec.get("parallel", 1))
+    ]
+    return {"role": "assistant", "content": None, "tool_calls": tool_calls}
+
+
+class MockLLMServer:
+    """在当前事件循环中运行的模拟chat completions服务，支持HTTP/1.1长连接"""
+
+    def __init__(self, script: Optional[Callable[[Dict], Dict]] = None, latency: float = 0.0):
+        """
+        Args:
+            script: 根据请求体（已解析的JSON）返回助手消息的函数，默认为default_script
+            latency: 每次响应前等待的秒数，模拟模型的生成时间
+        """
+        self.script = script or default_script
+        self.latency = latency
+        self.host = "127.0.0.1"
+        self.port = 0
+        self.requests = 0
+        self.request_bytes = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        """开始监听；port为0时由系统分配端口，实际端口见self.port"""
+        self._server = await asyncio.start_server(self.handle_connection, host, port)
+        self.host = host
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """处理一个连接上的多个请求，直到客户端关闭连接"""
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, path, body = request
+                if method == "POST" and path.endswith("/chat/completions"):
+                    await self._complete(json.loads(body), writer)
+                elif method == "GET" and path == "/health":
+                    _write_json(writer, 200, {"ok": True, "requests": self.requests})
+                else:
+                    _write_json(writer, 404, {"error": {"message": f"未知路径: {path}"}})
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _complete(self, request: Dict, writer: asyncio.StreamWriter) -> None:
+        self.requests += 1
+        message = self.script(request)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        prompt_tokens = sum(len(str(m.get("content") or "")) for m in request.get("messages") or []) // 4
+        completion_tokens = (len(message.get("content") or "") + len(json.dumps(message.get("tool_calls") or []))) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        finish_reason = "tool_calls" if message.get("tool_calls") else "stop"
+        if not request.get("stream"):
+            _write_json(writer, 200, {
+                "id": f"mock-{self.requests}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model"),
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": usage,
+            })
+            return
+
+        # 流式响应：内容和每个工具调用各作为一个数据块，最后一个数据块带finish_reason和用量
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Transfer-Encoding: chunked\r\n"
+            b"Connection: keep-alive\r\n\r\n"
+        )
+        deltas: List[Dict] = []
+        if message.get("content"):
+            deltas.append({"role": "assistant", "content": message["content"]})
+        for index, tool_call in enumerate(message.get("tool_calls") or []):
+            deltas.append({"tool_calls": [{**tool_call, "index": index}]})
+        for delta in deltas:
+            _write_chunk(writer, {"choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+            await writer.drain()
+        _write_chunk(writer, {"choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}], "usage": usage})
+        data = b"data: [DONE]\n\n"
+        writer.write(b"%x\r\n%s\r\n0\r\n\r\n" % (len(data), data))
+
+
+async def _read_request(reader: asyncio.StreamReader):
+    """读取一个HTTP/1.1请求，返回(方法, 路径, 请求体)；连接已关闭时返回None"""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, target, _ = request_line.decode("latin-1").split()
+    length = 0
+    while True:
+        line = (await reader.readuntil(b"\r\n")).decode("latin-1")
+        if line == "\r\n":
+            break
+        name, _, value = line.partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value.strip())
+    if length > MAX_BODY_SIZE:
+        raise ValueError("请求体过大")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target.split("?", 1)[0].rstrip("/"), body
+
+
+def _write_json(writer: asyncio.StreamWriter, status: int, payload: Dict) -> None:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    writer.write(
+        f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: keep-alive\r\n\r\n".encode("latin-1") + body
+    )
+
+
+def _write_chunk(writer: asyncio.StreamWriter, event: Dict) -> None:
+    data = f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8")
+    writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='NanoOpenManus - 模拟LLM服务')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址 (默认: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8000, help='监听端口，0表示由系统分配 (默认: 8000)')
+    parser.add_argument('--latency', type=float, default=0.0, help='每次响应前等待的秒数 (默认: 0)')
+    args = parser.parse_args()
+
+    server = MockLLMServer(latency=args.latency)
+    await server.start(args.host, args.port)
+    print(f"🚀 模拟LLM服务已启动: {server.base_url}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -1,5 +1,6 @@
+import json
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 class ToolResult:
     """工具执行结果的简单表示"""
@@ -17,6 +18,15 @@ class ToolResult:
 class BaseTool(ABC):
     """所有工具的基类，定义了工具的基本接口"""
     
+    # 是否允许与同一轮中的其他工具调用并发执行；会改变代理状态的工具（如terminate）应设为False
+    parallel_safe = True
+    
+    # 结果缓存策略，由ToolCollection使用:
+    #   "never"   每次都执行（默认）
+    #   "pure"    结果只取决于cache_key，在工具集合的整个生命周期内有效
+    #   "session" 结果只在一次会话内有效，会话结束（cleanup）时清除
+    cache_policy = "never"
+    
     def __init__(self, name, description, parameters=None):
         self.name = name
         self.description = description
@@ -31,6 +41,43 @@ class BaseTool(ABC):
         """执行工具的具体逻辑，需要子类实现"""
         pass
     
+    def conflict_keys(self, **kwargs) -> List[str]:
+        """
+        返回本次调用会独占的资源键，并发执行时键相同的调用会串行执行
+        
+        Args:
+            **kwargs: 工具参数
+            
+        Returns:
+            List[str]: 资源键列表，默认不独占任何资源
+        """
+        return []
+    
+    def cache_key(self, **kwargs) -> Optional[str]:
+        """
+        返回本次调用的缓存键，键相同的调用返回相同的结果；返回None表示本次调用不缓存
+        
+        ToolCollection在执行前计算一次用于查找，执行后再计算一次用于保存，因此键可以包含执行后的工具状态。
+        
+        Args:
+            **kwargs: 工具参数
+            
+        Returns:
+            Optional[str]: 缓存键，默认为参数的规范JSON编码
+        """
+        try:
+            return json.dumps(kwargs, sort_keys=True, ensure_ascii=False)
+        except (TypeError, ValueError):
+            return None
+    
+    def reads_workspace(self, **kwargs) -> bool:
+        """本次调用的结果是否还取决于工作区中的文件；为True时工作区中的文件有变化后缓存失效"""
+        return False
+    
+    async def cleanup(self) -> None:
+        """释放工具在一次会话中持有的资源（例如Python内核进程），代理每次运行结束时调用"""
+        pass
+    
     def to_param(self) -> Dict:
         """将工具转换为函数调用格式"""
         return {
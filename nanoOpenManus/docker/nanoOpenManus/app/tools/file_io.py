@@ -0,0 +1,106 @@
+"""
+文件写入辅助函数
+
+内容按块编码为UTF-8后写入，几MB的内容不会为了计算大小或写入而整体复制一份；
+覆盖写入先写到同目录下的临时文件，再用os.replace替换目标文件，
+进程中途崩溃或写入出错时目标文件保持原样，不会留下写了一半的文件。
+
+这些函数都是阻塞的，在协程中应通过run_in_executor在线程池中调用。
+
+注意: 本文件是宿主机 app/tools/file_io.py 的副本，两边需保持一致
+"""
+import os
+import stat
+from typing import BinaryIO, Optional, Tuple
+
+CHUNK_CHARS = 1024 * 1024  # 每次编码和写入的字符数
+
+
+def utf8_size(content: str, limit: Optional[int] = None) -> int:
+    """
+    计算内容编码为UTF-8后的字节数
+
+    Args:
+        content: 文本内容
+        limit: 上限；超过上限后不再继续计算，返回值只保证大于limit
+
+    Returns:
+        int: 字节数
+    """
+    if content.isascii():
+        return len(content)
+    if limit is not None and len(content) > limit:
+        return len(content)  # 每个字符至少占1字节
+    size = 0
+    for start in range(0, len(content), CHUNK_CHARS):
+        size += len(content[start:start + CHUNK_CHARS].encode("utf-8"))
+        if limit is not None and size > limit:
+            break
+    return size
+
+
+def write_text(path: str, content: str, mode: str = "w") -> int:
+    """
+    以UTF-8写入文本文件
+
+    Args:
+        path: 目标文件路径，所在目录不存在时会被创建
+        content: 文本内容
+        mode: "w"为原子地覆盖写入，"a"为追加到文件末尾
+
+    Returns:
+        int: 写入的字节数
+    """
+    if mode not in ("w", "a"):
+        raise ValueError(f"不支持的写入模式: {mode}")
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if mode == "a":
+        with open(path, "ab") as file:
+            return _write_chunks(file, content)
+
+    fd, temp_path = _create_temp(path)
+    try:
+        with os.fdopen(fd, "wb") as file:
+            written = _write_chunks(file, content)
+        _copy_mode(path, temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    return written
+
+
+def _write_chunks(file: BinaryIO, content: str) -> int:
+    written = 0
+    for start in range(0, len(content), CHUNK_CHARS):
+        written += file.write(content[start:start + CHUNK_CHARS].encode("utf-8"))
+    return written
+
+
+def _create_temp(path: str) -> Tuple[int, str]:
+    """
+    在目标文件所在目录新建临时文件
+
+    与open()一样以0o666创建，由内核应用umask，得到的权限与直接新建目标文件相同
+    """
+    prefix = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.")
+    while True:
+        temp_path = f"{prefix}{os.urandom(4).hex()}.tmp"
+        try:
+            return os.open(temp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666), temp_path
+        except FileExistsError:
+            continue
+
+
+def _copy_mode(path: str, temp_path: str) -> None:
+    """覆盖已有文件时沿用其权限"""
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except OSError:
+        return
+    os.chmod(temp_path, mode)
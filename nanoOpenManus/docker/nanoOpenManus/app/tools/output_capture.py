@@ -0,0 +1,101 @@
+"""
+有上限的输出捕获
+
+代码可能在循环中打印出几百MB的内容。BoundedOutput只在内存中保留开头和结尾各一段，
+超出上限时把完整输出写入工作目录下的文件，返回给LLM的文本中注明省略了多少字节以及完整输出的位置，
+因此无论代码打印多少内容，内存占用都保持不变。
+
+注意: 本文件是宿主机 app/tools/output_capture.py 的副本，两边需保持一致
+"""
+import io
+import os
+import tempfile
+from typing import Optional
+
+# 内存中保留的输出字节数（开头和结尾各一半），可用环境变量 TOOL_OUTPUT_LIMIT 调整
+DEFAULT_LIMIT = int(os.environ.get("TOOL_OUTPUT_LIMIT", 16 * 1024))
+
+
+class BoundedOutput(io.TextIOBase):
+    """可替换sys.stdout/sys.stderr的文本流，只在内存中保留开头和结尾"""
+
+    def __init__(self, limit: int = DEFAULT_LIMIT, spill_dir: Optional[str] = None, spill_prefix: str = "output_"):
+        """
+        Args:
+            limit: 内存中保留的字节数，开头和结尾各占一半
+            spill_dir: 超出上限时保存完整输出的目录，None表示直接丢弃中间部分
+            spill_prefix: 完整输出文件名的前缀
+        """
+        super().__init__()
+        self.head_bytes = limit // 2
+        self.tail_bytes = limit - self.head_bytes
+        self.total_bytes = 0
+        self.spill_path: Optional[str] = None
+        self._spill_dir = spill_dir
+        self._spill_prefix = spill_prefix
+        self._spill_file = None
+        self._buffer = bytearray()  # 未超出上限时保存全部输出
+        self._head: Optional[bytes] = None  # 超出上限后固定下来的开头
+        self._tail = bytearray()  # 环形缓冲：最多保留2倍tail_bytes，超过后裁剪，均摊到每次写入是O(1)
+
+    @property
+    def truncated(self) -> bool:
+        return self._head is not None
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        data = text.encode("utf-8", errors="replace")
+        self.total_bytes += len(data)
+        if self._head is None:
+            self._buffer += data
+            if len(self._buffer) > self.head_bytes + self.tail_bytes:
+                self._overflow()
+            return len(text)
+        if self._spill_file is not None:
+            self._spill_file.write(data)
+        self._tail += data
+        if len(self._tail) > 2 * self.tail_bytes:
+            del self._tail[:-self.tail_bytes]
+        return len(text)
+
+    def getvalue(self) -> str:
+        """返回捕获的输出；被截断时中间是省略说明"""
+        if self._head is None:
+            return self._buffer.decode("utf-8", errors="replace")
+        if self._spill_file is not None:
+            self._spill_file.flush()
+        tail = bytes(self._tail[-self.tail_bytes:]) if self.tail_bytes else b""
+        elided = self.total_bytes - len(self._head) - len(tail)
+        if self.spill_path:
+            note = f"\n... [输出过长，已省略中间 {elided} 字节，完整输出（共 {self.total_bytes} 字节）已保存到 {self.spill_path}] ...\n"
+        else:
+            note = f"\n... [输出过长，已省略中间 {elided} 字节] ...\n"
+        # 截断处可能切在多字节字符中间，丢弃不完整的字符
+        return self._head.decode("utf-8", errors="ignore") + note + tail.decode("utf-8", errors="ignore")
+
+    def close(self) -> None:
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+        super().close()
+
+    def _overflow(self) -> None:
+        """第一次超出上限：固定开头，转为环形缓冲，并开始把完整输出写入文件"""
+        buffer, self._buffer = self._buffer, bytearray()
+        self._head = bytes(buffer[:self.head_bytes])
+        self._tail = buffer[self.head_bytes:]
+        if self._spill_dir:
+            try:
+                os.makedirs(self._spill_dir, exist_ok=True)
+                fd, self.spill_path = tempfile.mkstemp(prefix=self._spill_prefix, suffix=".log", dir=self._spill_dir)
+                os.chmod(self.spill_path, 0o644)  # mkstemp默认只有创建者可读，宿主机上需要能查看容器内生成的文件
+                self._spill_file = os.fdopen(fd, "wb")
+                self._spill_file.write(buffer)
+            except OSError:
+                # 无法写入文件（例如磁盘已满）时只保留开头和结尾
+                self.spill_path = None
+                self._spill_file = None
+        if len(self._tail) > self.tail_bytes:
+            del self._tail[:-self.tail_bytes]
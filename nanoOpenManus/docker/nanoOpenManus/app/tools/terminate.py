@@ -4,6 +4,9 @@ from nanoOpenManus.app.tools.base import BaseTool, ToolResult
 class Terminate(BaseTool):
     """终止代理执行的工具"""
     
+    # 终止会改变代理状态，必须等前面的调用完成后单独执行
+    parallel_safe = False
+    
     def __init__(self):
         super().__init__(
             name="terminate",
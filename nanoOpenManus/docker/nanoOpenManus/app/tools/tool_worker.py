@@ -0,0 +1,231 @@
+"""
+容器内常驻的工具worker
+
+宿主机通过一次 `docker exec -i <容器> python -m nanoOpenManus.app.tools.tool_worker`
+启动本进程，之后所有工具调用都以带长度前缀的JSON帧经由stdin/stdout传输，
+每个请求带有id，响应用同一个id回传，因此多个调用可以在同一条管道上并发进行。
+
+请求:  {"id": 1, "op": "call", "tool": "python_execute", "args": {...}, "session": "ab12"}
+       {"id": 2, "op": "close_session", "session": "ab12"}
+       {"id": 3, "op": "ping"}
+       {"id": 4, "op": "cancel", "target": 1}
+       {"id": 5, "op": "snapshot"}
+       {"id": 6, "op": "restore"}
+响应:  {"id": 1, "output": "...", "error": null, "elapsed_ms": 12.5}
+
+call的响应带有工具在worker中实际执行的耗时elapsed_ms，宿主机据此在追踪中区分工具计算和往返开销。
+
+ping的响应带有 "attachments": true，表示worker能读取带附件的帧（见worker_protocol）；
+请求中带有 "binary": true 时，响应中的长字符串也以附件形式回传。
+
+ping的响应带有 "cancel": true，表示支持cancel操作：取消id为target的在途调用，
+python_execute正在执行代码的进程会被杀死，被取消的调用仍会返回一个带错误的响应。
+stdin关闭（宿主机的docker exec客户端退出）时所有在途调用同样被取消。
+
+ping的响应带有 "snapshot": true，表示支持工作区快照（见workspace_snapshot）：snapshot为工作区建立快照，
+restore把工作区还原到快照（没有快照时清空），同时释放所有会话，响应中带有还原的统计（删除的条目数、回收的字节数、耗时）。
+
+带session的调用使用该会话独有的工具实例（python_execute的全局变量在会话内保留），
+宿主机在代理运行结束时发送close_session释放会话；不带session的调用使用无状态的默认工具。
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from nanoOpenManus.app.tools.base import ToolResult
+from nanoOpenManus.app.tools.tool_collection import ToolCollection
+from nanoOpenManus.app.tools.python_execute import PythonExecute, get_pool
+from nanoOpenManus.app.tools.file_saver import FileSaver
+from nanoOpenManus.app.tools.terminate import Terminate
+from nanoOpenManus.app.tools.worker_protocol import encode_message, read_frame
+from nanoOpenManus.app.tools.workspace_snapshot import restore_snapshot, take_snapshot
+
+
+class _Call:
+    """
+    一次在线程池中执行的工具调用
+
+    调用在线程里用asyncio.run执行，取消请求来自主事件循环，
+    因此通过call_soon_threadsafe在调用自己的事件循环中取消其任务。
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+
+    def bind(self) -> None:
+        """在调用的事件循环中调用，记录要取消的任务；取消请求先于执行到达时立即取消"""
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.current_task()
+            if self.cancelled:
+                self._task.cancel()
+
+    def unbind(self) -> None:
+        """调用结束、事件循环关闭之前解除绑定"""
+        with self._lock:
+            self._loop = self._task = None
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            if self._task is not None:
+                self._loop.call_soon_threadsafe(self._task.cancel)
+
+
+class ToolWorker:
+    """在一个进程内复用工具实例，处理来自宿主机的工具调用请求"""
+
+    def __init__(self, max_concurrency: int = 4):
+        self.tools = ToolCollection(PythonExecute(stateful=False), FileSaver(), Terminate())
+        self.sessions: Dict[str, ToolCollection] = {}
+        self.calls: Dict[int, _Call] = {}  # 请求id -> 在途调用
+        # 工具内部可能阻塞，放到线程池中运行以免阻塞请求分发
+        # python_execute在独立的工作进程中执行代码，多个调用可以真正并行，输出互不串扰
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+    def _tools_for(self, session: Optional[str]) -> ToolCollection:
+        """返回会话的工具集合，首次使用时创建"""
+        if session is None:
+            return self.tools
+        tools = self.sessions.get(session)
+        if tools is None:
+            tools = self.sessions[session] = ToolCollection(PythonExecute(), FileSaver(), Terminate())
+        return tools
+
+    def _run_tool(self, tools: ToolCollection, name: str, args: dict, call: _Call) -> dict:
+        """在线程池中同步执行一次工具调用"""
+        async def run():
+            call.bind()
+            try:
+                return await tools.execute(name=name, tool_input=args)
+            finally:
+                call.unbind()
+
+        started = time.perf_counter()
+        try:
+            result = asyncio.run(run())
+        except asyncio.CancelledError:
+            result = "工具调用已取消"
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 3)
+        if not isinstance(result, ToolResult):
+            # ToolCollection在找不到工具或执行异常时返回错误字符串
+            return {"output": None, "error": str(result), "elapsed_ms": elapsed_ms}
+        return {
+            "output": str(result.output) if result.output is not None else None,
+            "error": str(result.error) if result.error is not None else None,
+            "elapsed_ms": elapsed_ms,
+        }
+
+    async def handle(self, request: dict) -> dict:
+        """处理单个请求并返回响应（不含id）"""
+        op = request.get("op", "call")
+        if op == "ping":
+            return {"ok": True, "pid": os.getpid(), "attachments": True, "cancel": True, "snapshot": True}
+        if op == "call":
+            loop = asyncio.get_running_loop()
+            tools = self._tools_for(request.get("session"))
+            call = self.calls[request.get("id")] = _Call()
+            try:
+                return await loop.run_in_executor(
+                    self.executor, self._run_tool, tools, request.get("tool"), request.get("args") or {}, call
+                )
+            finally:
+                self.calls.pop(request.get("id"), None)
+        if op == "cancel":
+            call = self.calls.get(request.get("target"))
+            if call is not None:
+                call.cancel()
+            return {"ok": True, "cancelled": call is not None}
+        if op == "close_session":
+            await self.close_session(request.get("session"))
+            return {"ok": True}
+        if op == "snapshot":
+            stats = await asyncio.get_running_loop().run_in_executor(None, take_snapshot)
+            return {"ok": True, **stats}
+        if op == "restore":
+            # 上一个任务遗留的会话（内核中的变量、导入）与文件一起丢弃
+            for session in list(self.sessions):
+                await self.close_session(session)
+            stats = await asyncio.get_running_loop().run_in_executor(None, restore_snapshot)
+            return {"ok": True, **stats}
+        return {"output": None, "error": f"未知操作: {op}"}
+
+    async def close_session(self, session: Optional[str]) -> None:
+        """释放会话的工具资源（例如python_execute的内核进程）"""
+        tools = self.sessions.pop(session, None)
+        if tools is not None:
+            await tools.cleanup()
+
+    def cancel_all(self) -> None:
+        """取消所有在途调用"""
+        for call in list(self.calls.values()):
+            call.cancel()
+
+    async def close(self) -> None:
+        for session in list(self.sessions):
+            await self.close_session(session)
+
+
+async def serve(worker: ToolWorker) -> None:
+    """主循环：读取请求帧，并发处理，按完成顺序写回响应帧"""
+    loop = asyncio.get_running_loop()
+
+    # 协议独占原始stdout；之后任何print都被重定向到stderr，避免破坏帧流
+    protocol_out = os.fdopen(os.dup(sys.stdout.fileno()), "wb", buffering=0)
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    reader = asyncio.StreamReader(limit=2 ** 20)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, protocol_out)
+    writer = asyncio.StreamWriter(transport, protocol, None, loop)
+    write_lock = asyncio.Lock()
+    in_flight = set()
+
+    async def process(request: dict) -> None:
+        request_id = request.get("id")
+        try:
+            response = await worker.handle(request)
+        except Exception as e:
+            response = {"output": None, "error": f"worker内部错误: {type(e).__name__}: {str(e)}"}
+        response["id"] = request_id
+        chunks = encode_message(response, attachments=bool(request.get("binary")))
+        async with write_lock:
+            writer.writelines(chunks)
+            await writer.drain()
+
+    while True:
+        request = await read_frame(reader)
+        if request is None:
+            break
+        task = asyncio.ensure_future(process(request))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+
+    # stdin关闭表示宿主机不再需要本worker（或宿主机进程已退出），取消在途调用后退出
+    worker.cancel_all()
+    if in_flight:
+        await asyncio.gather(*in_flight, return_exceptions=True)
+    await worker.close()
+    writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="nanoOpenManus 容器内工具worker")
+    parser.add_argument("--concurrency", type=int, default=int(os.environ.get("TOOL_WORKER_CONCURRENCY", "4")),
+                        help="同时执行的工具调用数量上限")
+    args = parser.parse_args()
+    # 在创建任何线程之前建好python_execute的进程池：zygote从单线程的进程fork，并预先fork出工作进程
+    get_pool().start()
+    asyncio.run(serve(ToolWorker(max_concurrency=args.concurrency)))
+
+
+if __name__ == "__main__":
+    main()
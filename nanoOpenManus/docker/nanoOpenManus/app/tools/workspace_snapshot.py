@@ -0,0 +1,208 @@
+"""
+容器工作区的快照与还原
+
+快照把工作区复制到工作区之外的存储目录，并记录每个条目的清单（类型、inode、大小、ctime）；
+还原时只处理与清单不一致的条目：新增或被修改的文件被删除，缺失的文件从存储目录复制回来，
+未改动的文件原样保留。一次运行只改动少量文件时，还原只需要几毫秒，不必重建容器。
+
+存储目录是独立的副本而不是硬链接：硬链接与工作区共用inode，任务原地修改文件时快照也会一起被改掉。
+修改文件会更新ctime（且无法由用户设回），重命名替换会换掉inode，因此清单比较能发现所有改动。
+没有快照时还原为清空工作区。
+
+由tool_worker的snapshot/restore操作调用；worker未运行时宿主机也可以直接执行:
+    python -m nanoOpenManus.app.tools.workspace_snapshot snapshot|restore [--workspace 目录]
+结果以一行JSON输出到stdout。
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import time
+from typing import Dict, Iterator, Optional, Tuple
+
+DEFAULT_WORKSPACE = "/workspace_in_container"
+MANIFEST = "manifest.json"
+
+
+def default_workspace() -> str:
+    return os.environ.get("ALLOWED_WRITE_DIR") or DEFAULT_WORKSPACE
+
+
+def store_dir(workspace: str) -> str:
+    """工作区对应的快照存储目录，位于工作区之外，任务看不到"""
+    digest = hashlib.sha1(os.path.realpath(workspace).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), "nanomanus-snapshots", digest)
+
+
+def _walk(root: str, prefix: str = "") -> Iterator[Tuple[str, os.stat_result]]:
+    """自上而下遍历目录树（不跟随符号链接），返回(相对路径, lstat)"""
+    with os.scandir(os.path.join(root, prefix) if prefix else root) as entries:
+        for entry in sorted(entries, key=lambda e: e.name):
+            rel = os.path.join(prefix, entry.name) if prefix else entry.name
+            st = entry.stat(follow_symlinks=False)
+            yield rel, st
+            if stat.S_ISDIR(st.st_mode):
+                yield from _walk(root, rel)
+
+
+def _describe(path: str, st: os.stat_result) -> Optional[Dict]:
+    """清单中的一个条目；不支持的类型（设备、管道等）返回None"""
+    if stat.S_ISDIR(st.st_mode):
+        return {"type": "dir"}
+    if stat.S_ISLNK(st.st_mode):
+        return {"type": "link", "target": os.readlink(path), "ino": st.st_ino, "ctime_ns": st.st_ctime_ns}
+    if stat.S_ISREG(st.st_mode):
+        return {"type": "file", "size": st.st_size, "ino": st.st_ino, "ctime_ns": st.st_ctime_ns}
+    return None
+
+
+def _unchanged(expected: Dict, path: str, st: os.stat_result) -> bool:
+    current = _describe(path, st)
+    return current is not None and current == expected
+
+
+def _load_manifest(store: str) -> Dict[str, Dict]:
+    try:
+        with open(os.path.join(store, MANIFEST), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_manifest(store: str, manifest: Dict[str, Dict]) -> None:
+    path = os.path.join(store, MANIFEST)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(path + ".tmp", path)
+
+
+def _tree_size(path: str) -> Tuple[int, int]:
+    """目录树中的(条目数, 文件字节数)"""
+    count, size = 1, 0
+    for _, st in _walk(path):
+        count += 1
+        if stat.S_ISREG(st.st_mode):
+            size += st.st_size
+    return count, size
+
+
+def take_snapshot(workspace: Optional[str] = None, store: Optional[str] = None) -> Dict:
+    """
+    为工作区建立快照，替换已有的快照
+
+    Args:
+        workspace: 工作区目录，默认为ALLOWED_WRITE_DIR
+        store: 快照存储目录，默认按工作区路径确定
+
+    Returns:
+        Dict: {"files": 文件数, "bytes": 文件字节数, "elapsed_ms": 耗时}
+    """
+    started = time.perf_counter()
+    workspace = workspace or default_workspace()
+    store = store or store_dir(workspace)
+    # 先在临时目录中建好再整体替换，快照过程中失败时旧快照仍然可用
+    staging = store + ".new"
+    shutil.rmtree(staging, ignore_errors=True)
+    files_dir = os.path.join(staging, "files")
+    os.makedirs(files_dir)
+    manifest: Dict[str, Dict] = {}
+    files = size = 0
+    for rel, st in _walk(workspace):
+        src, dst = os.path.join(workspace, rel), os.path.join(files_dir, rel)
+        entry = _describe(src, st)
+        if entry is None:
+            continue
+        if entry["type"] == "dir":
+            os.makedirs(dst, exist_ok=True)
+        elif entry["type"] == "link":
+            os.symlink(entry["target"], dst)
+        else:
+            shutil.copy2(src, dst)
+            files += 1
+            size += st.st_size
+        manifest[rel] = entry
+    _write_manifest(staging, manifest)
+    shutil.rmtree(store, ignore_errors=True)
+    os.rename(staging, store)
+    return {"files": files, "bytes": size, "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)}
+
+
+def restore_snapshot(workspace: Optional[str] = None, store: Optional[str] = None) -> Dict:
+    """
+    把工作区还原到快照时的状态；没有快照时清空工作区
+
+    Args:
+        workspace: 工作区目录，默认为ALLOWED_WRITE_DIR
+        store: 快照存储目录，默认按工作区路径确定
+
+    Returns:
+        Dict: {"removed": 删除的条目数, "restored": 复制回来的条目数, "kept": 保留的文件数,
+               "reclaimed_bytes": 删除的文件字节数, "elapsed_ms": 耗时}
+    """
+    started = time.perf_counter()
+    workspace = workspace or default_workspace()
+    store = store or store_dir(workspace)
+    manifest = _load_manifest(store)
+    result = {"removed": 0, "restored": 0, "kept": 0, "reclaimed_bytes": 0}
+
+    def prune(prefix: str) -> None:
+        with os.scandir(os.path.join(workspace, prefix) if prefix else workspace) as entries:
+            entries = list(entries)
+        for entry in entries:
+            rel = os.path.join(prefix, entry.name) if prefix else entry.name
+            st = entry.stat(follow_symlinks=False)
+            expected = manifest.get(rel)
+            if stat.S_ISDIR(st.st_mode):
+                if expected is not None and expected["type"] == "dir":
+                    prune(rel)
+                    continue
+                count, size = _tree_size(entry.path)
+                shutil.rmtree(entry.path)
+                result["removed"] += count
+                result["reclaimed_bytes"] += size
+            elif expected is not None and _unchanged(expected, entry.path, st):
+                result["kept"] += 1
+            else:
+                os.unlink(entry.path)
+                result["removed"] += 1
+                if stat.S_ISREG(st.st_mode):
+                    result["reclaimed_bytes"] += st.st_size
+
+    prune("")
+    # 清单按自上而下的顺序记录，父目录总在其内容之前被恢复
+    files_dir = os.path.join(store, "files")
+    for rel, expected in manifest.items():
+        path = os.path.join(workspace, rel)
+        if os.path.lexists(path):
+            continue
+        if expected["type"] == "dir":
+            os.makedirs(path, exist_ok=True)
+            continue
+        if expected["type"] == "link":
+            os.symlink(expected["target"], path)
+        else:
+            shutil.copy2(os.path.join(files_dir, rel), path)
+        # 复制回来的文件有新的inode和ctime，更新清单以便下次比较
+        manifest[rel] = _describe(path, os.lstat(path))
+        result["restored"] += 1
+    if result["restored"]:
+        _write_manifest(store, manifest)
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="nanoOpenManus 工作区快照与还原")
+    parser.add_argument("action", choices=["snapshot", "restore"])
+    parser.add_argument("--workspace", default=None, help="工作区目录 (默认: ALLOWED_WRITE_DIR)")
+    args = parser.parse_args()
+    action = take_snapshot if args.action == "snapshot" else restore_snapshot
+    print(json.dumps(action(args.workspace)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
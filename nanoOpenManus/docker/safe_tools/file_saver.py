@@ -1,7 +1,9 @@
+import asyncio
 import os
 from pathlib import Path
 # from app.tools.base import BaseTool, ToolResult # Old import
 from nanoOpenManus.app.tools.base import BaseTool, ToolResult # Changed back to absolute for docker exec context
+from nanoOpenManus.app.tools.file_io import utf8_size, write_text
 # Note: We are defining the class as FileSaver directly to replace the original.
 # The original FileSaver class definition is assumed to be in a different file
 # or will be effectively overridden by this one in the Docker image.
@@ -11,7 +13,7 @@ class FileSaver(BaseTool): # Changed from SecureFileSaver(FileSaver) to FileSave
     此类将直接作为 app.tools.file_saver.FileSaver 使用。
     """
     _name = "file_saver"
-    _description = "将内容保存到运行环境的指定工作区内的文件中。"
+    _description = "将内容保存到运行环境的指定工作区内的文件中。需要保存多个文件时，使用files参数在一次调用中全部保存。"
     _parameters = [
         {
             "name": "content",
@@ -28,19 +30,59 @@ class FileSaver(BaseTool): # Changed from SecureFileSaver(FileSaver) to FileSave
             "type": "string",
             "description": "文件打开模式，默认为 'w' (写入，覆盖)。可以是 'a' (追加)。",
             "optional": True
+        },
+        {
+            "name": "files",
+            "type": "array",
+            "description": "批量保存多个文件，每项包含 file_path、content 和可选的 mode；提供此参数时忽略 content 和 file_path。",
+            "optional": True
         }
     ]
+    MAX_FILE_BYTES = 10 * 1024 * 1024 # 10MB limit on byte length, per file
 
     def __init__(self):
         super().__init__(name=self._name, description=self._description, parameters=self._parameters)
 
-    async def execute(self, content: str, file_path: str, mode: str = "w") -> ToolResult:
+    async def execute(self, content: str = None, file_path: str = None, mode: str = "w", files: list = None) -> ToolResult:
+        # File I/O runs in a thread so a large write never stalls the worker's event loop
+        loop = asyncio.get_running_loop()
+        if files is None:
+            if content is None or not file_path:
+                return ToolResult(error="保存文件时出错: 需要提供 content 和 file_path，或使用 files 批量保存")
+            error = await loop.run_in_executor(None, self._save, content, file_path, mode)
+            if error:
+                return ToolResult(error=error)
+            return ToolResult(output=f"内容已成功保存到 {file_path} (在允许的工作区内)")
+
+        if not isinstance(files, list) or not files:
+            return ToolResult(error="保存文件时出错: files 必须是非空列表")
+        results = await loop.run_in_executor(None, self._save_all, files, mode)
+        saved = [path for path, error in results if error is None]
+        failed = [f"- {error}" for path, error in results if error is not None]
+        lines = [f"已成功保存 {len(saved)} 个文件 (在允许的工作区内):"] + [f"- {path}" for path in saved]
+        if not failed:
+            return ToolResult(output="\n".join(lines))
+        return ToolResult(error="\n".join([f"{len(failed)} 个文件保存失败:"] + failed + lines))
+
+    def _save_all(self, files, default_mode):
+        """Writes the files in order; one failure does not stop the rest."""
+        results = []
+        for index, item in enumerate(files):
+            if not isinstance(item, dict) or not isinstance(item.get("file_path"), str) or not isinstance(item.get("content"), str):
+                results.append((f"files[{index}]", f"files[{index}]: 需要提供字符串类型的 file_path 和 content"))
+                continue
+            path = item["file_path"]
+            results.append((path, self._save(item["content"], path, item.get("mode") or default_mode)))
+        return results
+
+    def _save(self, content: str, file_path: str, mode: str):
+        """Validates the path and size, then writes the file. Returns an error message, or None on success."""
         allowed_dir = os.environ.get("ALLOWED_WRITE_DIR", "/workspace")
         # print(f"[FileSaver-Secure] ALLOWED_WRITE_DIR: {allowed_dir}")
 
         # 确保 file_path 是相对路径，并且不包含向上遍历的组件
         if os.path.isabs(file_path) or ".." in file_path.split(os.sep):
-            return ToolResult(error=f"安全错误: file_path 必须是相对路径且不包含 '..'. 输入: '{file_path}'")
+            return f"安全错误: file_path 必须是相对路径且不包含 '..'. 输入: '{file_path}'"
 
         # 规范化路径，并与允许的目录连接
         # allowed_dir 应该是绝对路径且已规范化
@@ -57,23 +99,22 @@ class FileSaver(BaseTool): # Changed from SecureFileSaver(FileSaver) to FileSave
 
         # 再次检查，确保最终路径仍在 allowed_dir 管辖下
         if not full_path.startswith(allowed_dir):
-            return ToolResult(error=f"安全错误: 最终路径 '{full_path}' 超出了允许的目录 '{allowed_dir}'.")
+            return f"安全错误: 最终路径 '{full_path}' 超出了允许的目录 '{allowed_dir}'."
+
+        # 检查文件大小 (counted chunk by chunk, so the content is never encoded as a whole just for this check)
+        if utf8_size(content, limit=self.MAX_FILE_BYTES) > self.MAX_FILE_BYTES:
+            return "安全错误: 文件大小超过限制 (最大10MB)"
 
-        # 检查文件大小
-        if len(content.encode('utf-8')) > 10 * 1024 * 1024:  # 10MB limit on byte length
-            return ToolResult(error="安全错误: 文件大小超过限制 (最大10MB)")
-        
         try:
             # 创建目标目录 (如果不存在)
             directory = os.path.dirname(full_path)
             if not os.path.exists(directory):
                 # 在创建目录前再次检查，确保目录路径也是安全的
                 if not directory.startswith(allowed_dir):
-                     return ToolResult(error=f"安全错误: 尝试创建不允许的目录 '{directory}'.")
-                os.makedirs(directory, exist_ok=True)
-            
-            with open(full_path, mode, encoding="utf-8") as file:
-                file.write(content)
-            return ToolResult(output=f"内容已成功保存到 {file_path} (在允许的工作区内)")
+                     return f"安全错误: 尝试创建不允许的目录 '{directory}'."
+
+            # Written to a temporary file and renamed into place, so a crash never leaves a half-written file
+            write_text(full_path, content, mode)
+            return None
         except Exception as e:
-            return ToolResult(error=f"保存文件 '{file_path}' 时出错: {str(e)}") 
\ No newline at end of file
+            return f"保存文件 '{file_path}' 时出错: {str(e)}"
@@ -1,17 +1,120 @@
-import threading
-import resource
+import os
 import sys
-from io import StringIO
 # from .base import BaseTool, ToolResult # New relative import
 from nanoOpenManus.app.tools.base import BaseTool, ToolResult # Changed back to absolute for docker exec context
+from nanoOpenManus.app.tools.output_capture import BoundedOutput
+from nanoOpenManus.app.tools.process_pool import ExecutionTimeout, ProcessPool, WorkerCrashed
+from nanoOpenManus.app.tools.snippet_analysis import analyze_snippet
+
+KERNEL_MEMORY_LIMIT = 500 * 1024 * 1024 # 500MB for a session kernel process
+# Full output that exceeds the capture limit is written here, inside the shared workspace
+OUTPUT_DIR = os.path.join(os.environ.get("ALLOWED_WRITE_DIR", "/workspace"), "tool_outputs")
 # Note: We are defining the class as PythonExecute directly to replace the original.
 
+# Imported once when the module loads; the fork server snapshots them, so every execution process
+# inherits the warm modules copy-on-write instead of importing them again.
+_SAFE_MODULES = {
+    name: __import__(name)
+    for name in ("math", "random", "datetime", "time", "json", "re", "collections",
+                 "functools", "itertools", "operator", "string", "decimal")
+}
+
+# Define a limited set of builtins for the exec environment
+_SAFE_BUILTINS = {
+    "abs": abs, "all": all, "any": any, "ascii": ascii,
+    "bin": bin, "bool": bool, "bytearray": bytearray, "bytes": bytes, "callable": callable,
+    "chr": chr, "complex": complex, "dict": dict, "dir": dir, "divmod": divmod,
+    "enumerate": enumerate, "filter": filter, "float": float, "format": format,
+    "frozenset": frozenset, "getattr": getattr, "hasattr": hasattr, "hash": hash, 
+    "help": help, "hex": hex, "id": id, "input": input, "int": int, 
+    "isinstance": isinstance, "issubclass": issubclass, "iter": iter, "len": len, 
+    "list": list, "locals": locals, "map": map, "max": max, "memoryview": memoryview, 
+    "min": min, "next": next, "object": object, "oct": oct, "ord": ord, 
+    "pow": pow, "print": print, "property": property, "range": range, "repr": repr, 
+    "reversed": reversed, "round": round, "set": set, "setattr": setattr, 
+    "slice": slice, "sorted": sorted, "staticmethod": staticmethod, "str": str, 
+    "sum": sum, "super": super, "tuple": tuple, "type": type, "vars": vars, "zip": zip,
+    # 'open': open, # Explicitly do not include open, use FileSaver tool
+    # 'eval': eval, 'exec': exec, 'compile': compile # Do not include these directly
+}
+
+
+def _make_globals():
+    """Builds a fresh restricted globals namespace for exec."""
+    # Copy the builtins so code in one namespace cannot alter what another one sees
+    return {"__builtins__": dict(_SAFE_BUILTINS), **_SAFE_MODULES}
+
+
+# Globals kept alive across executions inside a kernel session process (one per process).
+_kernel_namespace = None
+
+
+def _run_code(request):
+    """Runs inside a pool worker process: stdout/stderr capture is per-process, so concurrent executions never mix output."""
+    global _kernel_namespace
+    result = {"output": "", "error": None}
+    old_stdout = sys.stdout
+    old_stderr = sys.stderr
+    # Only the head and tail stay in memory, so printing in a loop cannot exhaust it
+    redirected_output = BoundedOutput(spill_dir=OUTPUT_DIR, spill_prefix="stdout_")
+    redirected_error = BoundedOutput(spill_dir=OUTPUT_DIR, spill_prefix="stderr_")
+    sys.stdout = redirected_output
+    sys.stderr = redirected_error
+
+    try:
+        # Memory (RLIMIT_AS) and CPU time limits are applied per execution by the process pool.
+
+        if request.get("persistent"):
+            # Kernel session: reuse variables, functions and imports from earlier executions
+            if _kernel_namespace is None:
+                _kernel_namespace = _make_globals()
+            namespace = _kernel_namespace
+        else:
+            namespace = _make_globals()
+
+        exec(request["code"], namespace) # Single namespace so top-level names stay visible to functions
+        result["output"] = redirected_output.getvalue()
+        error_output = redirected_error.getvalue()
+        if error_output:
+            result["output"] += "\nSTDERR:\n" + error_output
+
+    # Failures are reported through "error" so that the result cache never stores them
+    except MemoryError:
+        result["error"] = "错误: 执行代码超出内存限制。"
+    except Exception as e:
+        result["error"] = f"执行代码时出错: {type(e).__name__}: {str(e)}"
+    finally:
+        # Restore stdout and stderr
+        sys.stdout = old_stdout
+        sys.stderr = old_stderr
+        redirected_output.close()
+        redirected_error.close()
+    return result
+
+
+_pool = None
+
+
+def get_pool():
+    """Returns the shared pre-forked worker pool for python_execute, creating it on first use."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPool(
+            _run_code,
+            size=int(os.environ.get("PYTHON_EXECUTE_WORKERS", min(4, os.cpu_count() or 1))),
+            max_tasks_per_worker=1, # Every execution gets a fresh process forked from the warm zygote
+            memory_limit=500 * 1024 * 1024, # 500MB per execution
+            fork_server=True,
+        )
+    return _pool
+
+
 class PythonExecute(BaseTool): # Changed from SecurePythonExecute(PythonExecute) to PythonExecute(BaseTool)
     """增强安全性的Python代码执行工具 (直接替换版)
     此类将直接作为 app.tools.python_execute.PythonExecute 使用。
     """
     _name = "python_execute" # Use _ to avoid clash if super() also sets name
-    _description = "安全地执行Python代码片段，并返回标准输出。受限于超时和资源限制。"
+    _description = "安全地执行Python代码片段，并返回标准输出。受限于超时和资源限制。同一任务中的多次调用共享全局变量和函数，需要干净的环境时设置reset为true。"
     _parameters = [
         {
             "name": "code",
@@ -23,14 +126,38 @@ class PythonExecute(BaseTool): # Changed from SecurePythonExecute(PythonExecute)
             "type": "integer",
             "description": "代码执行的超时时间（秒），默认为5秒。",
             "optional": True
+        },
+        {
+            "name": "reset",
+            "type": "boolean",
+            "description": "为true时先清空本任务之前定义的所有变量，再执行代码。",
+            "optional": True
         }
     ]
 
-    def __init__(self):
+    def __init__(self, stateful: bool = True):
         super().__init__(name=self._name, description=self._description, parameters=self._parameters)
+        self.stateful = stateful
+        self._kernel = None # Dedicated process holding this session's globals, created on first use
+        self._executions = 0 # Number of executions actually run; part of the cache key when stateful
+        # Self-contained, deterministic snippets are cacheable; with a kernel only within the session
+        self.cache_policy = "session" if stateful else "pure"
 
-    async def execute(self, code: str, timeout: int = 5) -> ToolResult:
-        result = {"output": ""}
+    def conflict_keys(self, **kwargs):
+        # Calls in one session share a namespace, so they must run one at a time
+        return [f"python_kernel:{id(self)}"] if self.stateful else []
+
+    def cache_key(self, code="", timeout=5, reset=False, **kwargs):
+        # With a kernel the key carries the execution count: only an immediate repeat of the same
+        # snippet hits, so any namespace change in between forces a real execution
+        if reset or kwargs or analyze_snippet(code) is None:
+            return None
+        return f"{self._executions if self.stateful else ''}:{timeout}:{code}"
+
+    def reads_workspace(self, code="", **kwargs):
+        return bool(analyze_snippet(code))
+
+    async def execute(self, code: str, timeout: int = 5, reset: bool = False) -> ToolResult:
         dangerous_modules = [
             "subprocess", "os.system", "shutil.rmtree", "sys.modules", # sys.modules is too broad, consider specific harmful modules
             "__import__('subprocess')", "__import__('os').system",
@@ -56,83 +183,36 @@ class PythonExecute(BaseTool): # Changed from SecurePythonExecute(PythonExecute)
         # if "open(" in code and not "FileSaver" in code and not "with open(" in code: # very naive
         #    return ToolResult(error=f"安全错误: 检测到直接的 open() 调用。请使用 FileSaver 工具进行文件操作。")
 
-        def run_code_in_thread():
-            # Capture stdout and stderr
-            old_stdout = sys.stdout
-            old_stderr = sys.stderr
-            redirected_output = StringIO()
-            redirected_error = StringIO()
-            sys.stdout = redirected_output
-            sys.stderr = redirected_error
-
-            try:
-                # Set resource limits (लागू नहीं होगा सीधे विंडोज पर, लिनक्स/मैक पर काम करेगा)
-                # Memory limit (e.g., 500MB)
-                if hasattr(resource, 'RLIMIT_AS'):
-                    resource.setrlimit(resource.RLIMIT_AS, (500 * 1024 * 1024, 500 * 1024 * 1024))
-                # CPU time limit (e.g., timeout seconds) - This is harder to enforce directly for CPU time slices
-                # The threading.join(timeout) is the primary timeout mechanism here.
-
-                # Define a limited set of globals for the exec environment
-                safe_globals = {
-                    "__builtins__": {
-                        "abs": abs, "all": all, "any": any, "ascii": ascii,
-                        "bin": bin, "bool": bool, "bytearray": bytearray, "bytes": bytes, "callable": callable,
-                        "chr": chr, "complex": complex, "dict": dict, "dir": dir, "divmod": divmod,
-                        "enumerate": enumerate, "filter": filter, "float": float, "format": format,
-                        "frozenset": frozenset, "getattr": getattr, "hasattr": hasattr, "hash": hash, 
-                        "help": help, "hex": hex, "id": id, "input": input, "int": int, 
-                        "isinstance": isinstance, "issubclass": issubclass, "iter": iter, "len": len, 
-                        "list": list, "locals": locals, "map": map, "max": max, "memoryview": memoryview, 
-                        "min": min, "next": next, "object": object, "oct": oct, "ord": ord, 
-                        "pow": pow, "print": print, "property": property, "range": range, "repr": repr, 
-                        "reversed": reversed, "round": round, "set": set, "setattr": setattr, 
-                        "slice": slice, "sorted": sorted, "staticmethod": staticmethod, "str": str, 
-                        "sum": sum, "super": super, "tuple": tuple, "type": type, "vars": vars, "zip": zip,
-                        # 'open': open, # Explicitly do not include open, use FileSaver tool
-                        # 'eval': eval, 'exec': exec, 'compile': compile # Do not include these directly
-                    },
-                    # Commonly used safe modules
-                    "math": __import__('math'),
-                    "random": __import__('random'),
-                    "datetime": __import__('datetime'),
-                    "time": __import__('time'),
-                    "json": __import__('json'),
-                    "re": __import__('re'),
-                    "collections": __import__('collections'),
-                    "functools": __import__('functools'),
-                    "itertools": __import__('itertools'),
-                    "operator": __import__('operator'),
-                    "string": __import__('string'),
-                    "decimal": __import__('decimal')
-                }
-                
-                exec(code, safe_globals, {}) # Local scope for exec is empty
-                result["output"] = redirected_output.getvalue()
-                error_output = redirected_error.getvalue()
-                if error_output:
-                    result["output"] += "\nSTDERR:\n" + error_output
-
-            except MemoryError:
-                result["output"] = "错误: 执行代码超出内存限制。"
-            except Exception as e:
-                result["output"] = f"执行代码时出错: {type(e).__name__}: {str(e)}"
-            finally:
-                # Restore stdout and stderr
-                sys.stdout = old_stdout
-                sys.stderr = old_stderr
-
-        thread = threading.Thread(target=run_code_in_thread)
-        thread.daemon = True # Ensure thread doesn't block program exit
-        thread.start()
-        thread.join(timeout) # Wait for the thread to complete or timeout
-        
-        if thread.is_alive():
-            # Thread is still running after timeout, implies it's stuck or taking too long
-            # Attempt to clean up (though forceful termination of threads is tricky in Python)
-            # For now, we just report timeout.
-            return ToolResult(error=f"执行超时 ({timeout} 秒)。代码可能包含无限循环或长时间操作。")
+        self._executions += 1
+        if not self.stateful:
+            runner = get_pool()
+        else:
+            if reset and self._kernel is not None:
+                self._kernel.reset()
+            if self._kernel is None:
+                self._kernel = get_pool().open_kernel(memory_limit=KERNEL_MEMORY_LIMIT)
+            runner = self._kernel
+            if not code.strip():
+                return ToolResult(output="会话状态已清空" if reset else "")
+
+        # A killed or crashed kernel process takes the session's globals with it
+        lost_note = "会话进程已被终止，之前定义的变量已丢失。" if self.stateful else ""
+        try:
+            result = await runner.run({"code": code, "persistent": self.stateful}, timeout=timeout)
+        except ExecutionTimeout:
+            # The worker process running the code has been killed, so it no longer consumes CPU.
+            return ToolResult(error=f"执行超时 ({timeout} 秒)。代码可能包含无限循环或长时间操作。" + lost_note)
+        except WorkerCrashed as e:
+            return ToolResult(error=f"错误: {str(e)}。" + lost_note)
         
+        if result.get("error"):
+            return ToolResult(error=result["error"])
         if "错误:" in result["output"] or "STDERR:" in result["output"]:
              return ToolResult(error=result["output"])
-        return ToolResult(output=result["output"]) 
\ No newline at end of file
+        return ToolResult(output=result["output"]) 
+
+    async def cleanup(self) -> None:
+        """Ends the session kernel process, dropping all state kept for this session."""
+        if self._kernel is not None:
+            self._kernel.close()
+            self._kernel = None
@@ -11,7 +11,10 @@ import asyncio
 import argparse
 
 # 导入Docker版本的Manus
+from nanoOpenManus.app.console import read_line
+from nanoOpenManus.app.docker_api import close_docker_clients
 from nanoOpenManus.app.docker_manus import DockerManus
+from nanoOpenManus.app.transport import close_transports
 
 
 async def main():
@@ -45,35 +48,50 @@ async def main():
     print("⌨️  输入'exit'或'quit'退出程序\n")
     
     # 主循环
-    while True:
-        try:
-            # 获取用户输入
-            prompt = input("🙋 请输入您的请求: ")
-            
-            # 检查是否退出
-            if prompt.lower() in ["exit", "quit"]:
-                print("👋 再见!")
+    try:
+        while True:
+            try:
+                # 获取用户输入；由事件循环监听标准输入，不占用线程，等待期间后台的容器检查等任务可以继续进行
+                prompt = await read_line("🙋 请输入您的请求: ")
+                
+                # 检查是否退出
+                if prompt.lower() in ["exit", "quit"]:
+                    print("👋 再见!")
+                    break
+                
+                # 跳过空输入
+                if not prompt.strip():
+                    print("⚠️ 跳过空输入")
+                    continue
+                
+                # 处理请求
+                print("⏳ 正在处理您的请求...")
+                result = await agent.run(prompt)
+                
+                # 显示结果
+                print(f"\n✅ 结果:\n{result}\n")
+                
+            except EOFError:
+                print("\n👋 再见!")
+                break
+            except KeyboardInterrupt:
+                print("\n👋 程序被用户中断，再见!")
                 break
-            
-            # 跳过空输入
-            if not prompt.strip():
-                print("⚠️ 跳过空输入")
-                continue
-            
-            # 处理请求
-            print("⏳ 正在处理您的请求...")
-            result = await agent.run(prompt)
-            
-            # 显示结果
-            print(f"\n✅ 结果:\n{result}\n")
-            
-        except KeyboardInterrupt:
-            print("\n👋 程序被用户中断，再见!")
-            break
+            except Exception as e:
+                print(f"❌ 错误: {str(e)}")
+    finally:
+        # 释放代理持有的资源（容器内常驻worker、Python内核进程），关闭共享的LLM连接池和Docker API连接
+        try:
+            await agent.close()
         except Exception as e:
-            print(f"❌ 错误: {str(e)}")
+            print(f"⚠️ 关闭代理资源失败: {str(e)}")
+        await close_transports()
+        await close_docker_clients()
 
 
 if __name__ == "__main__":
-    # 运行主函数
-    asyncio.run(main()) 
\ No newline at end of file
+    # 运行主函数；Ctrl-C会取消main()，资源在其finally中释放
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\n👋 程序被用户中断，再见!") 
\ No newline at end of file
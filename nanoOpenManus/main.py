@@ -15,10 +15,7 @@ if _project_root not in sys.path:
 import argparse
 import asyncio
 
-# 导入Docker版本的Manus
-from nanoOpenManus.app.docker_manus import DockerManus
-# 保留原始Manus作为后备选项
-from nanoOpenManus.app.manus import Manus
+# 代理、工具和LLM相关模块在解析完参数后按运行模式导入，--help等不需要承担导入开销
 
 
 async def main():
@@ -34,6 +31,24 @@ async def main():
     parser.add_argument('--base-url', default='https://api.deepseek.com', 
                         help='API基础URL (默认: https://api.deepseek.com)')
     parser.add_argument('--max-steps', type=int, default=15, help='最大执行步骤数 (默认: 15)')
+    parser.add_argument('--deadline', type=float, default=None, metavar='SECONDS',
+                        help='每个请求的运行时间上限（秒），超过后取消正在进行的LLM请求和工具执行并返回部分结果 (默认: 不限制)')
+    parser.add_argument('--parallel-tools', type=int, default=0,
+                        help='并发执行同一轮中多个工具调用的数量上限，0表示串行执行 (默认: 0)')
+    parser.add_argument('--stream', action='store_true',
+                        help='以流式方式请求LLM，工具调用参数生成完整后立即开始执行')
+    parser.add_argument('--context-budget', type=int, default=None,
+                        help='对话历史的估算token上限，超出时压缩较早的工具输出 (默认: 不压缩)')
+    parser.add_argument('--llm-cache', default=None, metavar='PATH',
+                        help='LLM响应缓存的SQLite文件路径，相同请求直接复用缓存的响应 (默认: 不缓存)')
+    parser.add_argument('--blob-threshold', type=int, default=None, metavar='CHARS',
+                        help='超过该字符数的工具输出存入blob存储，历史中只保留预览，模型可用blob_read分页读取 (默认: 不启用)')
+    parser.add_argument('--blob-dir', default=None, metavar='PATH',
+                        help='blob存储的磁盘目录 (默认: 系统临时目录下的nanomanus-blobs)')
+    parser.add_argument('--trace', default=None, metavar='PATH',
+                        help='将运行追踪（每一步、LLM请求和工具调用的耗时）追加写入该JSONL文件，可用trace_report.py分析 (默认: 不追踪)')
+    parser.add_argument('--otlp-endpoint', default=None, metavar='URL',
+                        help='将运行追踪以OTLP/HTTP JSON格式发送到该地址，例如 http://localhost:4318/v1/traces')
     # 添加Docker相关选项
     parser.add_argument('--use-docker', action='store_true',  default=True,
                         help='在Docker容器中执行工具 (默认: 开启)')
@@ -41,25 +56,62 @@ async def main():
                         help='Docker容器名称 (默认: nanomanus-sandbox)')
     parser.add_argument('--local', action='store_true',
                         help='使用本地环境执行工具，不使用Docker')
+    parser.add_argument('--reset-workspace', action='store_true',
+                        help='Docker模式下每次请求结束后把容器工作区还原到第一次请求前的状态')
+    parser.add_argument('--quiet', action='store_true',
+                        help='不输出代理每一步的思考、工具调用等运行日志，只显示最终结果')
     args = parser.parse_args()
     
+    from nanoOpenManus.app.console import read_line, set_console_output
+    from nanoOpenManus.app.docker_api import close_docker_clients
+    from nanoOpenManus.app.transport import close_transports
+    from nanoOpenManus.app.tracing import configure_tracing, shutdown_tracing
+    
+    llm_cache = None
+    if args.llm_cache:
+        from nanoOpenManus.app.llm_cache import LLMResponseCache
+        llm_cache = LLMResponseCache(args.llm_cache)
+    blob_store = None
+    if args.blob_threshold:
+        from nanoOpenManus.app.blob_store import BlobStore
+        blob_store = BlobStore(directory=args.blob_dir, threshold=args.blob_threshold)
+    configure_tracing(path=args.trace, otlp_endpoint=args.otlp_endpoint)
+    if args.quiet:
+        set_console_output(False)
+    
     # 创建代理实例
     if args.local or not args.use_docker:
         print("🖥️ 使用本地环境执行工具")
+        from nanoOpenManus.app.manus import Manus
         agent = Manus(
             max_steps=args.max_steps,
             api_key=args.api_key,
             model=args.model,
-            base_url=args.base_url
+            base_url=args.base_url,
+            parallel_tool_calls=args.parallel_tools > 0,
+            max_parallel_tools=max(1, args.parallel_tools),
+            stream=args.stream,
+            context_budget=args.context_budget,
+            llm_cache=llm_cache,
+            blob_store=blob_store
         )
     else:
         print(f"🐳 使用Docker容器 '{args.container_name}' 执行工具")
+        # 容器状态在后台检查，第一次工具调用时才等待检查结果，不阻塞启动
+        from nanoOpenManus.app.docker_manus import DockerManus
         agent = DockerManus(
             max_steps=args.max_steps,
             api_key=args.api_key,
             model=args.model,
             base_url=args.base_url,
-            container_name=args.container_name
+            container_name=args.container_name,
+            reset_workspace=args.reset_workspace,
+            parallel_tool_calls=args.parallel_tools > 0,
+            max_parallel_tools=max(1, args.parallel_tools),
+            stream=args.stream,
+            context_budget=args.context_budget,
+            llm_cache=llm_cache,
+            blob_store=blob_store
         )
     
     print("🚀 NanoOpenManus 已启动!")
@@ -68,35 +120,54 @@ async def main():
     print("⌨️  输入'exit'或'quit'退出程序\n")
     
     # 主循环
-    while True:
-        try:
-            # 获取用户输入
-            prompt = input("🙋 请输入您的请求: ")
-            
-            # 检查是否退出
-            if prompt.lower() in ["exit", "quit"]:
-                print("👋 再见!")
+    try:
+        while True:
+            try:
+                # 获取用户输入；由事件循环监听标准输入，不占用线程，等待期间后台的容器检查等任务可以继续进行
+                prompt = await read_line("🙋 请输入您的请求: ")
+                
+                # 检查是否退出
+                if prompt.lower() in ["exit", "quit"]:
+                    print("👋 再见!")
+                    break
+                
+                # 跳过空输入
+                if not prompt.strip():
+                    print("⚠️ 跳过空输入")
+                    continue
+                
+                # 处理请求
+                print("⏳ 正在处理您的请求...")
+                result = await agent.run(prompt, deadline=args.deadline)
+                
+                # 显示结果
+                print(f"\n✅ 结果:\n{result}\n")
+                
+            except EOFError:
+                print("\n👋 再见!")
+                break
+            except KeyboardInterrupt:
+                print("\n👋 程序被用户中断，再见!")
                 break
-            
-            # 跳过空输入
-            if not prompt.strip():
-                print("⚠️ 跳过空输入")
-                continue
-            
-            # 处理请求
-            print("⏳ 正在处理您的请求...")
-            result = await agent.run(prompt)
-            
-            # 显示结果
-            print(f"\n✅ 结果:\n{result}\n")
-            
-        except KeyboardInterrupt:
-            print("\n👋 程序被用户中断，再见!")
-            break
+            except Exception as e:
+                print(f"❌ 错误: {str(e)}")
+    finally:
+        # 释放代理持有的资源（容器内常驻worker、Python内核进程），关闭共享的LLM连接池和Docker API连接，
+        # 并写出剩余的追踪数据
+        try:
+            await agent.close()
         except Exception as e:
-            print(f"❌ 错误: {str(e)}")
+            print(f"⚠️ 关闭代理资源失败: {str(e)}")
+        if llm_cache is not None:
+            llm_cache.close()
+        await close_transports()
+        await close_docker_clients()
+        shutdown_tracing()
 
 
 if __name__ == "__main__":
-    # 运行主函数
-    asyncio.run(main()) 
\ No newline at end of file
+    # 运行主函数；Ctrl-C会取消main()，资源在其finally中释放
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\n👋 程序被用户中断，再见!") 
\ No newline at end of file
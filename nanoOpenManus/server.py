@@ -0,0 +1,395 @@
+import sys
+import os
+
+# --- Start of code to fix Python path ---
+# This ensures that the project root directory (containing the 'nanoOpenManus' package)
+# is on the Python path, allowing imports like 'from nanoOpenManus.app...'
+_current_script_path = os.path.abspath(__file__)
+_current_script_dir = os.path.dirname(_current_script_path)
+_project_root = os.path.dirname(_current_script_dir)
+
+if _project_root not in sys.path:
+    sys.path.insert(0, _project_root)
+# --- End of code to fix Python path ---
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from nanoOpenManus.app.agent import AgentState
+from nanoOpenManus.app.agent_factory import AgentFactory, add_agent_arguments
+from nanoOpenManus.app.console import console_print
+from nanoOpenManus.app.docker_api import close_docker_clients
+from nanoOpenManus.app.events import is_public_event
+from nanoOpenManus.app.transport import close_transports
+
+
+# 请求体大小上限
+MAX_BODY_SIZE = 1024 * 1024
+# 回放记录中工具调用参数和观察结果保留的字符数；实时订阅者收到完整内容
+MAX_REPLAY_TEXT = 2000
+# 服务自己发布的事件，其余事件只记录make_event对外产出的类型（不记录message）
+SERVER_EVENTS = {"submitted", "cancelled", "done"}
+# 任务结束且没有订阅者后，回放记录只保留这些事件
+FINAL_EVENTS = {"run_finished", "run_error", "run_cancelled", "cancelled", "done"}
+
+HTTP_REASONS = {
+    200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error",
+}
+
+
+class HTTPError(Exception):
+    """以指定状态码返回给客户端的错误"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class TaskRecord:
+    """一个提交到服务的任务：独立的代理实例、状态和事件记录"""
+
+    def __init__(self, task_id: str, prompt: str, max_steps: Optional[int] = None, deadline: Optional[float] = None):
+        self.id = task_id
+        self.prompt = prompt
+        self.max_steps = max_steps
+        self.deadline = deadline  # 运行时间上限（秒），从任务开始运行时计时
+        self.status = "pending"  # pending -> running -> finished / error / cancelled
+        self.result: Optional[str] = None
+        self.steps = 0
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.events: List[Dict] = []  # 回放记录，事件流的订阅者先回放已有事件
+        self.published = 0  # 已发布的事件数，即下一个事件的seq
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.task: Optional[asyncio.Task] = None
+        self.agent = None  # 运行中的代理，用于取消时保留部分结果
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("finished", "error", "cancelled")
+
+    def publish(self, event: str, data: Dict) -> None:
+        """记录事件并推送给所有订阅者"""
+        if event not in SERVER_EVENTS and not is_public_event(event):
+            return
+        item = {"seq": self.published, "event": event, "time": time.time(), "data": data}
+        self.published += 1
+        for queue in self.subscribers:
+            queue.put_nowait(item)
+        self._record(item)
+        if event == "done":
+            self.trim()
+
+    def _record(self, item: Dict) -> None:
+        """把事件加入回放记录：截断较长的参数和观察结果，连续的llm_delta合并为一条"""
+        data = item["data"]
+        last = self.events[-1] if self.events else None
+        if (item["event"] == "llm_delta" and last is not None and last["event"] == "llm_delta"
+                and last["data"].get("step") == data.get("step")):
+            content = (last["data"].get("content") or "") + (data.get("content") or "")
+            self.events[-1] = {**item, "data": {**data, "content": content}}
+            return
+        for key in ("arguments", "observation"):
+            value = data.get(key)
+            if isinstance(value, str) and len(value) > MAX_REPLAY_TEXT:
+                data = {**data, key: value[:MAX_REPLAY_TEXT] + f"...[回放时截断，共{len(value)}字符]"}
+        self.events.append({**item, "data": data})
+
+    def trim(self) -> None:
+        """任务结束且没有订阅者时丢弃过程事件，只保留结束事件"""
+        if self.done and not self.subscribers:
+            self.events = [item for item in self.events if item["event"] in FINAL_EVENTS]
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "prompt": self.prompt,
+            "result": self.result,
+            "steps": self.steps,
+            "deadline": self.deadline,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "events": self.published,
+        }
+
+
+class AgentServer:
+    """
+    多会话代理服务
+
+    每个任务使用agent_factory创建的独立代理（各自的消息历史），
+    所有任务在同一个事件循环中并发运行，最多同时运行max_concurrent个，其余排队等待。
+    """
+
+    def __init__(self, agent_factory: Callable[[Optional[int]], object], max_concurrent: int = 8, max_finished: int = 1000,
+                 deadline: Optional[float] = None):
+        """
+        Args:
+            agent_factory: 以max_steps（可为None）为参数创建新代理的函数
+            max_concurrent: 同时运行的任务数上限
+            max_finished: 保留的已结束任务数，超出时丢弃最早结束的任务
+            deadline: 提交时没有指定deadline的任务使用的运行时间上限（秒），为None时不限制
+        """
+        self.agent_factory = agent_factory
+        self.deadline = deadline
+        self.max_finished = max_finished
+        self.tasks: "OrderedDict[str, TaskRecord]" = OrderedDict()
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+
+    def submit(self, prompt: str, max_steps: Optional[int] = None, deadline: Optional[float] = None) -> TaskRecord:
+        """提交任务并立即返回，任务在后台排队运行"""
+        record = TaskRecord(uuid.uuid4().hex[:12], prompt, max_steps, deadline if deadline is not None else self.deadline)
+        self.tasks[record.id] = record
+        record.publish("submitted", {"prompt": prompt})
+        record.task = asyncio.ensure_future(self._run_task(record))
+        self._prune()
+        return record
+
+    def get(self, task_id: str) -> TaskRecord:
+        record = self.tasks.get(task_id)
+        if record is None:
+            raise HTTPError(404, f"任务不存在: {task_id}")
+        return record
+
+    def cancel(self, task_id: str) -> TaskRecord:
+        """取消排队中或运行中的任务；运行中的任务以已有的部分结果结束"""
+        record = self.get(task_id)
+        if record.done:
+            raise HTTPError(409, f"任务已结束: {record.status}")
+        if record.agent is None or not record.agent.cancel("用户取消"):
+            record.task.cancel()  # 还在排队或正在创建代理
+        return record
+
+    async def shutdown(self) -> None:
+        """取消所有未结束的任务并等待它们退出"""
+        pending = [record.task for record in self.tasks.values() if record.task and not record.task.done()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _run_task(self, record: TaskRecord) -> None:
+        agent = None
+        try:
+            async with self._semaphore:
+                record.status = "running"
+                record.started_at = time.time()
+                agent = record.agent = self.agent_factory(record.max_steps)
+                agent.add_listener(record.publish)
+                result = await agent.run(record.prompt, deadline=record.deadline)
+                record.result = result
+                record.steps = agent.current_step
+                record.status = {AgentState.ERROR: "error", AgentState.CANCELLED: "cancelled"}.get(agent.state, "finished")
+        except asyncio.CancelledError:
+            record.status = "cancelled"
+            record.steps = agent.current_step if agent is not None else 0
+            record.publish("cancelled", {})
+        except Exception as e:
+            record.status = "error"
+            record.result = f"创建或运行代理时出错: {str(e)}"
+            record.publish("run_error", {"error": record.result})
+        finally:
+            record.agent = None
+            record.finished_at = time.time()
+            record.publish("done", {"status": record.status})
+            if agent is not None and hasattr(agent, "close"):
+                try:
+                    await agent.close()
+                except Exception as e:
+                    console_print(f"⚠️ 关闭代理资源失败: {str(e)}")
+
+    def _prune(self) -> None:
+        """丢弃最早结束的任务，使保留的已结束任务不超过max_finished"""
+        finished = [task_id for task_id, record in self.tasks.items() if record.done]
+        for task_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.tasks[task_id]
+
+    # ---- HTTP ----
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """处理一个HTTP连接（每个连接一个请求，响应后关闭）"""
+        try:
+            method, path, body = await _read_request(reader)
+            if method == "GET" and path.endswith("/events"):
+                await self._stream_events(self.get(_task_id(path, "/events")), writer)
+                return
+            status, payload = self._dispatch(method, path, body)
+        except HTTPError as e:
+            status, payload = e.status, {"error": str(e)}
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        except Exception as e:
+            status, payload = 500, {"error": f"{type(e).__name__}: {str(e)}"}
+        await _write_json(writer, status, payload)
+
+    def _dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, Dict]:
+        """路由JSON请求"""
+        if path == "/tasks":
+            if method == "GET":
+                return 200, {"tasks": [record.to_dict() for record in self.tasks.values()]}
+            if method == "POST":
+                try:
+                    request = json.loads(body or b"{}")
+                except ValueError:
+                    raise HTTPError(400, "请求体不是合法的JSON")
+                prompt = request.get("prompt") if isinstance(request, dict) else None
+                if not isinstance(prompt, str) or not prompt.strip():
+                    raise HTTPError(400, "缺少prompt")
+                max_steps = request.get("max_steps")
+                if max_steps is not None and (not isinstance(max_steps, int) or max_steps < 1):
+                    raise HTTPError(400, "max_steps必须是正整数")
+                deadline = request.get("deadline")
+                if deadline is not None and (isinstance(deadline, bool) or not isinstance(deadline, (int, float)) or deadline <= 0):
+                    raise HTTPError(400, "deadline必须是正数（秒）")
+                return 202, self.submit(prompt, max_steps, deadline).to_dict()
+            raise HTTPError(405, f"不支持的方法: {method}")
+
+        if path.startswith("/tasks/"):
+            if path.endswith("/cancel"):
+                if method != "POST":
+                    raise HTTPError(405, f"不支持的方法: {method}")
+                return 200, self.cancel(_task_id(path, "/cancel")).to_dict()
+            task_id = _task_id(path, "")
+            if method == "GET":
+                return 200, self.get(task_id).to_dict()
+            if method == "DELETE":
+                return 200, self.cancel(task_id).to_dict()
+            raise HTTPError(405, f"不支持的方法: {method}")
+
+        if path == "/health" and method == "GET":
+            running = sum(1 for record in self.tasks.values() if record.status == "running")
+            health = {"ok": True, "tasks": len(self.tasks), "running": running}
+            sandbox_pool = getattr(self.agent_factory, "sandbox_pool", None)
+            if sandbox_pool is not None:
+                health["sandbox_pool"] = sandbox_pool.stats()  # 含归还时还原工作区的耗时和回收的字节数
+            blob_store = getattr(self.agent_factory, "blob_store", None)
+            if blob_store is not None:
+                health["blob_store"] = blob_store.summary()
+            return 200, health
+        raise HTTPError(404, f"未知路径: {path}")
+
+    async def _stream_events(self, record: TaskRecord, writer: asyncio.StreamWriter) -> None:
+        """以SSE推送任务事件：先回放已有事件，再推送新事件，任务结束后关闭"""
+        queue: asyncio.Queue = asyncio.Queue()
+        backlog = list(record.events)
+        if not record.done:
+            record.subscribers.add(queue)
+        try:
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: text/event-stream; charset=utf-8\r\n"
+                b"Cache-Control: no-cache\r\n"
+                b"Connection: close\r\n\r\n"
+            )
+            for item in backlog:
+                writer.write(_sse(item))
+            await writer.drain()
+            while not record.done or not queue.empty():
+                item = await queue.get()
+                writer.write(_sse(item))
+                await writer.drain()
+                if item["event"] == "done":
+                    break
+        except ConnectionError:
+            pass  # 客户端断开
+        finally:
+            record.subscribers.discard(queue)
+            record.trim()
+            writer.close()
+
+
+def _task_id(path: str, suffix: str) -> str:
+    task_id = path[len("/tasks/"):len(path) - len(suffix)]
+    if not task_id or "/" in task_id:
+        raise HTTPError(404, f"未知路径: {path}")
+    return task_id
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Tuple[str, str, bytes]:
+    """读取一个HTTP/1.1请求，返回(方法, 路径, 请求体)"""
+    request_line = (await reader.readuntil(b"\r\n")).decode("latin-1").strip()
+    parts = request_line.split()
+    if len(parts) != 3:
+        raise HTTPError(400, "无效的请求行")
+    method, target, _ = parts
+    headers = {}
+    while True:
+        line = (await reader.readuntil(b"\r\n")).decode("latin-1")
+        if line in ("\r\n", ""):
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length") or 0)
+    if length > MAX_BODY_SIZE:
+        raise HTTPError(413, "请求体过大")
+    body = await reader.readexactly(length) if length else b""
+    path = target.split("?", 1)[0].rstrip("/") or "/"
+    return method.upper(), path, body
+
+
+async def _write_json(writer: asyncio.StreamWriter, status: int, payload: Dict) -> None:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+        f"Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: close\r\n\r\n"
+    ).encode("latin-1")
+    try:
+        writer.write(head + body)
+        await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+def _sse(item: Dict) -> bytes:
+    data = json.dumps(item, ensure_ascii=False, default=str)
+    return f"id: {item['seq']}\nevent: {item['event']}\ndata: {data}\n\n".encode("utf-8")
+
+
+async def main():
+    """
+    NanoOpenManus 服务入口
+
+    启动一个HTTP/JSON服务，在同一个进程内并发运行多个相互隔离的代理任务
+    """
+    parser = argparse.ArgumentParser(description='NanoOpenManus - 多会话代理服务')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址 (默认: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8080, help='监听端口 (默认: 8080)')
+    parser.add_argument('--max-concurrent', type=int, default=8, help='同时运行的任务数上限 (默认: 8)')
+    add_agent_arguments(parser)
+    args = parser.parse_args()
+
+    agent_factory = AgentFactory(args, max_concurrent=args.max_concurrent)
+    await agent_factory.start()
+
+    server = AgentServer(agent_factory, max_concurrent=args.max_concurrent, deadline=args.deadline)
+    http_server = await asyncio.start_server(server.handle_connection, args.host, args.port)
+    console_print(f"🚀 NanoOpenManus 服务已启动: http://{args.host}:{args.port}")
+    console_print("📝 POST /tasks 提交任务，GET /tasks/{id} 查询状态，GET /tasks/{id}/events 订阅事件，POST /tasks/{id}/cancel 取消任务")
+    try:
+        async with http_server:
+            await http_server.serve_forever()
+    finally:
+        await server.shutdown()
+        await agent_factory.close()
+        await close_transports()
+        await close_docker_clients()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        console_print("\n👋 服务已停止")
@@ -0,0 +1,102 @@
+import asyncio
+import sys
+
+import pytest
+
+from nanoOpenManus.app.tools import docker_proxy
+from nanoOpenManus.app.tools.base import ToolResult
+from nanoOpenManus.app.tools.docker_proxy import DockerToolProxy, ToolWorkerClient, WorkerBackoff
+
+
+@pytest.fixture
+def wedged_exec(monkeypatch):
+    """docker exec启动后一直不应答的worker"""
+    started = []
+
+    async def fake_exec(container_name, cmd, capture_stderr=True):
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-c", "import time; time.sleep(60)",
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+        )
+        started.append(process)
+        return process
+
+    monkeypatch.setattr(docker_proxy, "_docker_exec", fake_exec)
+    monkeypatch.setattr(docker_proxy, "WORKER_START_TIMEOUT", 0.2)
+    monkeypatch.setattr(docker_proxy, "WORKER_RETRY_DELAY", 0.3)
+    return started
+
+
+def test_worker_start_times_out_and_backs_off(wedged_exec):
+    async def main():
+        client = ToolWorkerClient("sandbox")
+        with pytest.raises(TimeoutError):
+            await client.start()
+        assert not client.running
+        assert wedged_exec[0].returncode is not None  # 卡住的docker exec已被杀死
+        with pytest.raises(WorkerBackoff):
+            await client.start()
+        assert len(wedged_exec) == 1
+
+        await asyncio.sleep(client.retry_delay + 0.05)
+        with pytest.raises(TimeoutError):
+            await client.start()
+        assert len(wedged_exec) == 2
+        assert client.retry_delay > 0.3  # 连续失败时退避时间翻倍
+
+    asyncio.run(main())
+
+
+def test_proxy_falls_back_per_call_and_keeps_worker(wedged_exec, monkeypatch):
+    async def main():
+        proxy = DockerToolProxy("sandbox", ensure_running=False)
+        once_calls = []
+
+        async def fake_once(tool_name, **kwargs):
+            once_calls.append(tool_name)
+            return ToolResult(output="once")
+
+        monkeypatch.setattr(proxy, "_execute_tool_once", fake_once)
+        assert (await proxy.execute_tool("python_execute", code="print(1)")).output == "once"
+        assert (await proxy.execute_tool("python_execute", code="print(1)")).output == "once"
+        assert proxy.worker is not None  # 没有永久放弃worker
+        assert len(wedged_exec) == 1  # 退避期间不重新启动
+
+        await asyncio.sleep(proxy.worker.retry_delay + 0.05)
+        await proxy.execute_tool("python_execute", code="print(1)")
+        assert len(wedged_exec) == 2
+        assert once_calls == ["python_execute"] * 3
+        await proxy.close()
+
+    asyncio.run(main())
+
+
+def test_unused_session_is_not_closed_in_the_container():
+    class FakeWorker:
+        running = True
+
+        def __init__(self):
+            self.closed = []
+
+        async def call(self, tool_name, args, session=None):
+            return {"output": "ok"}
+
+        async def close_session(self, session):
+            self.closed.append(session)
+
+    async def main():
+        proxy = DockerToolProxy("sandbox", ensure_running=False)
+        proxy.worker = worker = FakeWorker()
+        first = proxy.session_id
+        # 多个工具包装共用一个代理，每个包装的cleanup都会结束会话
+        for _ in range(4):
+            await proxy.close_session()
+        assert worker.closed == [] and proxy.session_id == first
+
+        await proxy.execute_tool("python_execute", code="print(1)")
+        for _ in range(4):
+            await proxy.close_session()
+        assert worker.closed == [first]
+        assert proxy.session_id != first
+
+    asyncio.run(main())
@@ -0,0 +1,26 @@
+import os
+
+from nanoOpenManus.app.tools.file_io import write_text
+
+
+def test_new_file_mode_follows_umask(tmp_path):
+    old = os.umask(0o027)
+    try:
+        path = str(tmp_path / "sub" / "new.txt")
+        assert write_text(path, "héllo") == 6
+        assert os.stat(path).st_mode & 0o777 == 0o640
+        assert os.umask(0o027) == 0o027  # 写入不改动进程的umask
+    finally:
+        os.umask(old)
+
+
+def test_overwrite_keeps_mode_and_leaves_no_temp_files(tmp_path):
+    path = str(tmp_path / "data.txt")
+    write_text(path, "old")
+    os.chmod(path, 0o600)
+    write_text(path, "new")
+    write_text(path, "!", mode="a")
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == "new!"
+    assert os.stat(path).st_mode & 0o777 == 0o600
+    assert os.listdir(str(tmp_path)) == ["data.txt"]
@@ -0,0 +1,139 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from nanoOpenManus.app.tools import process_pool
+from nanoOpenManus.app.tools.process_pool import ExecutionTimeout, ProcessPool
+
+# 内核进程中跨执行保留的状态
+_state = {}
+
+# 宿主进程中被其他线程持有的锁；直接从宿主进程fork的子进程会继承一个永远不会释放的锁
+_host_lock = threading.Lock()
+
+
+def run_payload(payload):
+    """测试用的target：按载荷执行简单操作"""
+    op = payload["op"]
+    if op == "pid":
+        return os.getpid()
+    if op == "sleep":
+        time.sleep(payload["seconds"])
+        return "slept"
+    if op == "set":
+        _state[payload["key"]] = payload["value"]
+        return None
+    if op == "get":
+        return _state.get(payload["key"])
+    if op == "lock":
+        acquired = _host_lock.acquire(timeout=1)
+        if acquired:
+            _host_lock.release()
+        return acquired
+    raise ValueError(op)
+
+
+@pytest.fixture(params=[False, True], ids=["fork", "fork_server"])
+def pool(request):
+    pool = ProcessPool(run_payload, size=1, fork_server=request.param)
+    yield pool
+    pool.shutdown()
+
+
+def test_workers_are_reused_and_timeouts_kill(pool):
+    async def main():
+        first = await pool.run({"op": "pid"})
+        assert await pool.run({"op": "pid"}) == first
+        with pytest.raises(ExecutionTimeout):
+            await pool.run({"op": "sleep", "seconds": 30}, timeout=0.2)
+        assert await pool.run({"op": "pid"}) != first
+
+    asyncio.run(main())
+
+
+def test_kernel_keeps_state_until_reset(pool):
+    async def main():
+        kernel = pool.open_kernel()
+        await kernel.run({"op": "set", "key": "x", "value": 1})
+        assert await kernel.run({"op": "get", "key": "x"}) == 1
+        kernel.reset()
+        assert await kernel.run({"op": "get", "key": "x"}) is None
+        kernel.close()
+
+    asyncio.run(main())
+
+
+def test_kernel_close_does_not_block_event_loop(pool, monkeypatch):
+    original_kill = process_pool._Worker.kill
+
+    def slow_kill(self):
+        time.sleep(1.0)  # 模拟迟迟不退出的进程
+        original_kill(self)
+
+    monkeypatch.setattr(process_pool._Worker, "kill", slow_kill)
+
+    async def main():
+        kernel = pool.open_kernel()
+        pid = await kernel.run({"op": "pid"})
+        started = time.monotonic()
+        kernel.close()
+        kernel.close()  # 可以重复调用
+        assert time.monotonic() - started < 0.5
+        await asyncio.get_running_loop().run_in_executor(None, kernel._executor.shutdown)
+        assert kernel._worker is None  # 进程由内核的执行线程回收
+        with pytest.raises(RuntimeError):
+            kernel.run_sync({"op": "pid"})
+
+    asyncio.run(main())
+
+
+def test_fork_server_does_not_inherit_host_thread_locks():
+    release = threading.Event()
+    holder = threading.Thread(target=lambda: (_host_lock.acquire(), release.wait(), _host_lock.release()))
+    holder.start()
+    try:
+        while not _host_lock.locked():
+            time.sleep(0.001)
+        pool = ProcessPool(run_payload, size=1, fork_server=True)
+        try:
+            assert asyncio.run(pool.run({"op": "lock"}, timeout=5)) is True
+        finally:
+            pool.shutdown()
+    finally:
+        release.set()
+        holder.join()
+
+
+def test_fork_server_rejects_unimportable_target():
+    with pytest.raises(ValueError):
+        ProcessPool(lambda payload: payload, size=1, fork_server=True)
+
+
+def test_cancelled_waiters_do_not_retire_workers(pool):
+    first = pool.run_sync({"op": "pid"})
+    busy = threading.Thread(target=pool.run_sync, args=({"op": "sleep", "seconds": 0.3},))
+    busy.start()
+    time.sleep(0.05)
+    executions = [process_pool._Execution() for _ in range(3)]
+    errors = []
+
+    def wait_for_worker(execution):
+        try:
+            pool.run_sync({"op": "pid"}, execution=execution)
+        except Exception as e:
+            errors.append(e)
+
+    waiters = [threading.Thread(target=wait_for_worker, args=(execution,)) for execution in executions]
+    for waiter in waiters:
+        waiter.start()
+    time.sleep(0.05)
+    for execution in executions:
+        execution.cancel()
+    for thread in waiters + [busy]:
+        thread.join()
+    assert len(errors) == 3 and all(isinstance(e, process_pool.ExecutionCancelled) for e in errors)
+    assert pool.run_sync({"op": "pid"}) == first
+    assert pool.stats["spawned"] == 1
@@ -0,0 +1,41 @@
+from nanoOpenManus.server import MAX_REPLAY_TEXT, TaskRecord
+
+
+def test_replay_backlog_stays_small():
+    record = TaskRecord("t1", "prompt")
+    record.publish("submitted", {"prompt": "prompt"})
+    record.publish("message", {"role": "tool", "content": "x" * 10000})
+    record.publish("llm_delta", {"step": 1, "content": "he"})
+    record.publish("llm_delta", {"step": 1, "content": "llo"})
+    record.publish("tool_result", {"step": 1, "name": "t", "observation": "y" * 10000, "error": False})
+
+    assert [item["event"] for item in record.events] == ["submitted", "llm_delta", "tool_result"]
+    assert record.events[1]["data"]["content"] == "hello"
+    assert record.events[1]["seq"] == 2
+    assert len(record.events[2]["data"]["observation"]) < MAX_REPLAY_TEXT + 100
+    assert record.to_dict()["events"] == 4
+
+
+def test_subscribers_receive_full_events_and_backlog_is_trimmed_when_done():
+    record = TaskRecord("t1", "prompt")
+    queue = _Queue()
+    record.subscribers.add(queue)
+    record.publish("tool_result", {"step": 1, "name": "t", "observation": "y" * 10000, "error": False})
+    record.publish("run_finished", {"result": "ok", "steps": 1})
+    record.status = "finished"
+    record.publish("done", {"status": "finished"})
+
+    assert len(queue.items[0]["data"]["observation"]) == 10000
+    # 订阅者还在时保留完整回放记录，断开后只剩结束事件
+    assert len(record.events) == 3
+    record.subscribers.discard(queue)
+    record.trim()
+    assert [item["event"] for item in record.events] == ["run_finished", "done"]
+
+
+class _Queue:
+    def __init__(self):
+        self.items = []
+
+    def put_nowait(self, item):
+        self.items.append(item)
@@ -0,0 +1,60 @@
+import pytest
+
+from nanoOpenManus.app.tools.snippet_analysis import analyze_snippet
+
+# 代码 -> 期望结果: None表示不可缓存，False表示可缓存，True表示可缓存但结果取决于工作区文件
+CASES = [
+    ("print(1+1)", False),
+    ("x = 1\nprint(x)", False),
+    ("x = x + 1", None),
+    ("x += 1", None),
+    ("import math\nprint(math.sqrt(2))", False),
+    ("import os", None),
+    ("import random; print(random.random())", None),
+    ("def f(n):\n    return 1 if n < 2 else n * f(n-1)\nprint(f(10))", False),
+    ("def f():\n    return y\ny = 1\nprint(f())", None),
+    ("print([i*i for i in range(10)])", False),
+    ("data.append(1)", None),
+    ("d = {}\nd['a'] = 1\nprint(d)", False),
+    ("lst[0] = 1", None),
+    ("global x", None),
+    ("print(open('a.txt').read())", True),
+    ("print(open('/etc/passwd').read())", None),
+    ("open('a.txt', 'w').write('x')", None),
+    ("with open('data/x.csv') as f:\n    print(len(f.read()))", True),
+    ("try:\n    1/0\nexcept ZeroDivisionError as e:\n    print(e)", False),
+    ("for i in range(i): pass", None),
+    ("print(id(1))", None),
+    ("f = lambda x: x + z", None),
+    ("if (n := 10) > 5:\n    print(n)", False),
+    ("syntax error(", None),
+    ("y = 1\ndel y", False),
+    ("a, *b = [1, 2, 3]\nprint(a, b)", False),
+    ("from collections import Counter\nprint(Counter('abca'))", False),
+    ("from os import path", None),
+    # 类体中绑定的名称在方法中不可见，方法里的k读取的是代码之外的全局变量
+    ("class A:\n    k = 1\n    def m(self):\n        return self.k\nprint(A().m())", False),
+    ("class A:\n    k = 1\n    def m(self):\n        return k\nprint(A().m())", None),
+    ("class A:\n    k = 1\n    v = [k * i for i in range(3)]", None),
+    ("class A:\n    k = [1, 2]\n    v = [i for i in k]\nprint(A.v)", False),
+    ("class A:\n    k = 1\n    j = k + 1\nprint(A.j)", False),
+    # 模块是进程共享的状态，不能修改也不能换个名字传出去
+    ("import math\nmath.pi = 3\nprint(math.pi)", None),
+    ("import math as m\nm.tau += 1", None),
+    ("math.pi = 3", None),
+    ("import math\nm = math\nm.pi = 3", None),
+    ("import math\ndef f(mod):\n    mod.pi = 3\nf(math)", None),
+    ("import math\nholder = [math]\nholder[0].pi = 3", None),
+    ("def f():\n    import math\n    math.pi = 3\nf()", None),
+    ("def f():\n    import math\n    return math.sqrt(4)\nprint(f())", False),
+    ("from collections import abc\nabc.X = 1", None),
+    ("import re\nre._cache.clear()", None),
+    ("import decimal\ndecimal.getcontext().prec = 3", None),
+    ("from decimal import getcontext", None),
+    ("import math\nmath = {}\nmath['pi'] = 3\nprint(math)", False),
+]
+
+
+@pytest.mark.parametrize("code,expected", CASES)
+def test_analyze_snippet(code, expected):
+    assert analyze_snippet(code) is expected
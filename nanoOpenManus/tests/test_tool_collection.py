@@ -0,0 +1,133 @@
+import asyncio
+
+from nanoOpenManus.app import console
+
+from nanoOpenManus.app.tools.base import BaseTool, ToolResult
+from nanoOpenManus.app.tools.python_execute import PythonExecute
+from nanoOpenManus.app.tools.tool_collection import ToolCollection, ToolResultCache
+
+
+class CountingTool(BaseTool):
+    """记录实际执行次数的测试工具"""
+
+    def __init__(self, name="counter", cache_policy="pure", reads_workspace=False, fail=False):
+        super().__init__(name=name, description="测试工具")
+        self.cache_policy = cache_policy
+        self.calls = 0
+        self._reads_workspace = reads_workspace
+        self.fail = fail
+
+    async def execute(self, value: str = "") -> ToolResult:
+        self.calls += 1
+        if self.fail:
+            return ToolResult(error=f"第{self.calls}次失败")
+        return ToolResult(output=f"{value}:{self.calls}")
+
+    def reads_workspace(self, **kwargs) -> bool:
+        return self._reads_workspace
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_pure_results_are_reused_per_arguments():
+    tool = CountingTool()
+    tools = ToolCollection(tool)
+    first = run(tools.execute("counter", {"value": "a"}))
+    assert run(tools.execute("counter", {"value": "a"})) is first
+    assert run(tools.execute("counter", {"value": "b"})).output == "b:2"
+    assert tool.calls == 2
+    assert tools.cache.summary()["counter"] == {"hits": 1, "misses": 2, "entries": 2}
+
+
+def test_errors_are_not_cached():
+    tool = CountingTool(fail=True)
+    tools = ToolCollection(tool)
+    assert run(tools.execute("counter", {"value": "a"})).error == "第1次失败"
+    assert run(tools.execute("counter", {"value": "a"})).error == "第2次失败"
+
+
+def test_session_results_are_cleared_on_cleanup():
+    session_tool = CountingTool(name="session", cache_policy="session")
+    pure_tool = CountingTool(name="pure")
+    tools = ToolCollection(session_tool, pure_tool)
+    for name in ("session", "pure"):
+        run(tools.execute(name, {"value": "a"}))
+    run(tools.cleanup())
+    for name in ("session", "pure"):
+        run(tools.execute(name, {"value": "a"}))
+    assert session_tool.calls == 2
+    assert pure_tool.calls == 1
+
+
+def test_workspace_change_invalidates_results(tmp_path):
+    tool = CountingTool(reads_workspace=True)
+    tools = ToolCollection(tool, workspace=str(tmp_path))
+    (tmp_path / "data.txt").write_text("1")
+    run(tools.execute("counter", {"value": "a"}))
+    run(tools.execute("counter", {"value": "a"}))
+    assert tool.calls == 1
+    (tmp_path / "data.txt").write_text("22")
+    run(tools.execute("counter", {"value": "a"}))
+    assert tool.calls == 2
+    (tmp_path / "new.txt").write_text("")
+    run(tools.execute("counter", {"value": "a"}))
+    assert tool.calls == 3
+
+
+def test_workspace_reads_are_not_cached_without_a_workspace(monkeypatch):
+    monkeypatch.delenv("ALLOWED_WRITE_DIR", raising=False)
+    tool = CountingTool(reads_workspace=True)
+    tools = ToolCollection(tool)
+    run(tools.execute("counter", {"value": "a"}))
+    run(tools.execute("counter", {"value": "a"}))
+    assert tool.calls == 2
+
+
+def test_replacing_a_tool_drops_its_results():
+    tools = ToolCollection(CountingTool())
+    run(tools.execute("counter", {"value": "a"}))
+    replacement = CountingTool()
+    tools.add_tool(replacement)
+    run(tools.execute("counter", {"value": "a"}))
+    assert replacement.calls == 1
+
+
+def test_result_cache_lru_eviction():
+    cache = ToolResultCache(max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.put("tool", key, ToolResult(output=key))
+    assert cache.get("tool", "a") is None
+    assert cache.get("tool", "c").output == "c"
+    assert cache.get("tool", "x", fingerprint=(1, 2, 3)) is None
+
+
+def test_python_execute_failures_are_reported_as_errors_and_not_cached():
+    async def main():
+        tools = ToolCollection(PythonExecute(stateful=False))
+        code = "print('开始')\nx = 1 // 0"
+        first = await tools.execute("python_execute", {"code": code})
+        assert first.error and "division" in first.error
+        await tools.execute("python_execute", {"code": code})
+        assert tools.cache.summary()["python_execute"]["entries"] == 0
+
+        ok = await tools.execute("python_execute", {"code": "print(sum(range(10)))"})
+        assert ok.output.strip() == "45"
+        assert await tools.execute("python_execute", {"code": "print(sum(range(10)))"}) is ok
+
+    run(main())
+
+
+def test_cleanup_failures_respect_console_switch(monkeypatch, capsys):
+    class BrokenCleanup(CountingTool):
+        async def cleanup(self):
+            raise RuntimeError("boom")
+
+    tools = ToolCollection(BrokenCleanup())
+    monkeypatch.setattr(console, "_enabled", False)
+    run(tools.cleanup())
+    assert capsys.readouterr().out == ""
+    monkeypatch.setattr(console, "_enabled", True)
+    run(tools.cleanup())
+    assert "boom" in capsys.readouterr().out
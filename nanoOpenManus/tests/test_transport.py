@@ -0,0 +1,115 @@
+import asyncio
+
+import httpx
+
+from nanoOpenManus.app.transport import AdaptiveConcurrencyLimiter, LLMError, LLMTransport, RetryPolicy
+
+URL = "http://llm.test/v1/chat/completions"
+
+
+def make_transport(handler, max_retries: int = 2) -> LLMTransport:
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return LLMTransport(client=client, retry_policy=RetryPolicy(max_retries=max_retries, base_delay=0.0))
+
+
+def test_cancel_during_send_releases_slot():
+    async def main():
+        started = asyncio.Event()
+
+        async def handler(request):
+            started.set()
+            await asyncio.sleep(60)
+            return httpx.Response(200)
+
+        transport = make_transport(handler)
+        for _ in range(3):
+            started.clear()
+            task = asyncio.create_task(transport.post(URL, {}, b"{}"))
+            await started.wait()
+            assert transport.limiter.in_flight == 1
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            assert transport.limiter.in_flight == 0
+        await transport.close()
+
+    asyncio.run(main())
+
+
+def test_exception_in_stream_body_releases_slot():
+    async def main():
+        transport = make_transport(lambda request: httpx.Response(200, content=b"ok"))
+        try:
+            async with transport.stream(URL, {}, b"{}"):
+                raise RuntimeError("调用方处理失败")
+        except RuntimeError:
+            pass
+        assert transport.limiter.in_flight == 0
+        await transport.close()
+
+    asyncio.run(main())
+
+
+def test_limiter_cancelled_waiter_does_not_take_slot():
+    async def main():
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=1)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        await limiter.release()
+        assert limiter.in_flight == 0
+        await asyncio.wait_for(limiter.acquire(), timeout=1)
+        assert limiter.in_flight == 1
+
+    asyncio.run(main())
+
+
+def test_rate_limited_response_halves_limit_and_retries():
+    async def main():
+        responses = [httpx.Response(429, headers={"retry-after-ms": "1"}), httpx.Response(200, json={"ok": True})]
+        transport = make_transport(lambda request: responses.pop(0))
+        response = await transport.post(URL, {}, b"{}")
+        assert response.json() == {"ok": True}
+        assert transport.stats["rate_limited"] == 1 and transport.stats["retries"] == 1
+        assert transport.limiter.limit < 8
+        assert transport.limiter.in_flight == 0
+        await transport.close()
+
+    asyncio.run(main())
+
+
+class _BrokenStream(httpx.AsyncByteStream):
+    """读取时连接断开的响应体"""
+
+    async def __aiter__(self):
+        raise httpx.ReadError("connection reset")
+        yield b""
+
+
+def test_transport_error_while_reading_error_body_is_retried():
+    async def main():
+        responses = [httpx.Response(503, stream=_BrokenStream()), httpx.Response(200, json={"ok": True})]
+        transport = make_transport(lambda request: responses.pop(0))
+        response = await transport.post(URL, {}, b"{}")
+        assert response.json() == {"ok": True}
+        assert transport.stats["retries"] == 1
+        assert transport.limiter.in_flight == 0
+        await transport.close()
+
+    asyncio.run(main())
+
+
+def test_repeated_error_body_failures_raise_llm_error():
+    async def main():
+        transport = make_transport(lambda request: httpx.Response(500, stream=_BrokenStream()), max_retries=1)
+        try:
+            await transport.post(URL, {}, b"{}")
+        except LLMError as e:
+            assert "ReadError" in str(e)
+        else:
+            raise AssertionError("应当抛出LLMError")
+        assert transport.limiter.in_flight == 0
+        await transport.close()
+
+    asyncio.run(main())
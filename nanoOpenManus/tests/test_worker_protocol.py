@@ -0,0 +1,79 @@
+import asyncio
+import json
+
+import pytest
+
+from nanoOpenManus.app.tools.worker_protocol import (
+    ATTACHMENT_THRESHOLD,
+    FRAME_HEADER,
+    FrameError,
+    encode_frame,
+    encode_message,
+    read_frame,
+)
+
+
+def read_all(chunks, count=1):
+    """把数据块喂给StreamReader，依次读出count个帧"""
+    async def main():
+        reader = asyncio.StreamReader()
+        reader.feed_data(b"".join(chunks))
+        reader.feed_eof()
+        return [await read_frame(reader) for _ in range(count)]
+
+    return asyncio.run(main())
+
+
+def test_round_trip_without_attachments():
+    message = {"id": 1, "tool": "python_execute", "arguments": {"code": "print('你好')"}}
+    assert read_all(encode_message(message)) == [message]
+
+
+def test_round_trip_with_nested_files_list():
+    big = "内容\n" * ATTACHMENT_THRESHOLD
+    message = {
+        "id": 7,
+        "tool": "file_saver",
+        "arguments": {
+            "files": [
+                {"file_path": "a.txt", "content": big},
+                {"file_path": "b.txt", "content": "short"},
+                {"file_path": "c.txt", "content": big + "x", "mode": "a"},
+            ],
+            "pairs": (("k", big),),
+        },
+    }
+    chunks = encode_message(message, attachments=True)
+    (length,) = FRAME_HEADER.unpack(chunks[0][:FRAME_HEADER.size])
+    header = json.loads(chunks[0][FRAME_HEADER.size:FRAME_HEADER.size + length])
+    # 长字符串都不再出现在JSON正文中
+    assert len(header["$attachments"]) == 3
+    assert len(chunks[0]) < 1024
+
+    (restored,) = read_all(chunks)
+    files = restored["arguments"]["files"]
+    assert files[0]["content"] == big
+    assert files[1] == {"file_path": "b.txt", "content": "short"}
+    assert files[2]["content"] == big + "x"
+    assert restored["arguments"]["pairs"] == [["k", big]]
+
+
+def test_consecutive_frames_and_eof():
+    first = encode_message({"id": 1, "output": "x" * ATTACHMENT_THRESHOLD}, attachments=True)
+    second = encode_message({"id": 2, "output": ["y" * ATTACHMENT_THRESHOLD]}, attachments=True)
+    assert read_all(first + second, count=3) == [
+        {"id": 1, "output": "x" * ATTACHMENT_THRESHOLD},
+        {"id": 2, "output": ["y" * ATTACHMENT_THRESHOLD]},
+        None,
+    ]
+
+
+def test_truncated_frame_raises():
+    frame = encode_frame({"id": 1})
+    with pytest.raises(asyncio.IncompleteReadError):
+        read_all([frame[:-1]])
+
+
+def test_oversized_frame_header_rejected():
+    with pytest.raises(FrameError):
+        read_all([FRAME_HEADER.pack(2 ** 31)])
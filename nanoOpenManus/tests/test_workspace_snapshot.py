@@ -0,0 +1,121 @@
+import importlib.util
+import os
+
+import pytest
+
+# 模块只在容器镜像中（docker/nanoOpenManus/app/tools），按文件路径加载
+_PATH = os.path.join(os.path.dirname(__file__), "..", "docker", "nanoOpenManus", "app", "tools", "workspace_snapshot.py")
+_spec = importlib.util.spec_from_file_location("workspace_snapshot", _PATH)
+workspace_snapshot = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(workspace_snapshot)
+
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def read(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def tree(root):
+    """工作区内容: {相对路径: 文件内容 / "<dir>" / "-> 链接目标"}"""
+    result = {}
+    for rel, st in workspace_snapshot._walk(root):
+        path = os.path.join(root, rel)
+        if os.path.islink(path):
+            result[rel] = "-> " + os.readlink(path)
+        elif os.path.isdir(path):
+            result[rel] = "<dir>"
+        else:
+            result[rel] = read(path)
+    return result
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    root = tmp_path / "workspace"
+    write(str(root / "a.txt"), "alpha")
+    write(str(root / "sub" / "b.txt"), "beta")
+    write(str(root / "sub" / "deep" / "c.txt"), "gamma")
+    os.symlink("a.txt", str(root / "link"))
+    return str(root), str(tmp_path / "store")
+
+
+def test_restore_undoes_every_kind_of_change(workspace):
+    root, store = workspace
+    before = tree(root)
+    assert workspace_snapshot.take_snapshot(root, store)["files"] == 3
+
+    write(os.path.join(root, "a.txt"), "changed in place")
+    os.remove(os.path.join(root, "sub", "b.txt"))
+    write(os.path.join(root, "sub", "deep", "new.txt"), "new")
+    write(os.path.join(root, "extra", "x.txt"), "x" * 10)
+    os.remove(os.path.join(root, "link"))
+    os.symlink("sub", os.path.join(root, "link"))
+
+    result = workspace_snapshot.restore_snapshot(root, store)
+    assert tree(root) == before
+    # a.txt、sub/b.txt和link被复制回来，sub/deep/c.txt原样保留
+    assert result["restored"] == 3
+    assert result["kept"] == 1
+    assert result["reclaimed_bytes"] >= 10
+
+
+def test_restore_keeps_unchanged_files(workspace):
+    root, store = workspace
+    workspace_snapshot.take_snapshot(root, store)
+    inode = os.stat(os.path.join(root, "sub", "b.txt")).st_ino
+
+    result = workspace_snapshot.restore_snapshot(root, store)
+    assert result["removed"] == result["restored"] == 0
+    assert os.stat(os.path.join(root, "sub", "b.txt")).st_ino == inode
+
+
+def test_snapshot_is_not_affected_by_in_place_writes(workspace):
+    root, store = workspace
+    workspace_snapshot.take_snapshot(root, store)
+    # 原地修改同一个inode，存储目录中的副本不能跟着变
+    with open(os.path.join(root, "a.txt"), "r+", encoding="utf-8") as f:
+        f.write("ALPHA")
+
+    workspace_snapshot.restore_snapshot(root, store)
+    assert read(os.path.join(root, "a.txt")) == "alpha"
+
+
+def test_repeated_restores_use_the_updated_manifest(workspace):
+    root, store = workspace
+    workspace_snapshot.take_snapshot(root, store)
+    os.remove(os.path.join(root, "a.txt"))
+    assert workspace_snapshot.restore_snapshot(root, store)["restored"] == 1
+    # 复制回来的文件已写入清单，第二次还原不再改动它
+    second = workspace_snapshot.restore_snapshot(root, store)
+    assert second["removed"] == second["restored"] == 0
+
+
+def test_restore_without_snapshot_empties_workspace(workspace):
+    root, store = workspace
+    result = workspace_snapshot.restore_snapshot(root, store)
+    assert os.listdir(root) == []
+    assert result["removed"] == 6
+
+
+def test_failed_snapshot_keeps_previous_one(workspace, monkeypatch):
+    root, store = workspace
+    workspace_snapshot.take_snapshot(root, store)
+    write(os.path.join(root, "later.txt"), "later")
+
+    def broken(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(workspace_snapshot.shutil, "copy2", broken)
+    with pytest.raises(OSError):
+        workspace_snapshot.take_snapshot(root, store)
+    monkeypatch.undo()
+
+    workspace_snapshot.restore_snapshot(root, store)
+    assert not os.path.exists(os.path.join(root, "later.txt"))
+    assert read(os.path.join(root, "a.txt")) == "alpha"
@@ -0,0 +1,189 @@
+import sys
+import os
+
+# --- Start of code to fix Python path ---
+# This ensures that the project root directory (containing the 'nanoOpenManus' package)
+# is on the Python path, allowing imports like 'from nanoOpenManus.app...'
+_current_script_path = os.path.abspath(__file__)
+_current_script_dir = os.path.dirname(_current_script_path)
+_project_root = os.path.dirname(_current_script_dir)
+
+if _project_root not in sys.path:
+    sys.path.insert(0, _project_root)
+# --- End of code to fix Python path ---
+
+import argparse
+import json
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+# 浮点时间戳的比较容差（秒），子span的起止时间由两个时钟换算，可能与父span有微小偏差
+_EPSILON = 1e-4
+
+
+def load_traces(path: str) -> Dict[str, List[Dict]]:
+    """读取--trace写出的JSONL文件，按trace_id分组"""
+    traces: Dict[str, List[Dict]] = defaultdict(list)
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                span = json.loads(line)
+            except ValueError:
+                continue  # 进程被强制结束时可能留下不完整的最后一行
+            if isinstance(span, dict) and span.get("trace_id"):
+                traces[span["trace_id"]].append(span)
+    return traces
+
+
+def build_tree(spans: List[Dict]) -> Tuple[List[Dict], Dict[str, List[Dict]]]:
+    """
+    建立span之间的父子关系
+
+    Returns:
+        Tuple: (根span列表, span_id -> 按开始时间排序的子span列表)
+    """
+    ids = {span["span_id"] for span in spans}
+    children: Dict[str, List[Dict]] = defaultdict(list)
+    roots = []
+    for span in spans:
+        if span.get("parent_id") in ids:
+            children[span["parent_id"]].append(span)
+        else:
+            roots.append(span)  # 父span未写出（例如进程中途退出）时也作为根
+    for items in children.values():
+        items.sort(key=lambda s: s["start"])
+    roots.sort(key=lambda s: s["start"])
+    return roots, children
+
+
+def self_time(span: Dict, children: Dict[str, List[Dict]]) -> float:
+    """span自身的耗时（秒），即不被任何子span覆盖的部分；并发的子span只计算一次"""
+    covered = 0.0
+    cursor = span["start"]
+    for child in children.get(span["span_id"], []):
+        start = max(child["start"], cursor)
+        end = min(child["end"], span["end"])
+        if end > start:
+            covered += end - start
+            cursor = end
+    return max(0.0, span["end"] - span["start"] - covered)
+
+
+def critical_path(span: Dict, children: Dict[str, List[Dict]], depth: int = 0) -> List[Tuple[Dict, int]]:
+    """
+    计算span的关键路径
+
+    从span的结束时间向前回溯：每次选择在当前时间点之前最晚结束的子span，
+    然后从该子span的开始时间继续回溯。并发执行的子span中只有最晚结束的那个在关键路径上，
+    缩短其他子span不会缩短整体耗时。
+
+    Returns:
+        List[Tuple]: 按时间顺序排列的(span, 深度)
+    """
+    path: List[Tuple[Dict, int]] = [(span, depth)]
+    cursor = span["end"]
+    chosen = []
+    candidates = [c for c in children.get(span["span_id"], []) if c["start"] >= span["start"] - _EPSILON]
+    while True:
+        last: Optional[Dict] = None
+        for child in candidates:
+            if child["end"] <= cursor + _EPSILON and (last is None or child["end"] > last["end"]):
+                last = child
+        if last is None:
+            break
+        chosen.append(last)
+        cursor = last["start"]
+        candidates = [c for c in candidates if c["end"] <= cursor + _EPSILON and c is not last]
+    for child in reversed(chosen):
+        path.extend(critical_path(child, children, depth + 1))
+    return path
+
+
+def summarize(spans: List[Dict]) -> Dict:
+    """汇总一次运行（一个trace）的耗时分布和关键路径"""
+    roots, children = build_tree(spans)
+    root = max(roots, key=lambda s: s["end"] - s["start"])
+    by_name: Dict[str, Dict] = defaultdict(lambda: {"count": 0, "total": 0.0, "self": 0.0})
+    sandbox = {"tool_ms": 0.0, "overhead_ms": 0.0}
+    for span in spans:
+        stats = by_name[span["name"]]
+        stats["count"] += 1
+        stats["total"] += span["end"] - span["start"]
+        stats["self"] += self_time(span, children)
+        for key in sandbox:
+            sandbox[key] += span.get("attributes", {}).get(key) or 0.0
+    return {
+        "root": root,
+        "duration": root["end"] - root["start"],
+        "by_name": dict(by_name),
+        "sandbox": sandbox,
+        "errors": [span for span in spans if span.get("status") == "error"],
+        "critical_path": critical_path(root, children),
+    }
+
+
+def _describe(span: Dict) -> str:
+    """span的简短说明，显示对分析耗时有用的属性"""
+    attributes = span.get("attributes", {})
+    keys = ("step", "tool", "mode", "model", "cached", "total_tokens", "request_bytes", "tool_ms", "overhead_ms")
+    details = [f"{key}={attributes[key]}" for key in keys if key in attributes]
+    if span.get("error"):
+        details.append(f"错误={span['error'][:60]}")
+    return f"{span['name']}" + (f" ({', '.join(details)})" if details else "")
+
+
+def print_report(trace_id: str, summary: Dict) -> None:
+    root = summary["root"]
+    duration = summary["duration"]
+    print(f"\n🧭 追踪 {trace_id}: {_describe(root)}")
+    print(f"   总耗时: {duration * 1000:.1f}ms")
+
+    print("   耗时分布（自身耗时，不含子span）:")
+    items = sorted(summary["by_name"].items(), key=lambda item: item[1]["self"], reverse=True)
+    for name, stats in items:
+        share = stats["self"] / duration * 100 if duration else 0.0
+        print(f"     {name:<24} {stats['count']:>4} 次  自身 {stats['self'] * 1000:>10.1f}ms  {share:5.1f}%"
+              f"  累计 {stats['total'] * 1000:>10.1f}ms")
+    sandbox = summary["sandbox"]
+    if sandbox["tool_ms"] or sandbox["overhead_ms"]:
+        print(f"   沙箱调用: 工具执行 {sandbox['tool_ms']:.1f}ms  往返开销 {sandbox['overhead_ms']:.1f}ms")
+
+    print("   关键路径:")
+    for span, depth in summary["critical_path"]:
+        print(f"     {'  ' * depth}{span['end'] * 1000 - span['start'] * 1000:>10.1f}ms  {_describe(span)}")
+
+    if summary["errors"]:
+        print(f"   ❌ 出错的span: {len(summary['errors'])} 个")
+
+
+def main():
+    """
+    分析 --trace 写出的追踪文件
+
+    对每次运行输出各类操作的耗时分布（LLM请求、请求编码、工具执行、沙箱往返等）和关键路径，
+    用于判断一次运行的时间主要花在哪里
+    """
+    parser = argparse.ArgumentParser(description='NanoOpenManus - 追踪分析')
+    parser.add_argument('trace', help='--trace 写出的JSONL追踪文件')
+    parser.add_argument('--trace-id', default=None, help='只分析指定的trace（默认: 全部）')
+    parser.add_argument('--last', type=int, default=None, help='只分析最后N次运行')
+    args = parser.parse_args()
+
+    traces = load_traces(args.trace)
+    if args.trace_id:
+        traces = {args.trace_id: traces.get(args.trace_id, [])} if args.trace_id in traces else {}
+    if not traces:
+        print("⚠️ 没有找到追踪数据")
+        return
+    summaries = sorted(
+        ((trace_id, summarize(spans)) for trace_id, spans in traces.items()),
+        key=lambda item: item[1]["root"]["start"],
+    )
+    if args.last:
+        summaries = summaries[-args.last:]
+    for trace_id, summary in summaries:
+        print_report(trace_id, summary)
+
+
+if __name__ == "__main__":
+    main()